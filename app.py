@@ -12,10 +12,18 @@ load_dotenv(dotenv_path=Path(__file__).with_name(".env"))
 
 from powerbot.telegram.callback.ack import ack_callback
 from powerbot.telegram.callback.lang import lang_callback
+from powerbot.telegram.callback.group import group_callback
+from powerbot.telegram.callback.site import site_callback
+from powerbot.telegram.callback.region import region_callback
 
 from powerbot.config.config import settings
 from powerbot.storage.db import init_db
+from powerbot.storage.timeline import load_timeline
+from powerbot.storage.registry import load_registry, subscriber_registry
 from powerbot.web.web import run_flask
+from powerbot.services.metrics import power_metrics
+from powerbot.services.power_status import run_notification_retries
+from powerbot.telegram.outbox import outbox_dispatcher
 from powerbot.yasno.watchdog.start import yasno_watchdog_worker
 from powerbot.telegram.handlers.handlers import (
     cmd_start,
@@ -26,6 +34,9 @@ from powerbot.telegram.handlers.handlers import (
     cmd_schedule,
     cmd_schedule_tomorrow,
     cmd_lang,
+    cmd_group,
+    cmd_site,
+    cmd_region,
 )
 
 
@@ -39,10 +50,31 @@ def main() -> None:
         raise SystemExit("Спочатку вкажи TELEGRAM_BOT_TOKEN в ENV.")
 
     init_db()
+    load_timeline()
+    load_registry()
 
     logging.info("WEB_PORT=%s, WEB_BASE_URL=%s", settings.WEB_PORT, settings.WEB_BASE_URL)
     logging.info("WEBHOOK_SECRET length=%s", len(settings.WEBHOOK_SECRET))
 
+    # метрики: сдвигаем скользящие окна аптайма в фоне
+    metrics_thread = threading.Thread(
+        target=power_metrics.run_refresher,
+        args=(settings.METRICS_REFRESH_INTERVAL,),
+        daemon=True,
+    )
+    metrics_thread.start()
+
+    # воркеры рассылки: дочищают очередь, оставшуюся с прошлого запуска
+    outbox_dispatcher.start(settings.OUTBOX_WORKERS)
+
+    # смены статуса, не дошедшие до outbox (до падения или после сбоя)
+    notify_thread = threading.Thread(
+        target=run_notification_retries,
+        args=(settings.OUTBOX_POLL_INTERVAL,),
+        daemon=True,
+    )
+    notify_thread.start()
+
     # Flask в отдельном потоке
     flask_thread = threading.Thread(target=run_flask, daemon=True)
     flask_thread.start()
@@ -67,11 +99,20 @@ def main() -> None:
     application.add_handler(CommandHandler("schedule", cmd_schedule))
     application.add_handler(CommandHandler("tomorrow", cmd_schedule_tomorrow))
     application.add_handler(CommandHandler("lang", cmd_lang))
+    application.add_handler(CommandHandler("group", cmd_group))
+    application.add_handler(CommandHandler("site", cmd_site))
+    application.add_handler(CommandHandler("region", cmd_region))
     application.add_handler(CallbackQueryHandler(lang_callback, pattern=r"^lang:"))
+    application.add_handler(CallbackQueryHandler(group_callback, pattern=r"^group:"))
+    application.add_handler(CallbackQueryHandler(site_callback, pattern=r"^site:"))
+    application.add_handler(CallbackQueryHandler(region_callback, pattern=r"^region:"))
     application.add_handler(CallbackQueryHandler(ack_callback, pattern=r"^ack$"))
     logging.info("Telegram-бот запущений. Чекаємо /start та вебхуки.")
     application.run_polling()
 
+    # дописываем отложенные изменения подписок перед выходом
+    subscriber_registry.flush()
+
 
 if __name__ == "__main__":
     main()
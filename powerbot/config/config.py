@@ -1,7 +1,7 @@
 import os
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional, Tuple
 
 
 def _int_opt(name: str) -> Optional[int]:
@@ -33,6 +33,26 @@ def _float(name: str, default: float) -> float:
         return default
 
 
+def _targets(name: str, primary: Tuple[Optional[int], Optional[int]]) -> List[Tuple[int, int]]:
+    """
+    "25:902,3:301" -> [(25, 902), (3, 301)].
+    Пара YASNO_REGION_ID/YASNO_DSO_ID (если задана) всегда первая.
+    """
+    targets: List[Tuple[int, int]] = []
+    if primary[0] and primary[1]:
+        targets.append((primary[0], primary[1]))
+
+    for item in (os.getenv(name) or "").split(","):
+        region, _, dso = item.strip().partition(":")
+        try:
+            target = (int(region), int(dso))
+        except ValueError:
+            continue
+        if target not in targets:
+            targets.append(target)
+    return targets
+
+
 @dataclass
 class Settings:
     # Telegram
@@ -44,17 +64,33 @@ class Settings:
     WEB_PORT: int
     WEB_BASE_URL: str
     WEBHOOK_SECRET: str
+    # площадка (датчик) по умолчанию: для вебхуков без site и старых данных
+    DEFAULT_SITE: str
+    # максимум показаний в одном запросе /power-hook/batch
+    WEBHOOK_BATCH_MAX: int
 
     # TG rate-limit
     MAX_GLOBAL_MSG_PER_SEC: float
     MIN_PER_CHAT_INTERVAL: float
     SEND_WINDOW_SEC: float
+    TG_MAX_IN_FLIGHT: int
+    TG_GROUP_MSG_PER_MIN: float
+    OUTBOX_WORKERS: int
+    OUTBOX_BATCH_SIZE: int
+    OUTBOX_MAX_ATTEMPTS: int
+    OUTBOX_POLL_INTERVAL: float
 
     # YASNO
     YASNO_REGION_ID: Optional[int]
     YASNO_DSO_ID: Optional[int]
     YASNO_GROUP: Optional[str]
     YASNO_POLL_INTERVAL: int
+    YASNO_CACHE_TTL: int
+    YASNO_CACHE_STALE_TTL: int
+    YASNO_TARGETS: List[Tuple[int, int]]
+    YASNO_POLL_CONCURRENCY: int
+    YASNO_POLL_JITTER: float
+    YASNO_POLL_BACKOFF_MAX: int
 
     # Файловая структура
     PROJECT_ROOT: Path
@@ -65,6 +101,15 @@ class Settings:
     YASNO_STATE_FILE: Path
     SUBSCRIBERS_FILE: Path
 
+    # SQLite
+    DB_POOL_SIZE: int
+    STORAGE_IO_WORKERS: int
+    SUBSCRIBERS_FLUSH_DELAY: float
+
+    # Web
+    HISTORY_MAX_DAYS: int
+    METRICS_REFRESH_INTERVAL: int
+
 
 def load_settings() -> Settings:
     # /.../powerbot/config/settings.py -> проектный корень (где лежат app.py, lang/, templates/)
@@ -80,6 +125,9 @@ def load_settings() -> Settings:
     yasno_state_file = Path(os.getenv("YASNO_STATE_FILE") or (data_dir / "yasno_state.json"))
     subscribers_file = Path(os.getenv("SUBSCRIBERS_FILE") or (data_dir / "subscribers.json"))
 
+    yasno_region_id = _int_opt("YASNO_REGION_ID")
+    yasno_dso_id = _int_opt("YASNO_DSO_ID")
+
     return Settings(
         TELEGRAM_BOT_TOKEN=os.getenv("TELEGRAM_BOT_TOKEN", ""),
         ADMIN_CHAT_ID=_int_opt("ADMIN_CHAT_ID"),
@@ -88,16 +136,30 @@ def load_settings() -> Settings:
         WEB_PORT=_int("WEB_PORT", 8080),
         WEB_BASE_URL=os.getenv("WEB_BASE_URL", "").rstrip("/"),
         WEBHOOK_SECRET=os.getenv("WEBHOOK_SECRET", "CHANGE_ME_SECRET"),
+        DEFAULT_SITE=os.getenv("DEFAULT_SITE") or "default",
+        WEBHOOK_BATCH_MAX=_int("WEBHOOK_BATCH_MAX", 1000),
 
         MAX_GLOBAL_MSG_PER_SEC=_float("MAX_GLOBAL_MSG_PER_SEC", 25.0),
         MIN_PER_CHAT_INTERVAL=_float("MIN_PER_CHAT_INTERVAL", 1.0),
         SEND_WINDOW_SEC=_float("SEND_WINDOW_SEC", 1.0),
+        TG_MAX_IN_FLIGHT=_int("TG_MAX_IN_FLIGHT", 8),
+        TG_GROUP_MSG_PER_MIN=_float("TG_GROUP_MSG_PER_MIN", 20.0),
+        OUTBOX_WORKERS=_int("OUTBOX_WORKERS", 1),
+        OUTBOX_BATCH_SIZE=_int("OUTBOX_BATCH_SIZE", 100),
+        OUTBOX_MAX_ATTEMPTS=_int("OUTBOX_MAX_ATTEMPTS", 8),
+        OUTBOX_POLL_INTERVAL=_float("OUTBOX_POLL_INTERVAL", 5.0),
 
 
-        YASNO_REGION_ID=_int_opt("YASNO_REGION_ID"),
-        YASNO_DSO_ID=_int_opt("YASNO_DSO_ID"),
+        YASNO_REGION_ID=yasno_region_id,
+        YASNO_DSO_ID=yasno_dso_id,
         YASNO_GROUP=os.getenv("YASNO_GROUP", None),
         YASNO_POLL_INTERVAL=_int("YASNO_POLL_INTERVAL", 900),
+        YASNO_CACHE_TTL=_int("YASNO_CACHE_TTL", 300),
+        YASNO_CACHE_STALE_TTL=_int("YASNO_CACHE_STALE_TTL", 6 * 3600),
+        YASNO_TARGETS=_targets("YASNO_TARGETS", (yasno_region_id, yasno_dso_id)),
+        YASNO_POLL_CONCURRENCY=_int("YASNO_POLL_CONCURRENCY", 4),
+        YASNO_POLL_JITTER=_float("YASNO_POLL_JITTER", 0.1),
+        YASNO_POLL_BACKOFF_MAX=_int("YASNO_POLL_BACKOFF_MAX", 4 * 3600),
 
         PROJECT_ROOT=project_root,
         DATA_DIR=data_dir,
@@ -106,6 +168,13 @@ def load_settings() -> Settings:
         STATE_FILE=state_file,
         YASNO_STATE_FILE=yasno_state_file,
         SUBSCRIBERS_FILE=subscribers_file,
+
+        DB_POOL_SIZE=_int("DB_POOL_SIZE", 4),
+        STORAGE_IO_WORKERS=_int("STORAGE_IO_WORKERS", 4),
+        SUBSCRIBERS_FLUSH_DELAY=_float("SUBSCRIBERS_FLUSH_DELAY", 1.0),
+
+        HISTORY_MAX_DAYS=_int("HISTORY_MAX_DAYS", 366),
+        METRICS_REFRESH_INTERVAL=_int("METRICS_REFRESH_INTERVAL", 15),
     )
 
 
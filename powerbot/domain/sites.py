@@ -0,0 +1,17 @@
+import re
+from typing import Optional
+
+# id площадки: латиница, цифры, "_", "-", "." — идёт в URL, метки Prometheus и callback_data
+_SITE_RE = re.compile(r"^[A-Za-z0-9_.-]{1,32}$")
+
+
+def parse_site(value) -> Optional[str]:
+    """
+    Проверенный id площадки или None, если значение не подходит.
+    """
+    if value is None:
+        return None
+    site = str(value).strip()
+    if not _SITE_RE.match(site):
+        return None
+    return site
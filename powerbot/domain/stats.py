@@ -1,6 +1,9 @@
 import time
+from bisect import bisect_left, bisect_right
 from datetime import datetime, date, time as dtime, timedelta
-from typing import List, Tuple, Optional
+from typing import Dict, Iterable, List, Sequence, Tuple, Optional
+
+Event = Tuple[int, bool]
 
 
 def plural_ua(n: int, form1: str, form2: str, form5: str) -> str:
@@ -26,7 +29,27 @@ def format_duration_ua(seconds: int) -> str:
     return " ".join(parts)
 
 
-def compute_day_stats(day: date, events: List[Tuple[int, bool]]) -> Optional[dict]:
+def _event_ts(event: Event) -> int:
+    return event[0]
+
+
+def slice_events(
+    events: Sequence[Event],
+    start_ts: int,
+    end_ts: int,
+) -> Tuple[Optional[Event], Sequence[Event]]:
+    """
+    Для отсортированного по ts списка событий возвращает
+    (последнее событие до start_ts | None, события из [start_ts, end_ts)).
+    Бинарный поиск по ts: O(log n + k) вместо прохода по всей истории.
+    """
+    lo = bisect_left(events, start_ts, key=_event_ts)
+    hi = bisect_left(events, end_ts, lo=lo, key=_event_ts)
+    before = events[lo - 1] if lo > 0 else None
+    return before, events[lo:hi]
+
+
+def compute_day_stats(day: date, events: Sequence[Event]) -> Optional[dict]:
     now_ts = int(time.time())
 
     day_start = datetime.combine(day, dtime.min)
@@ -38,14 +61,7 @@ def compute_day_stats(day: date, events: List[Tuple[int, bool]]) -> Optional[dic
     if day == datetime.fromtimestamp(now_ts).date():
         day_end_ts = min(day_end_ts, now_ts)
 
-    before = None
-    for ts, st in events:
-        if ts < day_start_ts:
-            before = (ts, st)
-        else:
-            break
-
-    events_in_day = [(ts, st) for ts, st in events if day_start_ts <= ts < day_end_ts]
+    before, events_in_day = slice_events(events, day_start_ts, day_end_ts)
 
     if before is None and not events_in_day:
         return None
@@ -111,7 +127,7 @@ def compute_day_stats(day: date, events: List[Tuple[int, bool]]) -> Optional[dic
 
 def compute_day_hourly_online(
     day: date,
-    events: List[Tuple[int, bool]],
+    events: Sequence[Event],
 ) -> Optional[list]:
     now_ts = int(time.time())
     day_start = datetime.combine(day, dtime.min)
@@ -121,22 +137,7 @@ def compute_day_hourly_online(
     if day == datetime.fromtimestamp(now_ts).date():
         day_end_ts = min(day_end_ts, now_ts)
 
-    before = None
-    idx_first_in_day = None
-    for idx, (ts, st) in enumerate(events):
-        if ts < day_start_ts:
-            before = (ts, st)
-        elif ts < day_end_ts and idx_first_in_day is None:
-            idx_first_in_day = idx
-        elif ts >= day_end_ts:
-            break
-
-    events_in_day = []
-    if idx_first_in_day is not None:
-        for ts, st in events[idx_first_in_day:]:
-            if ts >= day_end_ts:
-                break
-            events_in_day.append((ts, st))
+    before, events_in_day = slice_events(events, day_start_ts, day_end_ts)
 
     if before is None and not events_in_day:
         return None
@@ -164,7 +165,8 @@ def compute_day_hourly_online(
             if hour_idx > 23:
                 hour_idx = 23
             hour_start_ts = day_start_ts + hour_idx * 3600
-            hour_end_ts = hour_start_ts + 3600
+            # последний час забирает остаток суток (25-часовой день при переводе часов)
+            hour_end_ts = hour_start_ts + 3600 if hour_idx < 23 else end_ts
             seg_end = min(end_ts, hour_end_ts)
             dur = seg_end - s
             if 0 <= hour_idx < 24:
@@ -184,22 +186,74 @@ def compute_day_hourly_online(
     return online
 
 
-def get_last_transitions(
-    events: List[Tuple[int, bool]],
-) -> Tuple[Optional[int], Optional[int]]:
+def compute_days_stats(
+    days: Iterable[date],
+    events: Sequence[Event],
+) -> Dict[date, Optional[dict]]:
+    """
+    Чистый Python: compute_day_stats + "hourly_online" для каждого дня.
+    Векторный аналог — stats_np.compute_days_stats_np.
+    """
+    result: Dict[date, Optional[dict]] = {}
+    for day in days:
+        stats = compute_day_stats(day, events) if events else None
+        if stats is not None:
+            stats["hourly_online"] = compute_day_hourly_online(day, events)
+        result[day] = stats
+    return result
+
+
+def compute_uptime_ratio_window(
+    events: Sequence[Event],
+    window_seconds: int,
+    now_ts: Optional[int] = None,
+) -> Optional[float]:
+    """
+    Считает долю времени "online" за последний window_seconds.
+
+    Возвращает число от 0 до 1 или None, если данных нет.
+    Окно скользящее: [now - window, now].
+    """
     if not events:
-        return None, None
+        return None
 
-    last_off_ts: Optional[int] = None
-    last_on_ts: Optional[int] = None
+    if now_ts is None:
+        now_ts = int(time.time())
 
-    prev_ts, prev_status = events[0]
+    window_end = now_ts
+    window_start = now_ts - window_seconds
+
+    # если все события в будущем относительно окна — смысла нет
+    first_ts = events[0][0]
+    if first_ts >= window_end:
+        return None
 
-    for ts, status in events[1:]:
-        if prev_status and not status:
-            last_off_ts = ts
-        elif (not prev_status) and status:
-            last_on_ts = ts
-        prev_ts, prev_status = ts, status
+    # не уходим левее первой записи
+    if window_start < first_ts:
+        window_start = first_ts
+
+    # статус в момент window_start — последнее событие с ts <= window_start
+    lo = bisect_right(events, window_start, key=_event_ts)
+    hi = bisect_left(events, window_end, lo=lo, key=_event_ts)
+    cur_status = events[lo - 1][1] if lo > 0 else events[0][1]
+
+    cur_ts = window_start
+    online = 0
+
+    for ts, st in events[lo:hi]:
+        dur = ts - cur_ts
+        if dur > 0 and cur_status:
+            online += dur
+
+        cur_status = st
+        cur_ts = ts
+
+    # хвост до window_end
+    if cur_ts < window_end and cur_status:
+        online += window_end - cur_ts
+
+    total = window_end - window_start
+    if total <= 0:
+        return None
 
-    return last_off_ts, last_on_ts
+    return online / total
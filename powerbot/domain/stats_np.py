@@ -0,0 +1,141 @@
+"""
+Векторизованный (NumPy) расчёт статистики сразу за много дней.
+
+Результат совпадает с compute_day_stats + compute_day_hourly_online,
+но вместо прохода по событиям для каждого дня считается один раз
+накопленное время онлайн F(t), а on/off-секунды и почасовые значения
+получаются разностями F на границах дней/часов (один searchsorted).
+
+NumPy указан в requirements; если его нет в окружении, HAS_NUMPY = False
+и вызывающий код использует чистый Python (stats.compute_days_stats).
+Эквивалентность обоих путей проверяет tests/test_stats.py.
+"""
+from datetime import date, datetime, time as dtime, timedelta
+from typing import Dict, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - зависит от окружения
+    np = None
+
+HAS_NUMPY = np is not None
+
+
+def _online_cumsum(ts, st):
+    """
+    cum[i] — секунды онлайн от ts[0] до ts[i].
+    """
+    cum = np.zeros(len(ts), dtype=np.int64)
+    if len(ts) > 1:
+        np.cumsum(np.diff(ts) * st[:-1], out=cum[1:])
+    return cum
+
+
+def _online_until(points, ts, st, cum):
+    """
+    F(t) для массива точек t (каждая точка уже >= ts[0]).
+    """
+    idx = np.searchsorted(ts, points, side="right") - 1
+    return cum[idx] + (points - ts[idx]) * st[idx]
+
+
+def compute_days_stats_np(
+    days: Sequence[date],
+    ts,
+    st,
+    now_ts: int,
+) -> Dict[date, Optional[dict]]:
+    """
+    days — отсортированные даты; ts/st — отсортированные массивы событий
+    (int64 и 0/1), включая последнее событие до первого дня.
+
+    Возвращает {day: stats | None}, stats — как у compute_day_stats
+    плюс "hourly_online".
+    """
+    result: Dict[date, Optional[dict]] = {}
+    if not days:
+        return result
+
+    ts = np.asarray(ts, dtype=np.int64)
+    st = np.asarray(st, dtype=np.int64)
+    if len(ts) == 0:
+        return {day: None for day in days}
+
+    today = datetime.fromtimestamp(now_ts).date()
+
+    n_days = len(days)
+    day_starts = np.empty(n_days, dtype=np.int64)
+    day_ends = np.empty(n_days, dtype=np.int64)
+    for i, day in enumerate(days):
+        day_start = datetime.combine(day, dtime.min)
+        day_starts[i] = int(day_start.timestamp())
+        end_ts = int((day_start + timedelta(days=1)).timestamp())
+        if day == today:
+            end_ts = min(end_ts, now_ts)
+        day_ends[i] = end_ts
+
+    first_ts = ts[0]
+    has_data = first_ts < day_ends
+    lo = np.maximum(day_starts, first_ts)
+    hi = np.maximum(day_ends, lo)
+
+    # границы часов: 0..23 от начала суток + конец суток (последний час
+    # забирает остаток 25-часового дня), всё прижато к [lo, hi]
+    hour_offsets = np.arange(24, dtype=np.int64) * 3600
+    edges = np.empty((n_days, 25), dtype=np.int64)
+    edges[:, :24] = day_starts[:, None] + hour_offsets[None, :]
+    edges[:, 24] = hi
+    edges = np.clip(edges, lo[:, None], hi[:, None])
+
+    cum = _online_cumsum(ts, st)
+    online_at = _online_until(edges.ravel(), ts, st, cum).reshape(n_days, 25)
+    hourly = np.diff(online_at, axis=1)
+    on_seconds = online_at[:, 24] - online_at[:, 0]
+    off_seconds = (hi - lo) - on_seconds
+
+    # интервалы отключений по всей ленте: схлопываем повторы статуса
+    keep = np.ones(len(st), dtype=bool)
+    keep[1:] = st[1:] != st[:-1]
+    run_ts = ts[keep]
+    run_st = st[keep]
+    off_idx = np.flatnonzero(run_st == 0)
+    off_starts = run_ts[off_idx]
+    has_end = off_idx + 1 < len(run_ts)
+    off_ends = np.where(has_end, run_ts[np.minimum(off_idx + 1, len(run_ts) - 1)], np.iinfo(np.int64).max)
+
+    # для каждого отключения — диапазон запрошенных дней, которые оно задевает
+    first_day = np.searchsorted(day_ends, off_starts, side="right")
+    last_day = np.searchsorted(day_starts, off_ends, side="right") - 1
+
+    outages = [[] for _ in range(n_days)]
+    for s, e, ended, d_from, d_to in zip(
+        off_starts.tolist(),
+        off_ends.tolist(),
+        has_end.tolist(),
+        first_day.tolist(),
+        last_day.tolist(),
+    ):
+        for d in range(d_from, d_to + 1):
+            day_start_ts = int(day_starts[d])
+            day_end_ts = int(day_ends[d])
+            if day_end_ts <= day_start_ts:
+                continue
+            start = max(s, day_start_ts)
+            end = e if ended and e < day_end_ts else None
+            outages[d].append((start, end))
+
+    hourly_list = hourly.tolist()
+    for i, day in enumerate(days):
+        if not has_data[i]:
+            result[day] = None
+            continue
+        result[day] = {
+            "on_seconds": int(on_seconds[i]),
+            "off_seconds": int(off_seconds[i]),
+            "outages": outages[i],
+            "day_start_ts": int(day_starts[i]),
+            "day_end_ts": int(day_ends[i]),
+            "hourly_online": hourly_list[i],
+        }
+
+    return result
@@ -0,0 +1,191 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Callable, Iterable, List, Optional, Tuple
+
+
+class EventTimeline:
+    """
+    Отсортированная по времени лента событий питания в памяти процесса.
+
+    Хранится в двух компактных буферах: array('q') с метками времени и
+    array('b') со статусами (1 = онлайн, 0 = офлайн) — ~9 байт на событие
+    вместо кортежа из двух Python-объектов.
+
+    Порядок совпадает с ORDER BY ts, id: событие с уже существующей меткой
+    времени вставляется после всех событий с той же меткой.
+    """
+
+    def __init__(self) -> None:
+        self._ts = array("q")
+        self._st = array("b")
+        self._lock = threading.RLock()
+        self._listeners: List[Callable[[int, bool], None]] = []
+        # растёт при каждом изменении ленты — ключ для кэшей поверх неё
+        self.revision = 0
+        # когда (по часам сервера) лента менялась последний раз
+        self.updated_at = int(time.time())
+
+    def load(self, events: Iterable[Tuple[int, bool]]) -> None:
+        ordered = sorted(((int(ts), bool(st)) for ts, st in events), key=lambda e: e[0])
+        ts_buf = array("q", (ts for ts, _ in ordered))
+        st_buf = array("b", (1 if st else 0 for _, st in ordered))
+        with self._lock:
+            self._ts = ts_buf
+            self._st = st_buf
+            self.revision += 1
+            self.updated_at = int(time.time())
+
+    def subscribe(self, callback: Callable[[int, bool], None]) -> None:
+        """
+        callback(ts, status) вызывается после каждого append().
+        """
+        self._listeners.append(callback)
+
+    def _insert(self, ts: int, status: bool) -> None:
+        # под self._lock
+        if not self._ts or ts >= self._ts[-1]:
+            self._ts.append(ts)
+            self._st.append(1 if status else 0)
+        else:
+            # событие «из прошлого» (ts пришёл в вебхуке) — вставляем на место
+            idx = bisect_right(self._ts, ts)
+            self._ts.insert(idx, ts)
+            self._st.insert(idx, 1 if status else 0)
+
+    def append(self, ts: int, status: bool) -> None:
+        ts = int(ts)
+        with self._lock:
+            self._insert(ts, status)
+            self.revision += 1
+            self.updated_at = int(time.time())
+
+        for callback in self._listeners:
+            callback(ts, bool(status))
+
+    def extend(self, events: Iterable[Tuple[int, bool]]) -> None:
+        """
+        Пачка событий под одной блокировкой. Подписчики получают один
+        вызов — с самым ранним событием пачки (с него меняется история).
+        """
+        ordered = sorted(((int(ts), bool(st)) for ts, st in events), key=lambda e: e[0])
+        if not ordered:
+            return
+
+        with self._lock:
+            for ts, status in ordered:
+                self._insert(ts, status)
+            self.revision += 1
+            self.updated_at = int(time.time())
+
+        first_ts, first_status = ordered[0]
+        for callback in self._listeners:
+            callback(first_ts, first_status)
+
+    def __len__(self) -> int:
+        return len(self._ts)
+
+    def last(self) -> Optional[Tuple[int, bool]]:
+        with self._lock:
+            if not self._ts:
+                return None
+            return self._ts[-1], bool(self._st[-1])
+
+    def status_at(self, ts: int) -> Optional[bool]:
+        """
+        Статус в момент ts (по последнему событию с меткой <= ts), либо None.
+        """
+        event = self.event_at(ts)
+        return event[1] if event is not None else None
+
+    def event_at(self, ts: int) -> Optional[Tuple[int, bool]]:
+        """
+        Последнее событие с меткой <= ts, либо None.
+        """
+        with self._lock:
+            idx = bisect_right(self._ts, int(ts))
+            if idx == 0:
+                return None
+            return self._ts[idx - 1], bool(self._st[idx - 1])
+
+    def events_between(
+        self,
+        start_ts: int,
+        end_ts: Optional[int] = None,
+    ) -> List[Tuple[int, bool]]:
+        """
+        Тот же контракт, что у storage.db.load_events_between:
+        события из [start_ts, end_ts) плюс последнее событие до start_ts.
+        """
+        with self._lock:
+            lo = bisect_left(self._ts, int(start_ts))
+            hi = len(self._ts) if end_ts is None else bisect_left(self._ts, int(end_ts), lo)
+            if lo > 0:
+                lo -= 1
+            ts_slice = self._ts[lo:hi]
+            st_slice = self._st[lo:hi]
+        return [(ts, bool(st)) for ts, st in zip(ts_slice, st_slice)]
+
+    def arrays_between(
+        self,
+        start_ts: int,
+        end_ts: Optional[int] = None,
+    ) -> Tuple[array, array]:
+        """
+        То же окно, что events_between, но копиями буферов
+        (array('q') с ts, array('b') со статусами) — для векторного расчёта.
+        """
+        with self._lock:
+            lo = bisect_left(self._ts, int(start_ts))
+            hi = len(self._ts) if end_ts is None else bisect_left(self._ts, int(end_ts), lo)
+            if lo > 0:
+                lo -= 1
+            return self._ts[lo:hi], self._st[lo:hi]
+
+    def last_transitions(self) -> Tuple[Optional[int], Optional[int]]:
+        """
+        (ts последнего перехода on->off, ts последнего перехода off->on).
+        Идём с конца ленты, пока не найдём оба.
+        """
+        last_off_ts: Optional[int] = None
+        last_on_ts: Optional[int] = None
+
+        with self._lock:
+            idx = len(self._ts) - 1
+            while idx > 0 and (last_off_ts is None or last_on_ts is None):
+                prev_st = self._st[idx - 1]
+                st = self._st[idx]
+                if prev_st and not st and last_off_ts is None:
+                    last_off_ts = self._ts[idx]
+                elif (not prev_st) and st and last_on_ts is None:
+                    last_on_ts = self._ts[idx]
+                idx -= 1
+
+        return last_off_ts, last_on_ts
+
+
+def collapse_readings(
+    timeline: EventTimeline,
+    readings: Iterable[Tuple[int, bool]],
+) -> List[Tuple[int, bool]]:
+    """
+    Оставить из показаний датчика только переходы относительно истории.
+
+    Показания идут по времени; каждое сравнивается со статусом в свой момент:
+    по последнему событию ленты с меткой <= ts или по уже принятому переходу
+    пачки, если он не старше (с той же меткой переход пачки встанет после
+    события ленты). Так повторно присланные показания отбрасываются, а
+    показания между уже записанными событиями не теряются.
+    """
+    transitions: List[Tuple[int, bool]] = []
+    for ts, status in sorted(readings, key=lambda r: r[0]):
+        previous: Optional[bool] = None
+        stored = timeline.event_at(ts)
+        if stored is not None:
+            previous = stored[1]
+        if transitions and (stored is None or transitions[-1][0] >= stored[0]):
+            previous = transitions[-1][1]
+        if status != previous:
+            transitions.append((ts, status))
+    return transitions
@@ -0,0 +1,118 @@
+# powerbot/services/daily_stats.py
+import threading
+import time
+from datetime import datetime, date, time as dtime, timedelta
+from typing import Dict, Iterable, Optional
+
+from powerbot.domain.stats import compute_days_stats
+from powerbot.domain.stats_np import HAS_NUMPY, compute_days_stats_np
+from powerbot.storage.rollup import drop_rollups_since, load_rollups, save_rollups
+from powerbot.config.config import settings
+from powerbot.storage.timeline import get_timeline, subscribe_timelines
+
+# закрытые дни площадки {site: {day: stats}}, уже прочитанные из
+# power_daily_rollup или посчитанные; событие трогает только словарь своей
+# площадки. Под _closed_lock же идёт запись в power_daily_rollup (см. get_days_stats)
+_closed_days: Dict[str, Dict[date, Optional[dict]]] = {}
+_closed_lock = threading.Lock()
+
+
+def _day_bounds(day: date) -> tuple[int, int]:
+    day_start = datetime.combine(day, dtime.min)
+    return int(day_start.timestamp()), int((day_start + timedelta(days=1)).timestamp())
+
+
+def _forget_since(site: str, ts: int, status: bool) -> None:
+    """
+    Событие меняет свой день и все последующие (как invalidate_rollups_since).
+
+    Вызывается после вставки события в ленту, а invalidate_rollups_since —
+    ещё раньше, в транзакции события. Если между ними get_days_stats успел
+    сохранить день по старой ленте, этот день есть в памяти — тогда
+    удаляем его строки и из power_daily_rollup.
+    """
+    with _closed_lock:
+        site_days = _closed_days.get(site)
+        if not site_days:
+            return
+        stale = [d for d in site_days if _day_bounds(d)[1] > ts]
+        for day in stale:
+            del site_days[day]
+        if stale:
+            drop_rollups_since(site, ts)
+
+
+subscribe_timelines(_forget_since)
+
+
+def get_days_stats(
+    days: Iterable[date],
+    now_ts: Optional[int] = None,
+    site: Optional[str] = None,
+) -> Dict[date, Optional[dict]]:
+    """
+    Статистика площадки по дням: {day: stats | None}.
+
+    stats — как у compute_day_stats, плюс "hourly_online" (24 значения).
+    Закрытые дни (раньше сегодняшнего) берутся из памяти / power_daily_rollup
+    и считаются по событиям только один раз; сегодняшний — всегда вживую.
+
+    Если за время расчёта в ленту пришло событие (timeline.revision
+    изменился), результат отдаётся, но не запоминается и не сохраняется:
+    он мог быть посчитан по ленте без этого события.
+    """
+    if now_ts is None:
+        now_ts = int(time.time())
+    site = site or settings.DEFAULT_SITE
+    timeline = get_timeline(site)
+    revision = timeline.revision
+    today = datetime.fromtimestamp(now_ts).date()
+
+    days = sorted(set(days))
+    if not len(timeline):
+        # площадка без событий: считать и сохранять в rollup нечего
+        return {d: None for d in days}
+    closed = [d for d in days if d < today]
+
+    with _closed_lock:
+        site_days = _closed_days.get(site, {})
+        result = {d: site_days[d] for d in closed if d in site_days}
+
+    not_in_memory = [d for d in closed if d not in result]
+    if not_in_memory:
+        from_db = load_rollups(site, not_in_memory)
+        with _closed_lock:
+            if timeline.revision == revision:
+                _closed_days.setdefault(site, {}).update(from_db)
+        result.update(from_db)
+
+    pending = [d for d in days if d not in result]
+    if not pending:
+        return result
+
+    range_start, _ = _day_bounds(pending[0])
+    _, range_end = _day_bounds(pending[-1])
+    if HAS_NUMPY:
+        ts_buf, st_buf = timeline.arrays_between(range_start, range_end)
+        computed = compute_days_stats_np(pending, ts_buf, st_buf, now_ts)
+    else:
+        computed = compute_days_stats(pending, timeline.events_between(range_start, range_end))
+    result.update(computed)
+
+    to_save = []
+    for day in pending:
+        if day < today:
+            day_start_ts, day_end_ts = _day_bounds(day)
+            to_save.append((day, day_start_ts, day_end_ts, computed[day]))
+
+    if to_save:
+        with _closed_lock:
+            # проверка и запись под одной блокировкой с _forget_since: либо
+            # событие уже видно в revision, либо _forget_since найдёт
+            # сохранённые дни и удалит их
+            if timeline.revision == revision:
+                save_rollups(site, to_save)
+                _closed_days.setdefault(site, {}).update(
+                    {day: stats for day, _, _, stats in to_save}
+                )
+    return result
@@ -0,0 +1,69 @@
+# powerbot/services/fanout.py
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from powerbot.lang.i18n import BASE_LANG
+from powerbot.storage.chat import load_chat_langs
+
+
+@dataclass
+class FanoutPlan:
+    """
+    Готовая рассылка:
+      - payloads — уникальные тексты [(text, with_read_button)];
+      - deliveries — [(chat_id, thread_id, индекс в payloads)].
+    """
+
+    payloads: List[Tuple[str, bool]] = field(default_factory=list)
+    deliveries: List[Tuple[int, Optional[int], int]] = field(default_factory=list)
+
+    def first_text(self) -> Optional[str]:
+        if not self.deliveries:
+            return None
+        return self.payloads[self.deliveries[0][2]][0]
+
+
+def plan_fanout(
+    subscribers: Iterable[dict],
+    render: Callable[[str, Optional[str]], Optional[str]],
+    with_read_button: bool = True,
+) -> FanoutPlan:
+    """
+    Раскладываем рассылку по языкам и группам YASNO чатов.
+
+    Языки всех чатов читаются одним запросом, а render(lang, group)
+    вызывается один раз на пару (язык, группа) — тексты для подписчиков
+    с одинаковой парой совпадают. render может вернуть None/"" — таким
+    чатам ничего не шлём.
+    """
+    langs = load_chat_langs()
+    plan = FanoutPlan()
+    payload_by_key: Dict[Tuple[str, Optional[str]], Optional[int]] = {}
+    # разные группы часто дают одинаковый текст (например, «світло є») —
+    # храним его один раз
+    payload_by_text: Dict[str, int] = {}
+
+    for sub in subscribers:
+        chat_id = sub.get("chat_id")
+        thread_id = sub.get("thread_id")
+        if chat_id is None:
+            continue
+        chat_id = int(chat_id)
+
+        lang = langs.get((chat_id, thread_id)) or BASE_LANG
+        key = (lang, sub.get("group"))
+        if key not in payload_by_key:
+            text = render(*key)
+            if not text:
+                payload_by_key[key] = None
+            else:
+                if text not in payload_by_text:
+                    payload_by_text[text] = len(plan.payloads)
+                    plan.payloads.append((text, with_read_button))
+                payload_by_key[key] = payload_by_text[text]
+
+        idx = payload_by_key[key]
+        if idx is not None:
+            plan.deliveries.append((chat_id, thread_id, idx))
+
+    return plan
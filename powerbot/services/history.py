@@ -0,0 +1,135 @@
+# powerbot/services/history.py
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from powerbot.constants.constants import DAY_NAMES_SHORT
+from powerbot.domain.stats import format_duration_ua
+from powerbot.services.daily_stats import get_days_stats
+from powerbot.storage.timeline import get_timeline
+
+HistoryKey = Tuple[str, int, int, int]
+
+# (площадка, days_window, минута, ревизия ленты) -> готовая история
+_history_cache: Dict[HistoryKey, dict] = {}
+# расчёты, которые идут прямо сейчас: одинаковые запросы ждут один Future
+_history_inflight: Dict[HistoryKey, Future] = {}
+# под замком — только словари; сам расчёт идёт без него
+_history_lock = threading.Lock()
+
+
+def _format_outages(stats_day: dict, is_today: bool, now_ts: int) -> list:
+    outages_list = []
+    for start_ts, end_ts in stats_day["outages"]:
+        if end_ts is None:
+            if is_today:
+                end_ts_eff = now_ts
+                is_open = True
+            else:
+                end_ts_eff = stats_day["day_end_ts"]
+                is_open = False
+        else:
+            end_ts_eff = end_ts
+            is_open = False
+
+        duration = max(0, end_ts_eff - start_ts)
+        outages_list.append(
+            {
+                "start_str": time.strftime("%d.%m %H:%M", time.localtime(start_ts)),
+                "end_str": "триває" if is_open else time.strftime("%d.%m %H:%M", time.localtime(end_ts_eff)),
+                "duration_str": format_duration_ua(duration),
+                "is_open": is_open,
+            }
+        )
+    return outages_list
+
+
+def _build_history(site: str, days_window: int, now_ts: int) -> dict:
+    today = datetime.fromtimestamp(now_ts).date()
+    days = [today - timedelta(days=i) for i in range(days_window)]
+    days_stats = get_days_stats(days, now_ts, site)
+
+    history_days = []
+    for day in days:
+        stats_day = days_stats.get(day)
+
+        entry = {
+            "date_str": day.strftime("%d.%m.%Y"),
+            "weekday": DAY_NAMES_SHORT[day.weekday()],
+            "has_data": bool(stats_day),
+            "on_str": "",
+            "off_str": "",
+            "outages": [],
+        }
+
+        if stats_day:
+            entry["on_str"] = format_duration_ua(stats_day["on_seconds"])
+            entry["off_str"] = format_duration_ua(stats_day["off_seconds"])
+            entry["outages"] = _format_outages(stats_day, day == today, now_ts)
+
+        history_days.append(entry)
+
+    return {
+        "history_days": history_days,
+        "stats_today": days_stats.get(today),
+    }
+
+
+def build_history(site: str, days_window: int, now_ts: Optional[int] = None) -> dict:
+    """
+    История площадки по дням для "/" и "/history-data":
+      {"history_days": [...], "stats_today": stats | None}
+
+    Все дни считаются одним проходом (get_days_stats). Результат
+    переиспользуется в пределах минуты, пока в ленте нет новых событий,
+    поэтому одновременные перезагрузки дашборда делят одну работу.
+    """
+    if now_ts is None:
+        now_ts = int(time.time())
+
+    timeline = get_timeline(site)
+    if not len(timeline):
+        # неизвестная площадка (?site= с дашборда) — пустая история, без кэша
+        return _build_history(site, days_window, now_ts)
+
+    minute = now_ts // 60
+    key = (site, days_window, minute, timeline.revision)
+
+    with _history_lock:
+        cached = _history_cache.get(key)
+        if cached is not None:
+            return cached
+        fut = _history_inflight.get(key)
+        if fut is not None:
+            owner = False
+        else:
+            fut = Future()
+            _history_inflight[key] = fut
+            owner = True
+
+    # другие окна и площадки считаются параллельно; этот же ключ ждёт владельца
+    if not owner:
+        return fut.result()
+
+    try:
+        history = _build_history(site, days_window, now_ts)
+    except Exception as e:
+        with _history_lock:
+            _history_inflight.pop(key, None)
+        fut.set_exception(e)
+        raise
+
+    with _history_lock:
+        # держим только текущую минуту и ревизию ленты каждой площадки
+        stale = [
+            k for k in _history_cache
+            if k[2] != minute or (k[0] == site and k[3] != key[3])
+        ]
+        for old_key in stale:
+            del _history_cache[old_key]
+        _history_cache[key] = history
+        _history_inflight.pop(key, None)
+    fut.set_result(history)
+    return history
@@ -0,0 +1,139 @@
+# powerbot/services/metrics.py
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from powerbot.domain.stats import compute_uptime_ratio_window
+from powerbot.storage.state import load_all_states
+from powerbot.storage.timeline import get_timeline, known_sites, subscribe_timelines
+
+WINDOWS = (
+    ("24h", 24 * 3600),
+    ("7d", 7 * 24 * 3600),
+)
+
+# (событий всего, статус online|offline|unknown, [(окно, аптайм | None)])
+SiteValues = Tuple[int, str, List[Tuple[str, Optional[float]]]]
+
+
+def _status_label(last_status: Optional[bool]) -> str:
+    if last_status is True:
+        return "online"
+    if last_status is False:
+        return "offline"
+    return "unknown"
+
+
+class PowerMetrics:
+    """
+    Готовая Prometheus-экспозиция для /metrics, по серии на площадку.
+
+    Значения площадки пересчитываются при каждом её событии (подписка на
+    ленты) и по таймеру — чтобы сдвигались скользящие окна аптайма.
+    Событие пересчитывает только свою площадку; текст собирается при
+    следующем скрейпе и не зависит от размера истории.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._statuses: Dict[str, Optional[bool]] = {}
+        self._statuses_loaded = False
+        self._values: Dict[str, SiteValues] = {}
+        self._text: Optional[str] = None
+        subscribe_timelines(lambda site, ts, status: self.refresh(site))
+
+    def _ensure_statuses(self) -> None:
+        # под self._lock
+        if not self._statuses_loaded:
+            for site, state in load_all_states().items():
+                self._statuses.setdefault(site, state.get("last_status"))
+            self._statuses_loaded = True
+
+    def set_status(self, site: str, is_online: Optional[bool]) -> None:
+        with self._lock:
+            self._ensure_statuses()
+            self._statuses[site] = is_online
+        self.refresh(site)
+
+    def _site_values(self, site: str, last_status: Optional[bool], now_ts: int) -> SiteValues:
+        timeline = get_timeline(site)
+        # самое длинное окно — 7 дней, старше история не нужна
+        longest = max(seconds for _, seconds in WINDOWS)
+        events = timeline.events_between(now_ts - longest)
+        uptimes = [
+            (label, compute_uptime_ratio_window(events, seconds, now_ts))
+            for label, seconds in WINDOWS
+        ]
+        return len(timeline), _status_label(last_status), uptimes
+
+    def refresh(self, site: Optional[str] = None, now_ts: Optional[int] = None) -> None:
+        """
+        Пересчитать одну площадку (site) или все.
+        """
+        if now_ts is None:
+            now_ts = int(time.time())
+
+        with self._lock:
+            self._ensure_statuses()
+            statuses = dict(self._statuses)
+
+        sites = [site] if site is not None else sorted(set(known_sites()) | set(statuses))
+        values = {s: self._site_values(s, statuses.get(s), now_ts) for s in sites}
+
+        with self._lock:
+            self._values.update(values)
+            self._text = None
+
+    def _render(self) -> str:
+        # под self._lock
+        values = sorted(self._values.items())
+
+        lines = []
+        # --- общее количество событий ---
+        lines.append("# HELP power_events_total Total number of power events")
+        lines.append("# TYPE power_events_total counter")
+        for site, (events_total, _, _) in values:
+            lines.append(f'power_events_total{{site="{site}"}} {events_total}')
+
+        # --- текущий статус ---
+        lines.append("# HELP power_status Current power status as a one-hot gauge")
+        lines.append("# TYPE power_status gauge")
+        for site, (_, current_label, _) in values:
+            for st in ("online", "offline", "unknown"):
+                val = 1 if st == current_label else 0
+                lines.append(f'power_status{{site="{site}",status="{st}"}} {val}')
+
+        # --- аптайм ---
+        lines.append("# HELP power_uptime_ratio Power uptime ratio over rolling window (0..1)")
+        lines.append("# TYPE power_uptime_ratio gauge")
+        for site, (_, _, uptimes) in values:
+            for label, uptime in uptimes:
+                if uptime is not None:
+                    lines.append(
+                        f'power_uptime_ratio{{site="{site}",window="{label}"}} {uptime:.6f}'
+                    )
+
+        return "\n".join(lines) + "\n"
+
+    def exposition(self) -> str:
+        if not self._values:
+            self.refresh()
+        with self._lock:
+            if self._text is None:
+                self._text = self._render()
+            return self._text
+
+    def run_refresher(self, interval: float) -> None:
+        """
+        Фоновый поток: сдвигает скользящие окна аптайма всех площадок.
+        """
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                logging.exception("Не вдалося оновити метрики")
+            time.sleep(interval)
+
+
+power_metrics = PowerMetrics()
@@ -1,93 +1,316 @@
 # powerbot/services/power_status.py
 import logging
+import threading
 import time
-from typing import Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from powerbot.config.config import settings
-from powerbot.storage.state import load_state, save_state
-from powerbot.storage.db import log_power_event
-from powerbot.storage.subscribers import load_subscribers
+from powerbot.lang.i18n import t
+from powerbot.storage.db import has_idempotency_key
+from powerbot.storage.state import load_state
+from powerbot.storage.timeline import get_timeline, record_power_event, record_power_events
+from powerbot.storage.registry import subscriber_registry
 from powerbot.domain.stats import format_duration_ua
-from powerbot.telegram.client import send_telegram_message_limited
-from powerbot.yasno.client import yasno_predict_on_time, DayStatus
+from powerbot.domain.timeline import collapse_readings
+from powerbot.services.fanout import FanoutPlan, plan_fanout
+from powerbot.services.metrics import power_metrics
+from powerbot.storage.notifications import (
+    PendingNotification,
+    drop_notification,
+    load_pending_notifications,
+    retry_notification,
+)
+from powerbot.telegram.outbox import queue_notification_fanout, retry_delay
+from powerbot.yasno.cache.cache import parse_target
+from powerbot.yasno.client import yasno_schedule, DayStatus, ScheduleSnapshot
 
 
-def apply_status_change(is_online: bool, now_ts: Optional[int] = None) -> Optional[str]:
+# (site, ts, status) — одно показание датчика
+Reading = Tuple[str, int, bool]
+
+# чтение-изменение-запись состояния площадки из параллельных вебхуков
+_status_lock = threading.Lock()
+
+# уведомления готовятся в фоне, по одному: вебхук отвечает сразу после
+# записи события (вместе с ним — строка power_notifications), а порядок
+# рассылок сохраняется
+_notify_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="power-notify")
+
+
+def apply_status_change(
+    is_online: bool,
+    now_ts: Optional[int] = None,
+    site: Optional[str] = None,
+    idempotency_key: Optional[str] = None,
+) -> str:
     """
     Вызывается из вебхука (Flask-поток).
-    Логируем событие в БД, обновляем state.json и шлём
-    уведомления подписчикам (личка / группы / ветки) с rate-limit
-    и поддержкой языка чата.
+    Логируем событие площадки, её новое состояние (power_state) и рассылку
+    о смене статуса (power_notifications) одной транзакцией; сама рассылка
+    готовится в фоновом потоке (deliver_pending_notifications), вебхук её
+    не ждёт, а после падения процесса она дойдёт при следующем старте.
+
+    Возвращает "initialized" | "unchanged" | "duplicate" | "applied".
     """
     if now_ts is None:
         now_ts = int(time.time())
+    site = site or settings.DEFAULT_SITE
 
-    state = load_state()
-    last_status = state.get("last_status")
-    last_change_ts = state.get("last_change_ts")
+    with _status_lock:
+        # повтор вебхука (датчик не дождался ответа) — событие уже записано
+        if idempotency_key is not None and has_idempotency_key(site, idempotency_key):
+            logging.info("Повтор webhook [%s], ключ %s, ігноруємо", site, idempotency_key)
+            return "duplicate"
 
-    # первый запуск — просто зафиксировали состояние, без уведомления
-    if last_status is None:
-        state["last_status"] = is_online
-        state["last_change_ts"] = now_ts
-        save_state(state)
-        log_power_event(is_online, now_ts)
-        logging.info("Ініціалізація стану: %s", is_online)
-        return None
+        state = load_state(site)
+        last_status = state.get("last_status")
+        last_change_ts = state.get("last_change_ts")
 
-    # если состояние не изменилось — ничего не делаем
-    if is_online == last_status:
-        logging.info("Стан не змінився (%s), ігноруємо", is_online)
-        return None
+        # если состояние не изменилось — ничего не делаем
+        if last_status is not None and is_online == last_status:
+            logging.info("Стан не змінився [%s] (%s), ігноруємо", site, is_online)
+            return "unchanged"
 
-    # считаем длительность отключения (если было off -> стало on)
-    outage_seconds = None
-    if last_status is False and is_online is True and last_change_ts is not None:
-        outage_seconds = max(0, now_ts - int(last_change_ts))
+        # считаем длительность отключения (если было off -> стало on)
+        outage_seconds = None
+        if last_status is False and is_online is True and last_change_ts is not None:
+            outage_seconds = max(0, now_ts - int(last_change_ts))
 
-    state["last_status"] = is_online
-    state["last_change_ts"] = now_ts
-    save_state(state)
+        # первый запуск — просто фиксируем состояние, без уведомления
+        notify = last_status is not None
+        if not record_power_event(
+            is_online,
+            now_ts,
+            site,
+            idempotency_key,
+            set_state=True,
+            notify=notify,
+            outage_seconds=outage_seconds,
+        ):
+            return "duplicate"
+        power_metrics.set_status(site, is_online)
 
-    log_power_event(is_online, now_ts)
+    if not notify:
+        logging.info("Ініціалізація стану [%s]: %s", site, is_online)
+        return "initialized"
 
-    subscribers = load_subscribers()
-    if not subscribers:
-        logging.info("Стан змінився на %s, але немає підписників", is_online)
-        return None
-
-    # подготовим общий YASNO-прогноз (время включения), чтобы не дергать API для каждого чата
-    yasno_eta_dt = None
-    yasno_eta_status = None
-    yasno_has_data = False
-
-    if (not is_online) and YASNO_REGION_ID and YASNO_DSO_ID and YASNO_GROUP:
-        try:
-            eta = yasno_predict_on_time(
-                now_ts=now_ts,
-                region_id=YASNO_REGION_ID,
-                dso_id=YASNO_DSO_ID,
-                group_str=YASNO_GROUP,
-            )
-            if eta:
-                yasno_eta_dt, yasno_eta_status = eta
-                yasno_has_data = True
-        except Exception:
-            logging.exception("Помилка при розрахунку прогнозу за даними")
-            yasno_has_data = False
+    schedule_pending_notifications()
+    return "applied"
 
-    first_msg: Optional[str] = None
-    now_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now_ts))
 
+def apply_status_batch(readings: Iterable[Reading]) -> Dict[str, object]:
+    """
+    Пачка показаний от шлюза датчиков (бывает сотни за раз — шлюз досылает
+    всё, что накопил без связи).
+
+    По каждой площадке показания схлопываются до переходов (collapse_readings),
+    все переходы пишутся в БД одной транзакцией. Состояние площадки
+    сдвигается к её последнему переходу, если он новее текущего; уведомление —
+    одно на площадку и только о последнем переходе, пишется в той же
+    транзакции и готовится в фоне.
+    """
+    by_site: Dict[str, List[Tuple[int, bool]]] = {}
+    total = 0
+    for site, ts, status in readings:
+        by_site.setdefault(site, []).append((int(ts), bool(status)))
+        total += 1
+
+    notifications: List[Tuple[str, bool, int, Optional[int]]] = []
+    states: Dict[str, Tuple[bool, int]] = {}
+
+    with _status_lock:
+        transitions = {
+            site: collapse_readings(get_timeline(site), items)
+            for site, items in by_site.items()
+        }
+
+        for site, items in transitions.items():
+            if not items:
+                continue
+            final_ts, final_status = items[-1]
+
+            state = load_state(site)
+            last_status = state.get("last_status")
+            last_change_ts = state.get("last_change_ts")
+
+            if last_status is not None and last_change_ts is not None and final_ts < int(last_change_ts):
+                # досылка старой истории — текущее состояние не трогаем
+                continue
+            if final_status == last_status:
+                continue
+
+            states[site] = (final_status, final_ts)
+
+            if last_status is None:
+                logging.info("Ініціалізація стану [%s]: %s", site, final_status)
+                continue
+
+            outage_seconds = None
+            if final_status is True:
+                # начало отключения: предыдущий переход пачки или прошлое состояние
+                off_since = last_change_ts
+                if len(items) > 1 and (off_since is None or items[-2][0] >= int(off_since)):
+                    off_since = items[-2][0]
+                if off_since is not None:
+                    outage_seconds = max(0, final_ts - int(off_since))
+
+            notifications.append((site, final_status, final_ts, outage_seconds))
+
+        # события, новые состояния площадок и рассылки — одной транзакцией
+        recorded = record_power_events(
+            (
+                (site, ts, status)
+                for site, items in transitions.items()
+                for ts, status in items
+            ),
+            states,
+            notifications,
+        )
+        for site, (status, _) in states.items():
+            power_metrics.set_status(site, status)
+
+    if notifications:
+        schedule_pending_notifications()
+
+    logging.info(
+        "Пакет показань: %s, записано переходів: %s, сповіщень: %s",
+        total, recorded, len(notifications),
+    )
+    return {
+        "readings": total,
+        "recorded": recorded,
+        "collapsed": total - recorded,
+        "notified_sites": sorted(site for site, _, _, _ in notifications),
+    }
+
+
+def schedule_pending_notifications() -> Future:
+    """
+    Разослать записанные смены статуса в фоновом потоке.
+    Вызывается после записи события и из run_notification_retries.
+    """
+    return _notify_executor.submit(_deliver_quietly)
+
+
+def run_notification_retries(interval: float) -> None:
+    """
+    Фоновый поток: первый проход — сразу (смены статуса, записанные до
+    падения процесса), дальше раз в interval сек — отложенные после сбоя.
+    """
+    while True:
+        schedule_pending_notifications().result()
+        time.sleep(interval)
+
+
+def _deliver_quietly() -> None:
+    try:
+        deliver_pending_notifications()
+    except Exception:
+        logging.exception("Не вдалося обробити чергу сповіщень")
+
+
+def deliver_pending_notifications(batch_size: int = 100) -> int:
+    """
+    Один проход по power_notifications: для каждой смены статуса готовим
+    рассылку и ставим её в outbox, удаляя строку той же транзакцией.
+
+    Если подготовить рассылку не вышло (например, упал рендер), строка
+    откладывается с нарастающей паузой (retry_delay, как у outbox), после
+    OUTBOX_MAX_ATTEMPTS попыток — удаляется. Более старые строки площадки
+    снимаются, как только разослан её новый статус.
+    Возвращает количество обработанных уведомлений.
+    """
+    done = 0
+    after_id = 0
+    while True:
+        pending = load_pending_notifications(after_id, batch_size)
+        if not pending:
+            return done
+        for notification in pending:
+            after_id = notification.id
+            try:
+                plans = plan_status_change(
+                    notification.site,
+                    notification.is_online,
+                    notification.ts,
+                    notification.outage_seconds,
+                )
+                queue_notification_fanout(notification, plans)
+            except Exception:
+                _handle_failure(notification)
+                continue
+            done += 1
+
+
+def _handle_failure(notification: PendingNotification) -> None:
+    attempts = notification.attempts + 1
+    if attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        logging.exception(
+            "Сповіщення [%s] не розіслано після %s спроб, видаляємо",
+            notification.site,
+            attempts,
+        )
+        drop_notification(notification.id)
+        return
+
+    logging.exception(
+        "Не вдалося розіслати сповіщення [%s], повторимо пізніше",
+        notification.site,
+    )
+    retry_notification(notification.id, retry_delay(notification.attempts))
+
+
+def plan_status_change(
+    site: str,
+    is_online: bool,
+    now_ts: int,
+    outage_seconds: Optional[int] = None,
+) -> List[FanoutPlan]:
+    """
+    Рассылка о смене статуса площадки: текст на (язык, группа), план
+    на каждую пару YASNO подписчиков (/region).
+    """
+    subscribers = subscriber_registry.snapshot(site=site)
+    if not subscribers:
+        logging.info("Стан [%s] змінився на %s, але немає підписників", site, is_online)
+        return []
+
+    by_target: Dict[Optional[str], List[dict]] = {}
     for sub in subscribers:
-        chat_id = sub.get("chat_id")
-        thread_id = sub.get("thread_id")
-        if chat_id is None:
-            continue
-        chat_id = int(chat_id)
+        by_target.setdefault(sub.get("target"), []).append(sub)
+
+    # один снимок графика на пару region/dso: прогноз для каждой группы
+    # считается из него, без запросов на каждый чат
+    schedules: Dict[Optional[str], Optional[ScheduleSnapshot]] = {}
+    if not is_online:
+        for target in by_target:
+            pair = parse_target(target)
+            schedules[target] = None
+            if pair is None:
+                continue
+            try:
+                schedules[target] = yasno_schedule(region_id=pair[0], dso_id=pair[1])
+            except Exception:
+                logging.exception("Помилка при розрахунку прогнозу за даними")
 
-        lang = get_lang_for_chat(chat_id, thread_id)
+    eta_by_group: Dict[Tuple[Optional[str], str], Optional[Tuple[datetime, DayStatus]]] = {}
 
+    def group_eta(
+        target: Optional[str],
+        group: Optional[str],
+    ) -> Optional[Tuple[datetime, DayStatus]]:
+        schedule = schedules.get(target)
+        if schedule is None or not group:
+            return None
+        if (target, group) not in eta_by_group:
+            eta_by_group[(target, group)] = schedule.predict_on_time(group, now_ts)
+        return eta_by_group[(target, group)]
+
+    now_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now_ts))
+
+    def render(lang: str, group: Optional[str], target: Optional[str]) -> str:
         lines: List[str] = []
 
         # заголовок
@@ -112,7 +335,9 @@ def apply_status_change(is_online: bool, now_ts: Optional[int] = None) -> Option
 
         # YASNO-прогноз (только при отключении)
         if not is_online:
-            if yasno_has_data and yasno_eta_dt is not None and yasno_eta_status is not None:
+            eta = group_eta(target, group)
+            if eta is not None:
+                yasno_eta_dt, yasno_eta_status = eta
                 eta_str = yasno_eta_dt.strftime("%H:%M")
                 if yasno_eta_status == DayStatus.EMERGENCY_SHUTDOWNS:
                     kind = "екстрене відключення" if lang == "uk" else "emergency outage"
@@ -123,7 +348,7 @@ def apply_status_change(is_online: bool, now_ts: Optional[int] = None) -> Option
                     t(
                         "notify.yasno.predicted_on",
                         lang=lang,
-                        group=YASNO_GROUP,
+                        group=group,
                         kind=kind,
                         eta=eta_str,
                     )
@@ -132,18 +357,15 @@ def apply_status_change(is_online: bool, now_ts: Optional[int] = None) -> Option
                 # нет данных по графику
                 lines.append(t("notify.yasno.no_data", lang=lang))
 
-        msg = "\n".join(lines)
+        return "\n".join(lines)
 
-        # запомним любой один текст, чтобы вернуть из функции (для логов/отладки)
-        first_msg = first_msg or msg
-
-        # приватные чаты — с кнопкой "Прочитано"
-        send_telegram_message_limited(
-            chat_id=chat_id,
-            text=msg,
-            thread_id=thread_id,
+    # текст рендерится один раз на (пара, язык, группа);
+    # приватные чаты — с кнопкой "Прочитано"
+    return [
+        plan_fanout(
+            target_subs,
+            lambda lang, group, target=target: render(lang, group, target),
             with_read_button=True,
         )
-
-    return first_msg
-
+        for target, target_subs in by_target.items()
+    ]
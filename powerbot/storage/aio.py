@@ -0,0 +1,43 @@
+# powerbot/storage/aio.py
+"""
+Асинхронный фасад над блокирующим хранилищем для Telegram-обработчиков.
+
+PTB работает с concurrent_updates(True) на одном event loop, поэтому любой
+sqlite3 / JSON-файл / HTTP-запрос прямо в обработчике тормозит все апдейты.
+Здесь такие вызовы уходят в ограниченный пул потоков.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Optional, TypeVar
+
+from powerbot.config.config import settings
+from powerbot.storage.chat import get_chat_lang, set_chat_lang
+from powerbot.storage.state import load_state
+
+T = TypeVar("T")
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.STORAGE_IO_WORKERS,
+    thread_name_prefix="storage-io",
+)
+
+
+async def run_blocking(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Выполнить блокирующую функцию в пуле и дождаться результата.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(func, *args, **kwargs))
+
+
+async def aget_chat_lang(chat_id: int, thread_id: Optional[int]) -> Optional[str]:
+    return await run_blocking(get_chat_lang, chat_id, thread_id)
+
+
+async def aset_chat_lang(chat_id: int, thread_id: Optional[int], lang: str) -> None:
+    await run_blocking(set_chat_lang, chat_id, thread_id, lang)
+
+
+async def aload_state(site: Optional[str] = None) -> dict:
+    return await run_blocking(load_state, site)
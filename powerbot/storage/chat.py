@@ -2,9 +2,9 @@
 import logging
 import sqlite3
 import time
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
-from powerbot.config.config import settings
+from powerbot.storage.engine import connection, transaction
 
 
 def init_chat_settings() -> None:
@@ -14,27 +14,23 @@ def init_chat_settings() -> None:
       - thread_id (NULL для обычных чатов / лички)
       - lang ('uk', 'en' и т.д.)
     """
-    conn = sqlite3.connect(settings.DB_FILE)
     try:
-        cur = conn.cursor()
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS chat_settings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                chat_id INTEGER NOT NULL,
-                thread_id INTEGER,
-                lang TEXT NOT NULL,
-                created_at INTEGER NOT NULL,
-                updated_at INTEGER NOT NULL,
-                UNIQUE(chat_id, thread_id)
+        with transaction() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS chat_settings (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chat_id INTEGER NOT NULL,
+                    thread_id INTEGER,
+                    lang TEXT NOT NULL,
+                    created_at INTEGER NOT NULL,
+                    updated_at INTEGER NOT NULL,
+                    UNIQUE(chat_id, thread_id)
+                )
+                """
             )
-            """
-        )
-        conn.commit()
     except Exception:
         logging.exception("Не вдалося створити таблицю chat_settings")
-    finally:
-        conn.close()
 
 
 def _select_lang(cur: sqlite3.Cursor, chat_id: int, thread_id: Optional[int]) -> Optional[str]:
@@ -56,15 +52,26 @@ def get_chat_lang(chat_id: int, thread_id: Optional[int]) -> Optional[str]:
     """
     Возвращает сохранённый язык для чата/треда, либо None.
     """
-    conn = sqlite3.connect(settings.DB_FILE)
     try:
-        cur = conn.cursor()
-        return _select_lang(cur, chat_id, thread_id)
+        with connection() as conn:
+            return _select_lang(conn.cursor(), chat_id, thread_id)
     except Exception:
         logging.exception("Не вдалося прочитати chat_lang")
         return None
-    finally:
-        conn.close()
+
+
+def load_chat_langs() -> Dict[Tuple[int, Optional[int]], str]:
+    """
+    Все сохранённые языки одним запросом: {(chat_id, thread_id): lang}.
+    Для рассылок — вместо отдельного запроса на каждого подписчика.
+    """
+    try:
+        with connection() as conn:
+            rows = conn.execute("SELECT chat_id, thread_id, lang FROM chat_settings").fetchall()
+    except Exception:
+        logging.exception("Не вдалося прочитати chat_settings")
+        return {}
+    return {(int(chat_id), thread_id): lang for chat_id, thread_id, lang in rows}
 
 
 def set_chat_lang(chat_id: int, thread_id: Optional[int], lang: str) -> None:
@@ -72,50 +79,47 @@ def set_chat_lang(chat_id: int, thread_id: Optional[int], lang: str) -> None:
     Сохраняет язык для чата/треда (INSERT или UPDATE).
     """
     now_ts = int(time.time())
-    conn = sqlite3.connect(settings.DB_FILE)
     try:
-        cur = conn.cursor()
-        existing = _select_lang(cur, chat_id, thread_id)
-        if existing is None:
-            # INSERT
-            if thread_id is None:
-                cur.execute(
-                    """
-                    INSERT INTO chat_settings (chat_id, thread_id, lang, created_at, updated_at)
-                    VALUES (?, NULL, ?, ?, ?)
-                    """,
-                    (chat_id, lang, now_ts, now_ts),
-                )
+        with transaction() as conn:
+            cur = conn.cursor()
+            existing = _select_lang(cur, chat_id, thread_id)
+            if existing is None:
+                # INSERT
+                if thread_id is None:
+                    cur.execute(
+                        """
+                        INSERT INTO chat_settings (chat_id, thread_id, lang, created_at, updated_at)
+                        VALUES (?, NULL, ?, ?, ?)
+                        """,
+                        (chat_id, lang, now_ts, now_ts),
+                    )
+                else:
+                    cur.execute(
+                        """
+                        INSERT INTO chat_settings (chat_id, thread_id, lang, created_at, updated_at)
+                        VALUES (?, ?, ?, ?, ?)
+                        """,
+                        (chat_id, thread_id, lang, now_ts, now_ts),
+                    )
             else:
-                cur.execute(
-                    """
-                    INSERT INTO chat_settings (chat_id, thread_id, lang, created_at, updated_at)
-                    VALUES (?, ?, ?, ?, ?)
-                    """,
-                    (chat_id, thread_id, lang, now_ts, now_ts),
-                )
-        else:
-            # UPDATE
-            if thread_id is None:
-                cur.execute(
-                    """
-                    UPDATE chat_settings
-                    SET lang = ?, updated_at = ?
-                    WHERE chat_id = ? AND thread_id IS NULL
-                    """,
-                    (lang, now_ts, chat_id),
-                )
-            else:
-                cur.execute(
-                    """
-                    UPDATE chat_settings
-                    SET lang = ?, updated_at = ?
-                    WHERE chat_id = ? AND thread_id = ?
-                    """,
-                    (lang, now_ts, chat_id, thread_id),
-                )
-        conn.commit()
+                # UPDATE
+                if thread_id is None:
+                    cur.execute(
+                        """
+                        UPDATE chat_settings
+                        SET lang = ?, updated_at = ?
+                        WHERE chat_id = ? AND thread_id IS NULL
+                        """,
+                        (lang, now_ts, chat_id),
+                    )
+                else:
+                    cur.execute(
+                        """
+                        UPDATE chat_settings
+                        SET lang = ?, updated_at = ?
+                        WHERE chat_id = ? AND thread_id = ?
+                        """,
+                        (lang, now_ts, chat_id, thread_id),
+                    )
     except Exception:
         logging.exception("Не вдалося оновити chat_lang")
-    finally:
-        conn.close()
@@ -1,16 +1,27 @@
 import logging
-import sqlite3
 import time
-from typing import List, Tuple, Optional
+from typing import Dict, Iterable, List, Tuple, Optional
 
 from powerbot.config.config import settings
 from powerbot.storage.chat import init_chat_settings
+from powerbot.storage.engine import connection, table_columns, transaction
+from powerbot.storage.notifications import add_notification, init_notifications
+from powerbot.storage.outbox import init_outbox
+from powerbot.storage.rollup import init_rollup_table, invalidate_rollups_since
+from powerbot.storage.state import init_state_table, write_state
+from powerbot.storage.subscribers import init_subscribers
 
 def init_db() -> None:
     """
     Инициализация базы:
     - гарантируем, что директория для файла БД существует;
     - создаём таблицу power_events при необходимости.
+
+    power_events.site — площадка (датчик); события из старых баз без
+    этой колонки относятся к DEFAULT_SITE.
+    power_events.idempotency_key — ключ вебхука (уникальный в пределах
+    площадки, если задан): повтор запроса датчиком не пишет событие второй
+    раз, а одинаковые ключи разных датчиков друг другу не мешают.
     """
     try:
         settings.DB_FILE.parent.mkdir(parents=True, exist_ok=True)
@@ -18,46 +29,205 @@ def init_db() -> None:
         logging.exception("Не вдалося створити директорію для БД: %s", settings.DB_FILE.parent)
         raise
 
-    conn = sqlite3.connect(settings.DB_FILE)
-    try:
-        cur = conn.cursor()
-        cur.execute(
+    with transaction() as conn:
+        conn.execute(
             """
             CREATE TABLE IF NOT EXISTS power_events (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 ts INTEGER NOT NULL,
-                status INTEGER NOT NULL  -- 1 = онлайн, 0 = офлайн
+                status INTEGER NOT NULL,  -- 1 = онлайн, 0 = офлайн
+                site TEXT NOT NULL,
+                idempotency_key TEXT
             )
             """
         )
-        conn.commit()
-    finally:
-        conn.close()
+        if "site" not in table_columns(conn, "power_events"):
+            conn.execute(
+                "ALTER TABLE power_events ADD COLUMN site TEXT NOT NULL DEFAULT ''"
+            )
+            conn.execute(
+                "UPDATE power_events SET site = ? WHERE site = ''",
+                (settings.DEFAULT_SITE,),
+            )
+            logging.info("power_events: додано колонку site (%s)", settings.DEFAULT_SITE)
+        if "idempotency_key" not in table_columns(conn, "power_events"):
+            conn.execute("ALTER TABLE power_events ADD COLUMN idempotency_key TEXT")
+            logging.info("power_events: додано колонку idempotency_key")
+        # NULL в уникальном индексе не конфликтуют — события без ключа не мешают
+        conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_power_events_site_idempotency_key "
+            "ON power_events(site, idempotency_key)"
+        )
+        conn.execute("DROP INDEX IF EXISTS idx_power_events_idempotency_key")
+        # все выборки идут по площадке и диапазону ts — без индекса это full scan
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_power_events_site_ts ON power_events(site, ts)"
+        )
+        conn.execute("DROP INDEX IF EXISTS idx_power_events_ts")
 
+    init_state_table()
     init_chat_settings()
+    init_subscribers()
+    init_rollup_table()
+    init_outbox()
+    init_notifications()
 
 
-def log_power_event(status: bool, ts: Optional[int] = None) -> None:
+def log_power_event(
+    status: bool,
+    ts: Optional[int] = None,
+    site: Optional[str] = None,
+    idempotency_key: Optional[str] = None,
+    set_state: bool = False,
+    notify: bool = False,
+    outage_seconds: Optional[int] = None,
+) -> bool:
+    """
+    Записать событие. False — у площадки уже есть событие с таким idempotency_key.
+    set_state — в той же транзакции сделать его текущим состоянием площадки.
+    notify — в той же транзакции поставить рассылку о смене статуса
+    (power_notifications).
+    """
     if ts is None:
         ts = int(time.time())
-    conn = sqlite3.connect(settings.DB_FILE)
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO power_events (ts, status) VALUES (?, ?)",
-            (int(ts), 1 if status else 0),
+    site = site or settings.DEFAULT_SITE
+    with transaction() as conn:
+        cur = conn.execute(
+            """
+            INSERT OR IGNORE INTO power_events (ts, status, site, idempotency_key)
+            VALUES (?, ?, ?, ?)
+            """,
+            (int(ts), 1 if status else 0, site, idempotency_key),
         )
-        conn.commit()
-    finally:
-        conn.close()
+        if cur.rowcount == 0:
+            return False
+        invalidate_rollups_since(conn, site, ts)
+        if set_state:
+            write_state(conn, site, status, ts)
+        if notify:
+            add_notification(conn, site, status, ts, outage_seconds)
+    return True
 
 
-def load_all_events() -> List[Tuple[int, bool]]:
-    conn = sqlite3.connect(settings.DB_FILE)
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT ts, status FROM power_events ORDER BY ts ASC")
-        rows = cur.fetchall()
-    finally:
-        conn.close()
+def has_idempotency_key(site: str, idempotency_key: str) -> bool:
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT 1 FROM power_events WHERE site = ? AND idempotency_key = ?",
+            (site, idempotency_key),
+        ).fetchone()
+    return row is not None
+
+
+def log_power_events(
+    events: Iterable[Tuple[str, int, bool]],
+    states: Optional[Dict[str, Tuple[bool, int]]] = None,
+    notifications: Iterable[Tuple[str, bool, int, Optional[int]]] = (),
+) -> int:
+    """
+    Пачка событий [(site, ts, status), ...] одной транзакцией.
+    states — {site: (status, ts)}: новое состояние площадок, в той же транзакции.
+    notifications — [(site, is_online, ts, outage_seconds)]: рассылки о сменах
+    статуса, тоже в той же транзакции.
+    Возвращает количество записанных событий.
+    """
+    rows = [(int(ts), 1 if status else 0, site) for site, ts, status in events]
+    notifications = list(notifications)
+    if not rows and not states and not notifications:
+        return 0
+
+    earliest: Dict[str, int] = {}
+    for ts, _, site in rows:
+        earliest[site] = min(ts, earliest.get(site, ts))
+
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT INTO power_events (ts, status, site) VALUES (?, ?, ?)",
+            rows,
+        )
+        for site, ts in earliest.items():
+            invalidate_rollups_since(conn, site, ts)
+        for site, (status, ts) in (states or {}).items():
+            write_state(conn, site, status, ts)
+        for site, is_online, ts, outage_seconds in notifications:
+            add_notification(conn, site, is_online, ts, outage_seconds)
+    return len(rows)
+
+
+def load_events_by_site() -> Dict[str, List[Tuple[int, bool]]]:
+    """
+    Все события, разложенные по площадкам: {site: [(ts, status), ...]}.
+    """
+    result: Dict[str, List[Tuple[int, bool]]] = {}
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT site, ts, status FROM power_events ORDER BY site, ts ASC, id ASC"
+        ).fetchall()
+    for site, ts, st in rows:
+        result.setdefault(site, []).append((int(ts), bool(st)))
+    return result
+
+
+def load_all_events(site: Optional[str] = None) -> List[Tuple[int, bool]]:
+    site = site or settings.DEFAULT_SITE
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT ts, status FROM power_events WHERE site = ? ORDER BY ts ASC, id ASC",
+            (site,),
+        ).fetchall()
+    return [(int(ts), bool(st)) for ts, st in rows]
+
+
+def load_events_between(
+    start_ts: int,
+    end_ts: Optional[int] = None,
+    site: Optional[str] = None,
+) -> List[Tuple[int, bool]]:
+    """
+    События площадки из окна [start_ts, end_ts) плюс последнее событие
+    ДО окна (по нему определяется статус в момент start_ts).
+    end_ts=None — без верхней границы.
+
+    Стоимость зависит от размера окна, а не от возраста БД и числа
+    площадок (индекс по (site, ts)).
+    """
+    site = site or settings.DEFAULT_SITE
+    with connection() as conn:
+        before = conn.execute(
+            """
+            SELECT ts, status FROM power_events
+            WHERE site = ? AND ts < ?
+            ORDER BY ts DESC, id DESC
+            LIMIT 1
+            """,
+            (site, int(start_ts)),
+        ).fetchone()
+
+        if end_ts is None:
+            rows = conn.execute(
+                """
+                SELECT ts, status FROM power_events
+                WHERE site = ? AND ts >= ?
+                ORDER BY ts ASC, id ASC
+                """,
+                (site, int(start_ts)),
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                """
+                SELECT ts, status FROM power_events
+                WHERE site = ? AND ts >= ? AND ts < ?
+                ORDER BY ts ASC, id ASC
+                """,
+                (site, int(start_ts), int(end_ts)),
+            ).fetchall()
+
+    if before is not None:
+        rows.insert(0, before)
     return [(int(ts), bool(st)) for ts, st in rows]
+
+
+def count_events() -> int:
+    with connection() as conn:
+        row = conn.execute("SELECT COUNT(*) FROM power_events").fetchone()
+    return int(row[0]) if row else 0
+
@@ -0,0 +1,130 @@
+# powerbot/storage/engine.py
+import logging
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from powerbot.config.config import settings
+
+# WAL: читатели (/metrics, /healthz, web) не блокируют вебхук-писателя.
+# synchronous=NORMAL в WAL-режиме безопасен от порчи БД и сильно дешевле FULL.
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",
+    "PRAGMA mmap_size=67108864",
+)
+
+
+class ConnectionPool:
+    """
+    Небольшой пул открытых соединений к SQLite.
+
+    Flask (threaded) создаёт поток на каждый запрос, поэтому thread-local
+    соединения жили бы ровно один запрос. Пул же переиспользует соединения
+    между любыми потоками: бот, вебхуки, YASNO-watchdog.
+    """
+
+    def __init__(self, db_file: Path, size: int) -> None:
+        self.db_file = db_file
+        self.size = max(1, size)
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=self.size)
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_file,
+            timeout=5.0,
+            check_same_thread=False,
+        )
+        for pragma in _PRAGMAS:
+            try:
+                conn.execute(pragma)
+            except sqlite3.DatabaseError:
+                logging.warning("SQLite: не вдалося застосувати %s", pragma)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        # незакрытая транзакция не должна «протечь» к следующему пользователю
+        if conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                conn.close()
+                return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close_all(self) -> None:
+        with self._lock:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                conn.close()
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(settings.DB_FILE, settings.DB_POOL_SIZE)
+    return _pool
+
+
+@contextmanager
+def connection() -> Iterator[sqlite3.Connection]:
+    """
+    Соединение из пула на время блока (только чтение или ручной commit).
+    """
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+@contextmanager
+def transaction() -> Iterator[sqlite3.Connection]:
+    """
+    Соединение из пула + транзакция: commit при успехе, rollback при ошибке.
+    """
+    with connection() as conn:
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+def table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    """
+    Имена колонок таблицы (пусто, если таблицы нет) — для миграций схемы.
+    """
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+
+def close_pool() -> None:
+    if _pool is not None:
+        _pool.close_all()
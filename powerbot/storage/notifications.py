@@ -0,0 +1,144 @@
+# powerbot/storage/notifications.py
+import logging
+import sqlite3
+import time
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from powerbot.storage.engine import connection, table_columns, transaction
+from powerbot.storage.outbox import insert_fanout
+
+
+class PendingNotification(NamedTuple):
+    id: int
+    site: str
+    is_online: bool
+    ts: int
+    outage_seconds: Optional[int]
+    attempts: int = 0
+
+
+def init_notifications() -> None:
+    """
+    Таблица power_notifications: смены статуса, о которых ещё не разослано.
+
+    Строка пишется в одной транзакции с событием (add_notification), а
+    удаляется в одной транзакции с постановкой рассылки в outbox
+    (complete_notification). Вебхук отвечает сразу после записи события:
+    если процесс упадёт раньше рассылки, строка останется и будет
+    обработана после рестарта. Неудачная попытка откладывает строку
+    на next_attempt_ts (retry_notification).
+    """
+    with transaction() as conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS power_notifications (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                site TEXT NOT NULL,
+                status INTEGER NOT NULL,  -- 1 = онлайн, 0 = офлайн
+                ts INTEGER NOT NULL,
+                outage_seconds INTEGER,
+                created_at INTEGER NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_ts REAL NOT NULL DEFAULT 0
+            )
+            """
+        )
+        columns = table_columns(conn, "power_notifications")
+        if "attempts" not in columns:
+            conn.execute(
+                "ALTER TABLE power_notifications ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0"
+            )
+        if "next_attempt_ts" not in columns:
+            conn.execute(
+                "ALTER TABLE power_notifications ADD COLUMN next_attempt_ts REAL NOT NULL DEFAULT 0"
+            )
+
+
+def add_notification(
+    conn: sqlite3.Connection,
+    site: str,
+    is_online: bool,
+    ts: int,
+    outage_seconds: Optional[int],
+) -> None:
+    """
+    Запланировать рассылку внутри уже открытой транзакции (вместе с событием).
+    """
+    conn.execute(
+        """
+        INSERT INTO power_notifications (site, status, ts, outage_seconds, created_at)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        (site, 1 if is_online else 0, int(ts), outage_seconds, int(time.time())),
+    )
+
+
+def load_pending_notifications(after_id: int = 0, limit: int = 100) -> List[PendingNotification]:
+    """
+    Неразосланные смены статуса, чья очередь попытки подошла, по порядку записи.
+    """
+    with connection() as conn:
+        rows = conn.execute(
+            """
+            SELECT id, site, status, ts, outage_seconds, attempts FROM power_notifications
+            WHERE id > ? AND next_attempt_ts <= ?
+            ORDER BY id
+            LIMIT ?
+            """,
+            (after_id, time.time(), limit),
+        ).fetchall()
+    return [
+        PendingNotification(int(id_), site, bool(status), int(ts), outage_seconds, int(attempts))
+        for id_, site, status, ts, outage_seconds, attempts in rows
+    ]
+
+
+def complete_notification(
+    notification: PendingNotification,
+    fanouts: Iterable[Tuple[Sequence[Tuple[str, bool]], Iterable[Tuple[int, Optional[int], int]]]],
+) -> int:
+    """
+    Поставить рассылки [(payloads, deliveries)] в outbox и снять
+    уведомление из очереди — одной транзакцией.
+
+    Более старые неразосланные уведомления той же площадки (отложенные
+    после сбоя) тоже снимаются: после нового статуса они только запутают.
+    Возвращает количество добавленных строк outbox.
+    """
+    count = 0
+    with transaction() as conn:
+        for payloads, deliveries in fanouts:
+            count += insert_fanout(conn, payloads, deliveries)
+        cur = conn.execute(
+            "DELETE FROM power_notifications WHERE site = ? AND id < ?",
+            (notification.site, notification.id),
+        )
+        conn.execute("DELETE FROM power_notifications WHERE id = ?", (notification.id,))
+    if cur.rowcount:
+        logging.info(
+            "Сповіщення [%s]: пропущено %s застарілих після нового статусу",
+            notification.site,
+            cur.rowcount,
+        )
+    return count
+
+
+def retry_notification(notification_id: int, delay: float) -> None:
+    """
+    Отложить уведомление после неудачной попытки: следующая — не раньше
+    чем через delay сек.
+    """
+    with transaction() as conn:
+        conn.execute(
+            """
+            UPDATE power_notifications
+            SET attempts = attempts + 1, next_attempt_ts = ?
+            WHERE id = ?
+            """,
+            (time.time() + max(0.0, delay), int(notification_id)),
+        )
+
+
+def drop_notification(notification_id: int) -> None:
+    with transaction() as conn:
+        conn.execute("DELETE FROM power_notifications WHERE id = ?", (int(notification_id),))
@@ -0,0 +1,318 @@
+# powerbot/storage/outbox.py
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from powerbot.storage.engine import connection, table_columns, transaction
+
+# состояния строки очереди
+PENDING = "pending"
+SENDING = "sending"
+FAILED = "failed"
+
+
+@dataclass
+class OutboxItem:
+    id: int
+    chat_id: int
+    text: str
+    thread_id: Optional[int]
+    with_read_button: bool
+    attempts: int
+
+
+_OUTBOX_DDL = """
+    CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER NOT NULL,
+        thread_id INTEGER,
+        payload_id INTEGER NOT NULL REFERENCES outbox_payloads(id),
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_ts REAL NOT NULL,
+        last_error TEXT,
+        created_at INTEGER NOT NULL,
+        updated_at INTEGER NOT NULL
+    )
+"""
+
+
+def init_outbox() -> None:
+    """
+    Очередь исходящих сообщений Telegram:
+      - outbox_payloads — готовые тексты (один на язык рассылки);
+      - outbox — кому отправить: (chat_id, thread_id, payload_id).
+
+    Продюсеры (вебхук, YASNO-watchdog) кладут рассылку одной транзакцией,
+    а воркеры забирают строки outbox пачками. Отправленные строки
+    удаляются вместе с осиротевшими текстами; в FAILED остаются
+    сообщения, которые так и не удалось доставить (для разбора).
+    """
+    with transaction() as conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outbox_payloads (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                text TEXT NOT NULL,
+                with_read_button INTEGER NOT NULL DEFAULT 0,
+                created_at INTEGER NOT NULL
+            )
+            """
+        )
+
+        columns = table_columns(conn, "outbox")
+        if columns and "payload_id" not in columns:
+            _migrate_inline_text(conn)
+
+        conn.execute(_OUTBOX_DDL)
+        conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_outbox_due
+            ON outbox(status, next_attempt_ts)
+            """
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_outbox_payload ON outbox(payload_id)"
+        )
+
+
+def _migrate_inline_text(conn: sqlite3.Connection) -> None:
+    """
+    Старая схема хранила текст в каждой строке outbox — переносим
+    тексты в outbox_payloads (id строки = id текста) и пересоздаём таблицу.
+    """
+    logging.info("Міграція outbox: тексти переносяться в outbox_payloads")
+    conn.execute("DROP INDEX IF EXISTS idx_outbox_due")
+    conn.execute("ALTER TABLE outbox RENAME TO outbox_old")
+    conn.execute(
+        """
+        INSERT INTO outbox_payloads (id, text, with_read_button, created_at)
+        SELECT id, text, with_read_button, created_at FROM outbox_old
+        """
+    )
+    conn.execute(_OUTBOX_DDL)
+    conn.execute(
+        """
+        INSERT INTO outbox (
+            id, chat_id, thread_id, payload_id, status, attempts,
+            next_attempt_ts, last_error, created_at, updated_at
+        )
+        SELECT id, chat_id, thread_id, id, status, attempts,
+               next_attempt_ts, last_error, created_at, updated_at
+        FROM outbox_old
+        """
+    )
+    conn.execute("DROP TABLE outbox_old")
+
+
+def enqueue_fanout(
+    payloads: Sequence[Tuple[str, bool]],
+    deliveries: Iterable[Tuple[int, Optional[int], int]],
+) -> int:
+    """
+    Поставить рассылку в очередь одной транзакцией.
+
+    payloads   — [(text, with_read_button)], каждый текст сохраняется один раз;
+    deliveries — [(chat_id, thread_id, индекс в payloads)].
+    Возвращает количество добавленных строк outbox.
+    """
+    deliveries = list(deliveries)
+    if not deliveries:
+        return 0
+
+    with transaction() as conn:
+        return insert_fanout(conn, payloads, deliveries)
+
+
+def insert_fanout(
+    conn: sqlite3.Connection,
+    payloads: Sequence[Tuple[str, bool]],
+    deliveries: Iterable[Tuple[int, Optional[int], int]],
+) -> int:
+    """
+    enqueue_fanout внутри уже открытой транзакции.
+    """
+    deliveries = list(deliveries)
+    if not deliveries:
+        return 0
+
+    now = time.time()
+    payload_ids = []
+    for text, with_read_button in payloads:
+        cur = conn.execute(
+            """
+            INSERT INTO outbox_payloads (text, with_read_button, created_at)
+            VALUES (?, ?, ?)
+            """,
+            (text, 1 if with_read_button else 0, int(now)),
+        )
+        payload_ids.append(cur.lastrowid)
+
+    conn.executemany(
+        """
+        INSERT INTO outbox (
+            chat_id, thread_id, payload_id,
+            status, next_attempt_ts, created_at, updated_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (int(chat_id), thread_id, payload_ids[idx], PENDING, now, int(now), int(now))
+            for chat_id, thread_id, idx in deliveries
+        ],
+    )
+    return len(deliveries)
+
+
+def enqueue_messages(messages: Iterable) -> int:
+    """
+    Поставить пачку отдельных сообщений (OutgoingMessage) в очередь.
+    Одинаковые тексты сохраняются один раз.
+    """
+    payload_index: Dict[Tuple[str, bool], int] = {}
+    deliveries = []
+    for m in messages:
+        key = (m.text, bool(m.with_read_button))
+        idx = payload_index.setdefault(key, len(payload_index))
+        deliveries.append((m.chat_id, m.thread_id, idx))
+    return enqueue_fanout(list(payload_index), deliveries)
+
+
+def claim_due(limit: int, now: Optional[float] = None) -> List[OutboxItem]:
+    """
+    Забрать до limit сообщений, которым пора уходить, и пометить их SENDING.
+    Выборка и пометка — одним UPDATE, поэтому несколько воркеров
+    не получат одну и ту же строку.
+    """
+    if now is None:
+        now = time.time()
+
+    with transaction() as conn:
+        rows = conn.execute(
+            """
+            UPDATE outbox
+            SET status = ?, updated_at = ?
+            WHERE id IN (
+                SELECT id FROM outbox
+                WHERE status = ? AND next_attempt_ts <= ?
+                ORDER BY id
+                LIMIT ?
+            )
+            RETURNING id, chat_id, thread_id, payload_id, attempts
+            """,
+            (SENDING, int(now), PENDING, now, int(limit)),
+        ).fetchall()
+        if not rows:
+            return []
+
+        payload_ids = sorted({row[3] for row in rows})
+        placeholders = ",".join("?" * len(payload_ids))
+        payloads = {
+            pid: (text, bool(with_read_button))
+            for pid, text, with_read_button in conn.execute(
+                f"""
+                SELECT id, text, with_read_button FROM outbox_payloads
+                WHERE id IN ({placeholders})
+                """,
+                payload_ids,
+            )
+        }
+
+    items = []
+    for item_id, chat_id, thread_id, payload_id, attempts in rows:
+        text, with_read_button = payloads[payload_id]
+        items.append(
+            OutboxItem(
+                id=int(item_id),
+                chat_id=int(chat_id),
+                text=text,
+                thread_id=thread_id,
+                with_read_button=with_read_button,
+                attempts=int(attempts),
+            )
+        )
+    # RETURNING не гарантирует порядок — рассылаем в порядке постановки
+    items.sort(key=lambda item: item.id)
+    return items
+
+
+def mark_sent(ids: Iterable[int]) -> None:
+    rows = [(int(i),) for i in ids]
+    if not rows:
+        return
+    with transaction() as conn:
+        conn.executemany("DELETE FROM outbox WHERE id = ?", rows)
+        # тексты, на которые больше никто не ссылается
+        conn.execute(
+            """
+            DELETE FROM outbox_payloads
+            WHERE NOT EXISTS (
+                SELECT 1 FROM outbox WHERE outbox.payload_id = outbox_payloads.id
+            )
+            """
+        )
+
+
+def mark_retry(
+    item_id: int,
+    error: Optional[str],
+    delay: float,
+    count_attempt: bool = True,
+) -> None:
+    """
+    Вернуть сообщение в очередь: следующая попытка не раньше чем через delay сек.
+    count_attempt=False — отложили по требованию Telegram (429), это не сбой.
+    """
+    now = time.time()
+    with transaction() as conn:
+        conn.execute(
+            """
+            UPDATE outbox
+            SET status = ?, attempts = attempts + ?, next_attempt_ts = ?,
+                last_error = ?, updated_at = ?
+            WHERE id = ?
+            """,
+            (
+                PENDING,
+                1 if count_attempt else 0,
+                now + max(0.0, delay),
+                error,
+                int(now),
+                int(item_id),
+            ),
+        )
+
+
+def mark_failed(item_id: int, error: Optional[str]) -> None:
+    with transaction() as conn:
+        conn.execute(
+            """
+            UPDATE outbox
+            SET status = ?, attempts = attempts + 1, last_error = ?, updated_at = ?
+            WHERE id = ?
+            """,
+            (FAILED, error, int(time.time()), int(item_id)),
+        )
+
+
+def recover_in_flight() -> int:
+    """
+    После рестарта: всё, что осталось в SENDING, снова в очередь.
+    Возвращает количество восстановленных сообщений.
+    """
+    with transaction() as conn:
+        cur = conn.execute(
+            "UPDATE outbox SET status = ?, updated_at = ? WHERE status = ?",
+            (PENDING, int(time.time()), SENDING),
+        )
+        return cur.rowcount
+
+
+def count_pending() -> int:
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT COUNT(*) FROM outbox WHERE status IN (?, ?)",
+            (PENDING, SENDING),
+        ).fetchone()
+    return int(row[0]) if row else 0
@@ -0,0 +1,392 @@
+# powerbot/storage/registry.py
+import logging
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from powerbot.config.config import settings
+from powerbot.storage.subscribers import apply_subscriber_changes, iter_subscribers
+from powerbot.yasno.cache.cache import parse_target, target_key
+
+Key = Tuple[int, Optional[int]]
+
+# отложенная операция: ("upsert", Subscriber) или ("delete", None)
+_UPSERT = "upsert"
+_DELETE = "delete"
+
+class Subscriber(NamedTuple):
+    title: Optional[str]
+    # группа YASNO, выбранная через /group; None — группа по умолчанию
+    group: Optional[str]
+    # площадка (датчик), выбранная через /site; None — DEFAULT_SITE
+    site: Optional[str] = None
+    # пара YASNO "region:dso", выбранная через /region; None (или пара, которой
+    # больше нет в YASNO_TARGETS) — первая из YASNO_TARGETS
+    target: Optional[str] = None
+
+
+class SubscriberRegistry:
+    """
+    Подписчики процесса в памяти.
+
+    Загружаются из SQLite один раз; /start, /stop, /group, /site и /region меняют словарь
+    сразу, а запись в БД идёт фоновым потоком: изменения копятся
+    flush_delay секунд и уходят одной транзакцией.
+
+    Подписчики проиндексированы по группе YASNO, по паре region/dso и по
+    площадке, поэтому рассылка об изменении графика одной группы одной пары
+    или о событии одной площадки трогает только их чаты. snapshot() —
+    неизменяемый кортеж, который пересобирается только после изменений,
+    так что на горячем пути уведомлений нет обращений к диску.
+    """
+
+    def __init__(
+        self,
+        flush_delay: float,
+        default_group: Optional[str],
+        default_site: str,
+        default_target: Optional[str] = None,
+    ) -> None:
+        self.flush_delay = flush_delay
+        self.default_group = default_group
+        self.default_site = default_site
+        self.default_target = default_target
+        self._lock = threading.Lock()
+        self._subs: Dict[Key, Subscriber] = {}
+        # фактическая группа (с учётом default_group) -> ключи подписчиков
+        self._by_group: Dict[Optional[str], Dict[Key, None]] = {}
+        # фактическая площадка (с учётом default_site) -> ключи подписчиков
+        self._by_site: Dict[str, Dict[Key, None]] = {}
+        # фактическая пара region:dso (с учётом default_target) -> ключи подписчиков
+        self._by_target: Dict[Optional[str], Dict[Key, None]] = {}
+        self._loaded = False
+        # (group, site, target) -> снимок; None — без фильтра
+        self._snapshots: Dict[Tuple[Optional[str], Optional[str], Optional[str]], tuple] = {}
+
+        self._pending: Dict[Key, Tuple[str, Optional[Subscriber]]] = {}
+        self._dirty = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._writer: Optional[threading.Thread] = None
+
+    # ---------- загрузка ----------
+
+    def load(self) -> None:
+        subs = {
+            (sub["chat_id"], sub["thread_id"]): Subscriber(
+                sub["title"], sub["group"], sub["site"], sub["target"]
+            )
+            for sub in iter_subscribers()
+        }
+        with self._lock:
+            self._subs = {}
+            self._by_group = {}
+            self._by_site = {}
+            self._by_target = {}
+            for key, sub in subs.items():
+                self._put(key, sub)
+            self._snapshots = {}
+            self._loaded = True
+        logging.info("Завантажено %s підписників у пам'ять", len(subs))
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    # ---------- индекс (под self._lock) ----------
+
+    def _effective_group(self, sub: Subscriber) -> Optional[str]:
+        return sub.group or self.default_group
+
+    def _effective_site(self, sub: Subscriber) -> str:
+        return sub.site or self.default_site
+
+    def _effective_target(self, sub: Subscriber) -> Optional[str]:
+        # пару, которую убрали из YASNO_TARGETS, никто не опрашивает —
+        # такой чат получает рассылки основной пары (как и в resolve_target)
+        pair = parse_target(sub.target)
+        if pair is None:
+            return self.default_target
+        return target_key(*pair)
+
+    def _put(self, key: Key, sub: Subscriber) -> None:
+        old = self._subs.get(key)
+        if old is not None:
+            self._unindex(key, old)
+        self._subs[key] = sub
+        self._by_group.setdefault(self._effective_group(sub), {})[key] = None
+        self._by_site.setdefault(self._effective_site(sub), {})[key] = None
+        self._by_target.setdefault(self._effective_target(sub), {})[key] = None
+
+    def _drop(self, key: Key) -> None:
+        old = self._subs.pop(key)
+        self._unindex(key, old)
+
+    def _unindex(self, key: Key, sub: Subscriber) -> None:
+        for index, value in (
+            (self._by_group, self._effective_group(sub)),
+            (self._by_site, self._effective_site(sub)),
+            (self._by_target, self._effective_target(sub)),
+        ):
+            keys = index.get(value)
+            if keys is not None:
+                keys.pop(key, None)
+                if not keys:
+                    del index[value]
+
+    # ---------- чтение ----------
+
+    def snapshot(
+        self,
+        group: Optional[str] = None,
+        site: Optional[str] = None,
+        target: Optional[str] = None,
+    ) -> tuple:
+        """
+        Подписчики: ({"chat_id", "thread_id", "title", "group", "site", "target"}, ...).
+        group — только чаты этой группы YASNO, site — только чаты этой
+        площадки, target — только чаты этой пары "region:dso" (с учётом
+        значений по умолчанию).
+        """
+        self._ensure_loaded()
+        cache_key = (group, site, target)
+        with self._lock:
+            cached = self._snapshots.get(cache_key)
+            if cached is None:
+                if site is not None:
+                    keys = self._by_site.get(site, {})
+                elif target is not None:
+                    keys = self._by_target.get(target, {})
+                elif group is not None:
+                    keys = self._by_group.get(group, {})
+                else:
+                    keys = self._subs.keys()
+                subs = ((key, self._subs[key]) for key in keys)
+                cached = tuple(
+                    {
+                        "chat_id": chat_id,
+                        "thread_id": thread_id,
+                        "title": sub.title,
+                        "group": self._effective_group(sub),
+                        "site": self._effective_site(sub),
+                        "target": self._effective_target(sub),
+                    }
+                    for (chat_id, thread_id), sub in subs
+                    if (group is None or self._effective_group(sub) == group)
+                    and (target is None or self._effective_target(sub) == target)
+                )
+                self._snapshots[cache_key] = cached
+            return cached
+
+    def groups(self, target: Optional[str] = None) -> List[str]:
+        """
+        Группы YASNO, у которых есть хотя бы один подписчик
+        (target — только среди подписчиков этой пары "region:dso").
+        """
+        self._ensure_loaded()
+        with self._lock:
+            if target is None:
+                return sorted(g for g in self._by_group if g)
+            keys = self._by_target.get(target, {})
+            groups = {self._effective_group(self._subs[key]) for key in keys}
+        return sorted(g for g in groups if g)
+
+    def group_of(self, chat_id: int, thread_id: Optional[int]) -> Optional[str]:
+        """
+        Группа чата: выбранная через /group или группа по умолчанию.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            sub = self._subs.get((chat_id, thread_id))
+        if sub is None:
+            return self.default_group
+        return self._effective_group(sub)
+
+    def site_of(self, chat_id: int, thread_id: Optional[int]) -> str:
+        """
+        Площадка чата: выбранная через /site или DEFAULT_SITE.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            sub = self._subs.get((chat_id, thread_id))
+        if sub is None:
+            return self.default_site
+        return self._effective_site(sub)
+
+    def target_of(self, chat_id: int, thread_id: Optional[int]) -> Optional[str]:
+        """
+        Пара "region:dso" чата: выбранная через /region или основная.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            sub = self._subs.get((chat_id, thread_id))
+        if sub is None:
+            return self.default_target
+        return self._effective_target(sub)
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._subs)
+
+    def __contains__(self, key: Key) -> bool:
+        self._ensure_loaded()
+        return key in self._subs
+
+    # ---------- изменения ----------
+
+    def _changed(self, key: Key, op: str, sub: Optional[Subscriber]) -> None:
+        self._snapshots = {}
+        self._pending[key] = (op, sub)
+
+    def add(self, chat_id: int, thread_id: Optional[int], title: Optional[str]) -> bool:
+        """
+        Подписать (или обновить title). True — если подписчик новый.
+        """
+        self._ensure_loaded()
+        key = (chat_id, thread_id)
+        with self._lock:
+            old = self._subs.get(key)
+            if old is not None and (not title or title == old.title):
+                return False
+            sub = (
+                Subscriber(title, None)
+                if old is None
+                else old._replace(title=title)
+            )
+            self._put(key, sub)
+            self._changed(key, _UPSERT, sub)
+        self._schedule_flush()
+        return old is None
+
+    def set_group(self, chat_id: int, thread_id: Optional[int], group: Optional[str]) -> bool:
+        """
+        Выбрать группу YASNO для подписчика. False — чат не подписан.
+        """
+        self._ensure_loaded()
+        key = (chat_id, thread_id)
+        with self._lock:
+            old = self._subs.get(key)
+            if old is None:
+                return False
+            if old.group != group:
+                sub = old._replace(group=group)
+                self._put(key, sub)
+                self._changed(key, _UPSERT, sub)
+        self._schedule_flush()
+        return True
+
+    def set_site(self, chat_id: int, thread_id: Optional[int], site: Optional[str]) -> bool:
+        """
+        Выбрать площадку для подписчика. False — чат не подписан.
+        """
+        self._ensure_loaded()
+        key = (chat_id, thread_id)
+        with self._lock:
+            old = self._subs.get(key)
+            if old is None:
+                return False
+            if old.site != site:
+                sub = old._replace(site=site)
+                self._put(key, sub)
+                self._changed(key, _UPSERT, sub)
+        self._schedule_flush()
+        return True
+
+    def set_target(self, chat_id: int, thread_id: Optional[int], target: Optional[str]) -> bool:
+        """
+        Выбрать пару YASNO "region:dso" для подписчика. False — чат не подписан.
+        """
+        self._ensure_loaded()
+        key = (chat_id, thread_id)
+        with self._lock:
+            old = self._subs.get(key)
+            if old is None:
+                return False
+            if old.target != target:
+                sub = old._replace(target=target)
+                self._put(key, sub)
+                self._changed(key, _UPSERT, sub)
+        self._schedule_flush()
+        return True
+
+    def remove(self, chat_id: int, thread_id: Optional[int]) -> bool:
+        """
+        Отписать. True — если подписчик был.
+        """
+        self._ensure_loaded()
+        key = (chat_id, thread_id)
+        with self._lock:
+            if key not in self._subs:
+                return False
+            self._drop(key)
+            self._changed(key, _DELETE, None)
+        self._schedule_flush()
+        return True
+
+    # ---------- запись в БД ----------
+
+    def _schedule_flush(self) -> None:
+        if self._writer is None:
+            with self._start_lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(
+                        target=self._run_writer,
+                        name="subscribers-writer",
+                        daemon=True,
+                    )
+                    self._writer.start()
+        self._dirty.set()
+
+    def _run_writer(self) -> None:
+        while True:
+            self._dirty.wait()
+            # debounce: собираем изменения, пришедшие за flush_delay
+            time.sleep(self.flush_delay)
+            self._dirty.clear()
+            try:
+                self.flush()
+            except Exception:
+                logging.exception("Не вдалося зберегти підписників")
+                # изменения остались в _pending — повторим позже
+                self._dirty.set()
+
+    def flush(self) -> None:
+        """
+        Записать накопленные изменения одной транзакцией.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+
+            upserts = [
+                (chat_id, thread_id, sub.title, sub.group, sub.site, sub.target)
+                for (chat_id, thread_id), (op, sub) in pending.items()
+                if op == _UPSERT
+            ]
+            deletes = [key for key, (op, _) in pending.items() if op == _DELETE]
+            try:
+                apply_subscriber_changes(upserts, deletes)
+            except Exception:
+                with self._lock:
+                    # не затираем более свежие изменения
+                    for key, value in pending.items():
+                        self._pending.setdefault(key, value)
+                raise
+
+
+subscriber_registry = SubscriberRegistry(
+    flush_delay=settings.SUBSCRIBERS_FLUSH_DELAY,
+    default_group=settings.YASNO_GROUP,
+    default_site=settings.DEFAULT_SITE,
+    # основная пара (YASNO_REGION_ID/YASNO_DSO_ID) в YASNO_TARGETS всегда первая
+    default_target=target_key(*settings.YASNO_TARGETS[0]) if settings.YASNO_TARGETS else None,
+)
+
+
+def load_registry() -> None:
+    """
+    Один раз при старте: поднимаем подписчиков в память.
+    """
+    subscriber_registry.load()
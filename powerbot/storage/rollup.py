@@ -0,0 +1,150 @@
+# powerbot/storage/rollup.py
+import json
+import logging
+import time
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from powerbot.storage.engine import connection, table_columns, transaction
+
+
+def init_rollup_table() -> None:
+    """
+    Таблица power_daily_rollup — готовая статистика по ЗАКРЫТЫМ дням площадки:
+      - site, day (YYYY-MM-DD, локальная дата)
+      - on/off секунды, список отключений, их количество
+      - hourly_online — 24 значения (секунды онлайн по часам)
+    Для дней без данных has_data = 0, остальные поля пустые.
+    """
+    with transaction() as conn:
+        columns = table_columns(conn, "power_daily_rollup")
+        if columns and "site" not in columns:
+            # старая таблица без площадок — это только кэш, пересчитается
+            conn.execute("DROP TABLE power_daily_rollup")
+            logging.info("power_daily_rollup: перебудовано з колонкою site")
+
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS power_daily_rollup (
+                site TEXT NOT NULL,
+                day TEXT NOT NULL,
+                day_start_ts INTEGER NOT NULL,
+                day_end_ts INTEGER NOT NULL,
+                has_data INTEGER NOT NULL,
+                on_seconds INTEGER,
+                off_seconds INTEGER,
+                outages_count INTEGER,
+                outages TEXT,
+                hourly_online TEXT,
+                updated_at INTEGER NOT NULL,
+                PRIMARY KEY (site, day)
+            )
+            """
+        )
+
+
+def load_rollups(site: str, days: Iterable[date]) -> Dict[date, Optional[dict]]:
+    """
+    Возвращает {day: stats | None} только для тех дней площадки, которые уже посчитаны.
+    stats — в формате compute_day_stats + ключ "hourly_online".
+    """
+    keys = [d.isoformat() for d in days]
+    if not keys:
+        return {}
+
+    placeholders = ",".join("?" * len(keys))
+    with connection() as conn:
+        rows = conn.execute(
+            f"""
+            SELECT day, day_start_ts, day_end_ts, has_data, on_seconds, off_seconds,
+                   outages, hourly_online
+            FROM power_daily_rollup
+            WHERE site = ? AND day IN ({placeholders})
+            """,
+            [site, *keys],
+        ).fetchall()
+
+    result: Dict[date, Optional[dict]] = {}
+    for day, start_ts, end_ts, has_data, on_s, off_s, outages, hourly in rows:
+        day_date = date.fromisoformat(day)
+        if not has_data:
+            result[day_date] = None
+            continue
+        try:
+            outages_list = [(int(s), None if e is None else int(e)) for s, e in json.loads(outages)]
+            hourly_list = [int(v) for v in json.loads(hourly)]
+        except Exception:
+            logging.warning("Пошкоджений rollup за %s, перерахуємо", day)
+            continue
+        result[day_date] = {
+            "on_seconds": int(on_s),
+            "off_seconds": int(off_s),
+            "outages": outages_list,
+            "day_start_ts": int(start_ts),
+            "day_end_ts": int(end_ts),
+            "hourly_online": hourly_list,
+        }
+    return result
+
+
+def save_rollups(site: str, items: List[Tuple[date, int, int, Optional[dict]]]) -> None:
+    """
+    items: [(day, day_start_ts, day_end_ts, stats | None), ...]
+    """
+    if not items:
+        return
+
+    now_ts = int(time.time())
+    rows = []
+    for day, start_ts, end_ts, stats in items:
+        if stats is None:
+            rows.append((site, day.isoformat(), start_ts, end_ts, 0, None, None, None, None, None, now_ts))
+            continue
+        rows.append(
+            (
+                site,
+                day.isoformat(),
+                start_ts,
+                end_ts,
+                1,
+                int(stats["on_seconds"]),
+                int(stats["off_seconds"]),
+                len(stats["outages"]),
+                json.dumps(stats["outages"]),
+                json.dumps(stats["hourly_online"]),
+                now_ts,
+            )
+        )
+
+    with transaction() as conn:
+        conn.executemany(
+            """
+            INSERT OR REPLACE INTO power_daily_rollup (
+                site, day, day_start_ts, day_end_ts, has_data, on_seconds, off_seconds,
+                outages_count, outages, hourly_online, updated_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
+
+
+def invalidate_rollups_since(conn, site: str, ts: int) -> None:
+    """
+    Событие с меткой ts меняет статистику дня площадки, в который оно
+    попало, и всех последующих. Обычно (ts = сейчас) ничего не удаляется.
+    Вызывается внутри транзакции вставки события.
+    """
+    conn.execute(
+        "DELETE FROM power_daily_rollup WHERE site = ? AND day_end_ts > ?",
+        (site, int(ts)),
+    )
+
+
+def drop_rollups_since(site: str, ts: int) -> None:
+    """
+    invalidate_rollups_since отдельной транзакцией — для строк, записанных
+    уже после вставки события (см. daily_stats._forget_since).
+    """
+    with transaction() as conn:
+        invalidate_rollups_since(conn, site, ts)
@@ -1,26 +1,129 @@
 import json
 import logging
 import os
+from sqlite3 import Connection
+from typing import Dict, Optional
 
 from powerbot.config.config import settings
+from powerbot.storage.engine import connection, transaction
 
 
-def load_state() -> dict:
+def init_state_table() -> None:
+    """
+    Таблица power_state: текущее состояние площадки, строка на площадку:
+      - site (PRIMARY KEY)
+      - last_status (1 = онлайн, 0 = офлайн)
+      - last_change_ts
+    Пишется в одной транзакции с событием (write_state), чтение и запись —
+    по первичному ключу, сколько бы площадок ни было.
+    При первом запуске переносим power_state.json.
+    """
+    with transaction() as conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS power_state (
+                site TEXT PRIMARY KEY,
+                last_status INTEGER NOT NULL,
+                last_change_ts INTEGER NOT NULL
+            )
+            """
+        )
+
+    _migrate_json_file()
+
+
+def _read_state_file(path) -> Dict[str, dict]:
+    """
+    Разбор старого power_state.json:
+    {"sites": {site: {"last_status": ..., "last_change_ts": ...}}}.
+    Совсем старый формат (одна площадка в корне файла) относится к DEFAULT_SITE.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    if not isinstance(data, dict):
+        return {}
+    if "sites" in data:
+        return data["sites"] or {}
+    if data:
+        return {settings.DEFAULT_SITE: data}
+    return {}
+
+
+def _migrate_json_file() -> None:
+    """
+    Одноразовый перенос power_state.json в таблицу.
+    После переноса файл переименовывается в *.migrated.
+    """
     path = settings.STATE_FILE
     if not os.path.exists(path):
-        return {}
+        return
+
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        sites = _read_state_file(path)
     except Exception:
-        logging.exception("Не вдалося прочитати %s", path)
+        logging.exception("Не вдалося прочитати %s, міграцію пропущено", path)
+        return
+
+    rows = [
+        (site, 1 if state["last_status"] else 0, int(state["last_change_ts"]))
+        for site, state in sites.items()
+        if isinstance(state, dict)
+        and state.get("last_status") is not None
+        and state.get("last_change_ts") is not None
+    ]
+    with transaction() as conn:
+        conn.executemany(
+            """
+            INSERT OR IGNORE INTO power_state (site, last_status, last_change_ts)
+            VALUES (?, ?, ?)
+            """,
+            rows,
+        )
+
+    migrated = f"{path}.migrated"
+    os.replace(path, migrated)
+    logging.info("Стан площадок перенесено в SQLite: %s (файл -> %s)", len(rows), migrated)
+
+
+def _row_to_state(row) -> dict:
+    if row is None:
         return {}
+    return {"last_status": bool(row[0]), "last_change_ts": int(row[1])}
 
 
-def save_state(state: dict) -> None:
-    path = settings.STATE_FILE
-    try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(state, f, ensure_ascii=False, indent=2)
-    except Exception:
-        logging.exception("Не вдалося записати %s", path)
+def load_state(site: Optional[str] = None) -> dict:
+    """
+    {"last_status": bool, "last_change_ts": int} или {}, если событий ещё не было.
+    """
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT last_status, last_change_ts FROM power_state WHERE site = ?",
+            (site or settings.DEFAULT_SITE,),
+        ).fetchone()
+    return _row_to_state(row)
+
+
+def load_all_states() -> Dict[str, dict]:
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT site, last_status, last_change_ts FROM power_state"
+        ).fetchall()
+    return {site: _row_to_state((status, ts)) for site, status, ts in rows}
+
+
+def write_state(conn: Connection, site: str, status: bool, ts: int) -> None:
+    """
+    Записать состояние площадки внутри уже открытой транзакции
+    (вместе с событием power_events).
+    """
+    conn.execute(
+        """
+        INSERT INTO power_state (site, last_status, last_change_ts)
+        VALUES (?, ?, ?)
+        ON CONFLICT(site) DO UPDATE SET
+            last_status = excluded.last_status,
+            last_change_ts = excluded.last_change_ts
+        """,
+        (site, 1 if status else 0, int(ts)),
+    )
@@ -1,77 +1,217 @@
 import json
 import logging
 import os
-from typing import List
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple
 
 from powerbot.config.config import settings
+from powerbot.storage.engine import connection, table_columns, transaction
 
+# thread_id хранится как NOT NULL (иначе UNIQUE не работает для NULL):
+# 0 в таблице <-> None (обычный чат / личка) снаружи
+_NO_THREAD = 0
 
-def load_subscribers() -> List[dict]:
+
+def _to_db_thread(thread_id: Optional[int]) -> int:
+    return _NO_THREAD if thread_id is None else int(thread_id)
+
+
+def _from_db_thread(thread_id: int) -> Optional[int]:
+    return None if thread_id == _NO_THREAD else int(thread_id)
+
+
+def init_subscribers() -> None:
+    """
+    Таблица subscribers:
+      - chat_id
+      - thread_id (0 — без ветки)
+      - title
+      - yasno_group (NULL — группа по умолчанию, YASNO_GROUP)
+      - site (NULL — площадка по умолчанию, DEFAULT_SITE)
+      - yasno_target — пара "region:dso" (NULL — YASNO_REGION_ID:YASNO_DSO_ID)
+    Один подписчик = одна строка, UNIQUE(chat_id, thread_id).
+    При первом запуске переносим подписчиков из subscribers.json.
+    """
+    with transaction() as conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS subscribers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id INTEGER NOT NULL,
+                thread_id INTEGER NOT NULL DEFAULT 0,
+                title TEXT,
+                yasno_group TEXT,
+                site TEXT,
+                yasno_target TEXT,
+                created_at INTEGER NOT NULL,
+                updated_at INTEGER NOT NULL,
+                UNIQUE(chat_id, thread_id)
+            )
+            """
+        )
+        columns = table_columns(conn, "subscribers")
+        if "yasno_group" not in columns:
+            conn.execute("ALTER TABLE subscribers ADD COLUMN yasno_group TEXT")
+        if "site" not in columns:
+            conn.execute("ALTER TABLE subscribers ADD COLUMN site TEXT")
+        if "yasno_target" not in columns:
+            conn.execute("ALTER TABLE subscribers ADD COLUMN yasno_target TEXT")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_subscribers_group ON subscribers(yasno_group)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_subscribers_site ON subscribers(site)")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_subscribers_target ON subscribers(yasno_target)"
+        )
+
+    _migrate_json_file()
+
+
+def _read_subscribers_file(path) -> List[dict]:
     """
+    Разбор старого subscribers.json.
+
     Формат НОВЫЙ:
       [
         {"chat_id": -100123, "thread_id": null, "title": "..."},
         ...
       ]
-
-    Если файл в старом формате [chat_id, ...] (list int),
-    конвертируем в новый with thread_id = None.
+    Совсем старый формат [chat_id, ...] (list int) — thread_id = None.
     """
-    path = settings.SUBSCRIBERS_FILE
-    if not os.path.exists(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    if not isinstance(data, list):
         return []
 
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        if not isinstance(data, list) or not data:
-            return []
-
-        # старый формат: список chat_id
-        if isinstance(data[0], int):
-            subs = [
-                {"chat_id": int(cid), "thread_id": None, "title": None}
-                for cid in data
-            ]
-            try:
-                with open(path, "w", encoding="utf-8") as fw:
-                    json.dump(subs, fw, ensure_ascii=False, indent=2)
-            except Exception:
-                logging.exception("Не вдалося оновити формат %s", path)
-            return subs
-
-        # новый формат: список dict
-        subs: List[dict] = []
-        for item in data:
-            if not isinstance(item, dict):
-                continue
-            cid = item.get("chat_id")
-            tid = item.get("thread_id", None)
-            title = item.get("title", None)
-            if cid is None:
-                continue
+    subs: List[dict] = []
+    for item in data:
+        if isinstance(item, int):
+            subs.append({"chat_id": item, "thread_id": None, "title": None})
+            continue
+        if not isinstance(item, dict):
+            continue
+        cid = item.get("chat_id")
+        tid = item.get("thread_id", None)
+        if cid is None:
+            continue
+        try:
+            cid = int(cid)
+        except Exception:
+            continue
+        if tid is not None:
             try:
-                cid = int(cid)
+                tid = int(tid)
             except Exception:
-                continue
-            if tid is not None:
-                try:
-                    tid = int(tid)
-                except Exception:
-                    tid = None
-            subs.append({"chat_id": cid, "thread_id": tid, "title": title})
-        return subs
-
-    except Exception:
-        logging.exception("Не вдалося прочитати %s", path)
-        return []
+                tid = None
+        subs.append({"chat_id": cid, "thread_id": tid, "title": item.get("title")})
+    return subs
 
 
-def save_subscribers(subs: List[dict]) -> None:
+def _migrate_json_file() -> None:
+    """
+    Одноразовый перенос subscribers.json в таблицу.
+    После переноса файл переименовывается в *.migrated.
+    """
     path = settings.SUBSCRIBERS_FILE
+    if not os.path.exists(path):
+        return
+
     try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(subs, f, ensure_ascii=False, indent=2)
+        subs = _read_subscribers_file(path)
     except Exception:
-        logging.exception("Не вдалося записати %s", path)
+        logging.exception("Не вдалося прочитати %s, міграцію пропущено", path)
+        return
+
+    now_ts = int(time.time())
+    with transaction() as conn:
+        conn.executemany(
+            """
+            INSERT OR IGNORE INTO subscribers (chat_id, thread_id, title, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            [
+                (s["chat_id"], _to_db_thread(s["thread_id"]), s["title"], now_ts, now_ts)
+                for s in subs
+            ],
+        )
+
+    migrated = f"{path}.migrated"
+    os.replace(path, migrated)
+    logging.info("Підписників перенесено в SQLite: %s (файл -> %s)", len(subs), migrated)
+
+
+def apply_subscriber_changes(
+    upserts: Iterable[
+        Tuple[int, Optional[int], Optional[str], Optional[str], Optional[str], Optional[str]]
+    ],
+    deletes: Iterable[Tuple[int, Optional[int]]],
+) -> None:
+    """
+    Пачка изменений одной транзакцией:
+      upserts — [(chat_id, thread_id, title, yasno_group, site, yasno_target)],
+                title=None не затирает старый;
+      deletes — [(chat_id, thread_id)].
+    """
+    now_ts = int(time.time())
+    with transaction() as conn:
+        conn.executemany(
+            """
+            INSERT INTO subscribers (
+                chat_id, thread_id, title, yasno_group, site, yasno_target,
+                created_at, updated_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(chat_id, thread_id) DO UPDATE SET
+                title = COALESCE(excluded.title, subscribers.title),
+                yasno_group = excluded.yasno_group,
+                site = excluded.site,
+                yasno_target = excluded.yasno_target,
+                updated_at = excluded.updated_at
+            """,
+            [
+                (chat_id, _to_db_thread(thread_id), title, group, site, target, now_ts, now_ts)
+                for chat_id, thread_id, title, group, site, target in upserts
+            ],
+        )
+        conn.executemany(
+            "DELETE FROM subscribers WHERE chat_id = ? AND thread_id = ?",
+            [(chat_id, _to_db_thread(thread_id)) for chat_id, thread_id in deletes],
+        )
+
+
+def iter_subscribers(batch_size: int = 1000) -> Iterator[dict]:
+    """
+    Подписчики для рассылки, постранично по id:
+      {"chat_id": ..., "thread_id": ... | None, "title": ...,
+       "group": ... | None, "site": ... | None, "target": ... | None}
+    Соединение из пула берётся только на время чтения страницы.
+    """
+    last_id = 0
+    while True:
+        with connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT id, chat_id, thread_id, title, yasno_group, site, yasno_target
+                FROM subscribers
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+                """,
+                (last_id, batch_size),
+            ).fetchall()
+
+        for _, chat_id, thread_id, title, group, site, target in rows:
+            yield {
+                "chat_id": int(chat_id),
+                "thread_id": _from_db_thread(thread_id),
+                "title": title,
+                "group": group,
+                "site": site,
+                "target": target,
+            }
+
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1][0]
+
@@ -0,0 +1,130 @@
+# powerbot/storage/timeline.py
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from powerbot.config.config import settings
+from powerbot.domain.timeline import EventTimeline
+from powerbot.storage.db import load_events_by_site, log_power_event, log_power_events
+
+# Ленты событий процесса, по одной на площадку: читатели (web, бот) берут
+# данные отсюда, SQLite остаётся только журналом для перезапуска.
+_timelines: Dict[str, EventTimeline] = {}
+_timelines_lock = threading.Lock()
+# callback(site, ts, status) — подписки на все ленты, включая будущие
+_listeners: List[Callable[[str, int, bool], None]] = []
+
+
+def _attach(site: str, timeline: EventTimeline, callback: Callable[[str, int, bool], None]) -> None:
+    timeline.subscribe(lambda ts, status: callback(site, ts, status))
+
+
+def get_timeline(site: Optional[str] = None) -> EventTimeline:
+    """
+    Лента площадки только для чтения. Для площадки без событий — пустая
+    лента, которая нигде не сохраняется: ?site= с дашборда и команды бота
+    не заводят новых площадок (ни памяти, ни серий в /metrics).
+    """
+    timeline = _timelines.get(site or settings.DEFAULT_SITE)
+    if timeline is None:
+        return EventTimeline()
+    return timeline
+
+
+def _timeline_for_write(site: str) -> EventTimeline:
+    """
+    Лента площадки для записи событий; создаётся при первом событии
+    (загрузка из БД или вебхук с проверенным секретом).
+    """
+    timeline = _timelines.get(site)
+    if timeline is not None:
+        return timeline
+
+    with _timelines_lock:
+        timeline = _timelines.get(site)
+        if timeline is None:
+            timeline = EventTimeline()
+            for callback in _listeners:
+                _attach(site, timeline, callback)
+            _timelines[site] = timeline
+        return timeline
+
+
+def known_sites() -> List[str]:
+    """
+    Площадки, по которым есть события (DEFAULT_SITE — всегда).
+    """
+    with _timelines_lock:
+        sites = set(_timelines)
+    sites.add(settings.DEFAULT_SITE)
+    return sorted(sites)
+
+
+def subscribe_timelines(callback: Callable[[str, int, bool], None]) -> None:
+    """
+    callback(site, ts, status) после каждого append() в любой ленте.
+    """
+    with _timelines_lock:
+        _listeners.append(callback)
+        for site, timeline in _timelines.items():
+            _attach(site, timeline, callback)
+
+
+def load_timeline() -> None:
+    """
+    Один раз при старте: поднимаем power_events в память.
+    """
+    events_by_site = load_events_by_site()
+    for site, events in events_by_site.items():
+        _timeline_for_write(site).load(events)
+    logging.info(
+        "Завантажено %s подій живлення в пам'ять (площадок: %s)",
+        sum(len(events) for events in events_by_site.values()),
+        len(events_by_site),
+    )
+
+
+def record_power_event(
+    status: bool,
+    ts: Optional[int] = None,
+    site: Optional[str] = None,
+    idempotency_key: Optional[str] = None,
+    set_state: bool = False,
+    notify: bool = False,
+    outage_seconds: Optional[int] = None,
+) -> bool:
+    """
+    Пишем событие в БД и сразу добавляем его в ленту площадки в памяти.
+    set_state — событие становится текущим состоянием площадки (та же транзакция).
+    notify — вместе с событием записать рассылку о смене статуса.
+    False — повтор по idempotency_key, ничего не записано.
+    """
+    if ts is None:
+        ts = int(time.time())
+    site = site or settings.DEFAULT_SITE
+    if not log_power_event(status, ts, site, idempotency_key, set_state, notify, outage_seconds):
+        return False
+    _timeline_for_write(site).append(ts, status)
+    return True
+
+
+def record_power_events(
+    events: Iterable[Tuple[str, int, bool]],
+    states: Optional[Dict[str, Tuple[bool, int]]] = None,
+    notifications: Iterable[Tuple[str, bool, int, Optional[int]]] = (),
+) -> int:
+    """
+    Пачка событий [(site, ts, status), ...], новые состояния площадок
+    {site: (status, ts)} и рассылки [(site, is_online, ts, outage_seconds)]:
+    одна транзакция в БД, по одному extend() на ленту.
+    """
+    events = list(events)
+    count = log_power_events(events, states, notifications)
+
+    by_site: Dict[str, List[Tuple[int, bool]]] = {}
+    for site, ts, status in events:
+        by_site.setdefault(site, []).append((ts, status))
+    for site, site_events in by_site.items():
+        _timeline_for_write(site).extend(site_events)
+    return count
@@ -0,0 +1,54 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from powerbot.lang.i18n import BASE_LANG, t
+from powerbot.storage.aio import aget_chat_lang
+from powerbot.storage.registry import subscriber_registry
+from powerbot.yasno.client import Group
+
+
+async def group_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обработка нажатий на инлайн-кнопки выбора группы YASNO.
+    callback_data вида: "group:1.1", "group:3.2"
+    """
+    query = update.callback_query
+    if not query or not query.data:
+        return
+
+    data = query.data
+    if not data.startswith("group:"):
+        return
+
+    group = data.split(":", 1)[1]
+    if group not in {g.value for g in Group}:
+        await query.answer("Unknown group", show_alert=True)
+        return
+
+    message = query.message
+    if not message:
+        await query.answer()
+        return
+
+    chat = message.chat
+    chat_id = chat.id
+    thread_id = getattr(message, "message_thread_id", None)
+
+    lang = await aget_chat_lang(chat_id, thread_id) or BASE_LANG
+
+    # Сохраняем группу для этого чата/ветки
+    if subscriber_registry.set_group(chat_id, thread_id, group):
+        text = t("group.updated", lang=lang, group=group)
+    else:
+        text = t("group.not_subscribed", lang=lang)
+
+    await query.answer()
+    try:
+        await query.edit_message_text(text=text)
+    except Exception:
+        # если редактировать не удалось — шлём новое сообщение
+        await context.bot.send_message(
+            chat_id=chat_id,
+            text=text,
+            message_thread_id=thread_id,
+        )
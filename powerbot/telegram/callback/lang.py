@@ -4,7 +4,7 @@ from telegram import Update
 from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes, CallbackQueryHandler
 
 from powerbot.lang.i18n import SUPPORTED_LANGS, get_lang_name, t
-from powerbot.storage.chat import set_chat_lang
+from powerbot.storage.aio import aset_chat_lang
 
 
 async def lang_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -35,7 +35,7 @@ async def lang_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     thread_id = getattr(message, "message_thread_id", None)
 
     # Сохраняем язык для этого чата/ветки
-    set_chat_lang(chat_id, thread_id, code)
+    await aset_chat_lang(chat_id, thread_id, code)
 
     # Для текста используем уже выбранный язык
     ui_lang = code
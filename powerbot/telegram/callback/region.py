@@ -0,0 +1,55 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from powerbot.lang.i18n import BASE_LANG, t
+from powerbot.storage.aio import aget_chat_lang
+from powerbot.storage.registry import subscriber_registry
+from powerbot.yasno.cache.cache import parse_target, target_key
+
+
+async def region_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обработка нажатий на инлайн-кнопки выбора пары YASNO region/dso.
+    callback_data вида: "region:25:902"
+    """
+    query = update.callback_query
+    if not query or not query.data:
+        return
+
+    data = query.data
+    if not data.startswith("region:"):
+        return
+
+    target = parse_target(data.split(":", 1)[1])
+    if target is None:
+        await query.answer("Unknown region", show_alert=True)
+        return
+
+    message = query.message
+    if not message:
+        await query.answer()
+        return
+
+    chat = message.chat
+    chat_id = chat.id
+    thread_id = getattr(message, "message_thread_id", None)
+
+    lang = await aget_chat_lang(chat_id, thread_id) or BASE_LANG
+
+    # Сохраняем пару region/dso для этого чата/ветки
+    key = target_key(*target)
+    if subscriber_registry.set_target(chat_id, thread_id, key):
+        text = t("region.updated", lang=lang, target=key)
+    else:
+        text = t("region.not_subscribed", lang=lang)
+
+    await query.answer()
+    try:
+        await query.edit_message_text(text=text)
+    except Exception:
+        # если редактировать не удалось — шлём новое сообщение
+        await context.bot.send_message(
+            chat_id=chat_id,
+            text=text,
+            message_thread_id=thread_id,
+        )
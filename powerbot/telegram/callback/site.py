@@ -0,0 +1,54 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from powerbot.domain.sites import parse_site
+from powerbot.lang.i18n import BASE_LANG, t
+from powerbot.storage.aio import aget_chat_lang
+from powerbot.storage.registry import subscriber_registry
+
+
+async def site_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обработка нажатий на инлайн-кнопки выбора площадки.
+    callback_data вида: "site:home", "site:office"
+    """
+    query = update.callback_query
+    if not query or not query.data:
+        return
+
+    data = query.data
+    if not data.startswith("site:"):
+        return
+
+    site = parse_site(data.split(":", 1)[1])
+    if site is None:
+        await query.answer("Unknown site", show_alert=True)
+        return
+
+    message = query.message
+    if not message:
+        await query.answer()
+        return
+
+    chat = message.chat
+    chat_id = chat.id
+    thread_id = getattr(message, "message_thread_id", None)
+
+    lang = await aget_chat_lang(chat_id, thread_id) or BASE_LANG
+
+    # Сохраняем площадку для этого чата/ветки
+    if subscriber_registry.set_site(chat_id, thread_id, site):
+        text = t("site.updated", lang=lang, site=site)
+    else:
+        text = t("site.not_subscribed", lang=lang)
+
+    await query.answer()
+    try:
+        await query.edit_message_text(text=text)
+    except Exception:
+        # если редактировать не удалось — шлём новое сообщение
+        await context.bot.send_message(
+            chat_id=chat_id,
+            text=text,
+            message_thread_id=thread_id,
+        )
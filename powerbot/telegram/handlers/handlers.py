@@ -1,8 +1,8 @@
 
 import logging
 import time
-from datetime import datetime, date, timedelta
-from typing import List, Optional
+from datetime import datetime, date, timedelta, time as dtime
+from typing import List, Optional, Tuple
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 
@@ -13,19 +13,24 @@ from powerbot.constants.constants import DAY_NAMES_SHORT
 from powerbot.domain.stats import (
     format_duration_ua,
     compute_day_stats,
-    get_last_transitions,
     plural_ua,
 )
-from powerbot.storage.state import load_state
-from powerbot.storage.db import load_all_events
-from powerbot.storage.subscribers import load_subscribers, save_subscribers
-from powerbot.storage.chat import get_chat_lang, set_chat_lang
+from powerbot.storage.aio import (
+    run_blocking,
+    aget_chat_lang,
+    aset_chat_lang,
+    aload_state,
+)
+from powerbot.storage.registry import subscriber_registry
+from powerbot.storage.timeline import get_timeline, known_sites
+from powerbot.services.daily_stats import get_days_stats
 from powerbot.yasno.client import (
-    yasno_today_slots,
-    yasno_tomorrow_slots,
-    yasno_predict_on_time,
+    yasno_schedule,
     DayStatus,
+    Group,
 )
+from powerbot.domain.sites import parse_site
+from powerbot.yasno.cache.cache import parse_target, target_key
 from powerbot.lang.i18n import get_lang_from_update, t, SUPPORTED_LANGS, get_lang_name
 
 
@@ -63,7 +68,7 @@ def build_chat_title(chat) -> Optional[str]:
     return getattr(chat, "title", None)
 
 
-def resolve_lang(update: Update) -> str:
+async def resolve_lang(update: Update) -> str:
     """
     Определяет язык для этого апдейта:
     1) если для chat_id/thread_id явно сохранён язык через /lang — берём его;
@@ -76,13 +81,68 @@ def resolve_lang(update: Update) -> str:
         thread_id = msg.message_thread_id
 
     if chat is not None:
-        saved = get_chat_lang(chat.id, thread_id)
+        saved = await aget_chat_lang(chat.id, thread_id)
         if saved:
             return saved
 
     return get_lang_from_update(update)
 
 
+def resolve_group(update: Update) -> Optional[str]:
+    """
+    Группа YASNO для этого чата/ветки: выбранная через /group
+    или YASNO_GROUP по умолчанию.
+    """
+    chat = update.effective_chat
+    msg = update.effective_message
+    if chat is None:
+        return settings.YASNO_GROUP
+
+    thread_id: Optional[int] = None
+    if msg and getattr(msg, "message_thread_id", None) is not None:
+        thread_id = msg.message_thread_id
+
+    return subscriber_registry.group_of(chat.id, thread_id)
+
+
+def resolve_site(update: Update) -> str:
+    """
+    Площадка (датчик) для этого чата/ветки: выбранная через /site
+    или DEFAULT_SITE.
+    """
+    chat = update.effective_chat
+    msg = update.effective_message
+    if chat is None:
+        return settings.DEFAULT_SITE
+
+    thread_id: Optional[int] = None
+    if msg and getattr(msg, "message_thread_id", None) is not None:
+        thread_id = msg.message_thread_id
+
+    return subscriber_registry.site_of(chat.id, thread_id)
+
+
+def resolve_target(update: Update) -> Optional[Tuple[int, int]]:
+    """
+    Пара YASNO (region_id, dso_id) для этого чата/ветки: выбранная через
+    /region или первая из YASNO_TARGETS (YASNO_REGION_ID/YASNO_DSO_ID).
+    None — YASNO не настроен.
+    """
+    primary = settings.YASNO_TARGETS[0] if settings.YASNO_TARGETS else None
+
+    chat = update.effective_chat
+    msg = update.effective_message
+    if chat is None:
+        return primary
+
+    thread_id: Optional[int] = None
+    if msg and getattr(msg, "message_thread_id", None) is not None:
+        thread_id = msg.message_thread_id
+
+    # пару, которую убрали из YASNO_TARGETS, target_of уже заменяет основной
+    return parse_target(subscriber_registry.target_of(chat.id, thread_id)) or primary
+
+
 async def send_reply(
     update: Update,
     context: ContextTypes.DEFAULT_TYPE,
@@ -130,21 +190,7 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         thread_id = msg.message_thread_id
 
     title = build_chat_title(chat)
-    subscribers = load_subscribers()
-
-    found = False
-    for sub in subscribers:
-        if sub.get("chat_id") == chat_id and sub.get("thread_id") == thread_id:
-            found = True
-            old_title = sub.get("title")
-            if title and title != old_title:
-                sub["title"] = title
-            break
-
-    if not found:
-        subscribers.append({"chat_id": chat_id, "thread_id": thread_id, "title": title})
-
-    save_subscribers(subscribers)
+    found = not subscriber_registry.add(chat_id, thread_id, title)
 
     logging.info(
         "Новий підписник: chat_id=%s, thread_id=%s, title=%r",
@@ -167,7 +213,7 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         except Exception as e:
             logging.warning("Не вдалося надіслати адмін-увідомлення: %s", e)
 
-    lang = resolve_lang(update)
+    lang = await resolve_lang(update)
 
     if not found:
         text = t("start.new", lang=lang)
@@ -189,19 +235,10 @@ async def cmd_stop(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if msg and getattr(msg, "message_thread_id", None) is not None:
         thread_id = msg.message_thread_id
 
-    subscribers = load_subscribers()
-    before_len = len(subscribers)
+    removed = subscriber_registry.remove(chat_id, thread_id)
+    lang = await resolve_lang(update)
 
-    subscribers = [
-        sub
-        for sub in subscribers
-        if not (sub.get("chat_id") == chat_id and sub.get("thread_id") == thread_id)
-    ]
-    after_len = len(subscribers)
-    lang = resolve_lang(update)
-
-    if after_len < before_len:
-        save_subscribers(subscribers)
+    if removed:
         text = t("stop.unsubscribed", lang=lang)
     else:
         text = t("stop.not_subscribed", lang=lang)
@@ -225,7 +262,7 @@ async def cmd_lang(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if msg and getattr(msg, "message_thread_id", None) is not None:
         thread_id = msg.message_thread_id
 
-    ui_lang = resolve_lang(update)
+    ui_lang = await resolve_lang(update)
 
     args = context.args if getattr(context, "args", None) else []
 
@@ -237,7 +274,7 @@ async def cmd_lang(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     # /lang  или /lang list  → показать текущий язык + инлайн-клавиатуру
     show_keyboard = (not args) or (len(args) == 1 and args[0].lower() == "list")
     if show_keyboard:
-        current = get_chat_lang(chat_id, thread_id) or ui_lang
+        current = await aget_chat_lang(chat_id, thread_id) or ui_lang
         current_name = get_lang_name(current, ui_lang)
 
         text = t(
@@ -270,14 +307,179 @@ async def cmd_lang(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         await send_reply(update, context, text)
         return
 
-    set_chat_lang(chat_id, thread_id, code)
+    await aset_chat_lang(chat_id, thread_id, code)
     name = get_lang_name(code, ui_lang)
     text = t("lang.updated", lang=ui_lang, lang_name=name, lang_code=code)
     await send_reply(update, context, text)
 
+
+async def cmd_group(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    /group
+    /group 3.1
+    """
+    chat = update.effective_chat
+    msg = update.effective_message
+    if not chat:
+        return
+
+    chat_id = chat.id
+    thread_id: Optional[int] = None
+    if msg and getattr(msg, "message_thread_id", None) is not None:
+        thread_id = msg.message_thread_id
+
+    lang = await resolve_lang(update)
+
+    if (chat_id, thread_id) not in subscriber_registry:
+        await send_reply(update, context, t("group.not_subscribed", lang=lang))
+        return
+
+    supported = ", ".join(g.value for g in Group)
+    args = context.args if getattr(context, "args", None) else []
+
+    # /group → показать текущую группу + инлайн-клавиатуру
+    if not args:
+        current = subscriber_registry.group_of(chat_id, thread_id)
+        if current:
+            text = t("group.current", lang=lang, group=current)
+        else:
+            text = t("group.missing", lang=lang)
+        text += "\n\n" + t("group.usage", lang=lang, supported=supported)
+        text += "\n\n👇"
+
+        groups = [g.value for g in Group]
+        keyboard = [
+            [
+                InlineKeyboardButton(g, callback_data=f"group:{g}")
+                for g in groups[i:i + 2]
+            ]
+            for i in range(0, len(groups), 2)
+        ]
+        markup = InlineKeyboardMarkup(keyboard)
+
+        await send_reply(update, context, text, reply_markup=markup)
+        return
+
+    # /group 3.1 → явно выставляем группу
+    group = args[0].strip()
+    if group not in {g.value for g in Group}:
+        await send_reply(update, context, t("group.invalid", lang=lang, supported=supported))
+        return
+
+    subscriber_registry.set_group(chat_id, thread_id, group)
+    await send_reply(update, context, t("group.updated", lang=lang, group=group))
+
+
+async def cmd_site(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    /site
+    /site home
+    """
+    chat = update.effective_chat
+    msg = update.effective_message
+    if not chat:
+        return
+
+    chat_id = chat.id
+    thread_id: Optional[int] = None
+    if msg and getattr(msg, "message_thread_id", None) is not None:
+        thread_id = msg.message_thread_id
+
+    lang = await resolve_lang(update)
+
+    if (chat_id, thread_id) not in subscriber_registry:
+        await send_reply(update, context, t("site.not_subscribed", lang=lang))
+        return
+
+    sites = known_sites()
+    supported = ", ".join(sites)
+    args = context.args if getattr(context, "args", None) else []
+
+    # /site → показать текущую площадку + инлайн-клавиатуру
+    if not args:
+        current = subscriber_registry.site_of(chat_id, thread_id)
+        text = t("site.current", lang=lang, site=current)
+        text += "\n\n" + t("site.usage", lang=lang, supported=supported)
+        text += "\n\n👇"
+
+        keyboard = [
+            [InlineKeyboardButton(s, callback_data=f"site:{s}")]
+            for s in sites
+        ]
+        markup = InlineKeyboardMarkup(keyboard)
+
+        await send_reply(update, context, text, reply_markup=markup)
+        return
+
+    # /site home → явно выставляем площадку (в т.ч. ещё без событий)
+    site = parse_site(args[0])
+    if site is None:
+        await send_reply(update, context, t("site.invalid", lang=lang, supported=supported))
+        return
+
+    subscriber_registry.set_site(chat_id, thread_id, site)
+    await send_reply(update, context, t("site.updated", lang=lang, site=site))
+
+
+async def cmd_region(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    /region
+    /region 25:902
+    """
+    chat = update.effective_chat
+    msg = update.effective_message
+    if not chat:
+        return
+
+    chat_id = chat.id
+    thread_id: Optional[int] = None
+    if msg and getattr(msg, "message_thread_id", None) is not None:
+        thread_id = msg.message_thread_id
+
+    lang = await resolve_lang(update)
+
+    if not settings.YASNO_TARGETS:
+        await send_reply(update, context, t("common.yasno_not_configured", lang=lang))
+        return
+
+    if (chat_id, thread_id) not in subscriber_registry:
+        await send_reply(update, context, t("region.not_subscribed", lang=lang))
+        return
+
+    targets = [target_key(region_id, dso_id) for region_id, dso_id in settings.YASNO_TARGETS]
+    supported = ", ".join(targets)
+    args = context.args if getattr(context, "args", None) else []
+
+    # /region → показать текущую пару + инлайн-клавиатуру
+    if not args:
+        current = resolve_target(update)
+        text = t("region.current", lang=lang, target=target_key(*current))
+        text += "\n\n" + t("region.usage", lang=lang, supported=supported)
+        text += "\n\n👇"
+
+        keyboard = [
+            [InlineKeyboardButton(key, callback_data=f"region:{key}")]
+            for key in targets
+        ]
+        markup = InlineKeyboardMarkup(keyboard)
+
+        await send_reply(update, context, text, reply_markup=markup)
+        return
+
+    # /region 25:902 → только пары из YASNO_TARGETS (их опрашивает watchdog)
+    target = parse_target(args[0])
+    if target is None:
+        await send_reply(update, context, t("region.invalid", lang=lang, supported=supported))
+        return
+
+    key = target_key(*target)
+    subscriber_registry.set_target(chat_id, thread_id, key)
+    await send_reply(update, context, t("region.updated", lang=lang, target=key))
+
+
 async def cmd_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    lang = resolve_lang(update)
-    state = load_state()
+    lang = await resolve_lang(update)
+    state = await aload_state(resolve_site(update))
     last_status = state.get("last_status")
     last_change_ts = state.get("last_change_ts")
 
@@ -301,31 +503,29 @@ async def cmd_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     lines.append(t("status.now", lang=lang, now=now_str))
 
     # блок YASNO
-    if settings.YASNO_REGION_ID and settings.YASNO_DSO_ID and settings.YASNO_GROUP:
+    group = resolve_group(update)
+    target = resolve_target(update)
+    if target and group:
         now_ts = int(time.time())
         today_str = datetime.fromtimestamp(now_ts).strftime("%d.%m.%Y")
         lines.append("")
         lines.append(t("status.yasno.header", lang=lang))
 
         try:
-            eta = yasno_predict_on_time(
-                now_ts=now_ts,
-                region_id=settings.YASNO_REGION_ID,
-                dso_id=settings.YASNO_DSO_ID,
-                group_str=settings.YASNO_GROUP,
-            )
-            slots_today = yasno_today_slots(
-                now_ts=now_ts,
-                region_id=settings.YASNO_REGION_ID,
-                dso_id=settings.YASNO_DSO_ID,
-                group_str=settings.YASNO_GROUP,
+            # один запрос к YASNO: и прогноз, и окна на сегодня из одного снимка
+            schedule = await run_blocking(
+                yasno_schedule,
+                region_id=target[0],
+                dso_id=target[1],
             )
+            eta = schedule.predict_on_time(group, now_ts)
+            slots_today = schedule.today_slots(group, now_ts)
 
             lines.append(
                 t(
                     "status.yasno.group_date",
                     lang=lang,
-                    group=settings.YASNO_GROUP,
+                    group=group,
                     date=today_str,
                 )
             )
@@ -401,17 +601,19 @@ async def cmd_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
 
 
 async def cmd_today(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    lang = resolve_lang(update)
-    events = load_all_events()
+    lang = await resolve_lang(update)
+    site = resolve_site(update)
+    timeline = get_timeline(site)
+    today = date.today()
+    events = timeline.events_between(int(datetime.combine(today, dtime.min).timestamp()))
     if not events:
         await send_reply(update, context, t("common.no_data_yet", lang=lang))
         return
 
-    today = date.today()
-    stats_today = compute_day_stats(today, events)
-    last_off_ts, last_on_ts = get_last_transitions(events)
+    stats_today = await run_blocking(compute_day_stats, today, events)
+    last_off_ts, last_on_ts = timeline.last_transitions()
 
-    state = load_state()
+    state = await aload_state(site)
     last_status = state.get("last_status")
 
     lines: List[str] = []
@@ -482,15 +684,18 @@ async def cmd_today(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 
 async def cmd_week(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    lang = resolve_lang(update)
-    events = load_all_events()
-    if not events:
-        await send_reply(update, context, t("common.no_data_yet", lang=lang))
-        return
-
+    lang = await resolve_lang(update)
     today = date.today()
     weekday = today.weekday()  # 0 = Пн, 6 = Нд
     monday = today - timedelta(days=weekday)
+    site = resolve_site(update)
+
+    if get_timeline(site).last() is None:
+        await send_reply(update, context, t("common.no_data_yet", lang=lang))
+        return
+
+    week_days = [monday + timedelta(days=i) for i in range(weekday + 1)]
+    week_stats = await run_blocking(get_days_stats, week_days, site=site)
 
     lines: List[str] = []
     lines.append(
@@ -504,9 +709,8 @@ async def cmd_week(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
     has_any = False
 
-    for i in range(weekday + 1):
-        day = monday + timedelta(days=i)
-        stats = compute_day_stats(day, events)
+    for day in week_days:
+        stats = week_stats.get(day)
         name = DAY_NAMES_SHORT[day.weekday()]
         ds = day.strftime("%d.%m")
 
@@ -550,20 +754,23 @@ async def cmd_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     """
     Графік відключень YASNO на сьогодні.
     """
-    lang = resolve_lang(update)
+    lang = await resolve_lang(update)
     now_ts = int(time.time())
 
-    if not (settings.YASNO_REGION_ID and settings.YASNO_DSO_ID and settings.YASNO_GROUP):
+    group = resolve_group(update)
+    target = resolve_target(update)
+
+    if not (target and group):
         await send_reply(update, context, t("common.yasno_not_configured", lang=lang))
         return
 
     try:
-        slots = yasno_today_slots(
-            now_ts=now_ts,
-            region_id=settings.YASNO_REGION_ID,
-            dso_id=settings.YASNO_DSO_ID,
-            group_str=settings.YASNO_GROUP,
+        schedule = await run_blocking(
+            yasno_schedule,
+            region_id=target[0],
+            dso_id=target[1],
         )
+        slots = schedule.today_slots(group, now_ts)
     except Exception:
         logging.exception("Помилка при отриманні графіка YASNO")
         await send_reply(
@@ -586,7 +793,7 @@ async def cmd_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         t(
             "schedule.today.group",
             lang=lang,
-            group=settings.YASNO_GROUP,
+            group=group,
         )
         + "\n"
     )
@@ -619,20 +826,23 @@ async def cmd_schedule_tomorrow(
     """
     Графік відключень YASNO на завтра.
     """
-    lang = resolve_lang(update)
+    lang = await resolve_lang(update)
     now_ts = int(time.time())
 
-    if not (settings.YASNO_REGION_ID and settings.YASNO_DSO_ID and settings.YASNO_GROUP):
+    group = resolve_group(update)
+    target = resolve_target(update)
+
+    if not (target and group):
         await send_reply(update, context, t("common.yasno_not_configured", lang=lang))
         return
 
     try:
-        slots = yasno_tomorrow_slots(
-            now_ts=now_ts,
-            region_id=settings.YASNO_REGION_ID,
-            dso_id=settings.YASNO_DSO_ID,
-            group_str=settings.YASNO_GROUP,
+        schedule = await run_blocking(
+            yasno_schedule,
+            region_id=target[0],
+            dso_id=target[1],
         )
+        slots = schedule.tomorrow_slots(group, now_ts)
     except Exception:
         logging.exception("Помилка при отриманні завтрашнього графіка")
         await send_reply(
@@ -658,7 +868,7 @@ async def cmd_schedule_tomorrow(
         t(
             "schedule.tomorrow.group",
             lang=lang,
-            group=settings.YASNO_GROUP,
+            group=group,
         )
         + "\n"
     )
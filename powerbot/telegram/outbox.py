@@ -0,0 +1,198 @@
+# powerbot/telegram/outbox.py
+import logging
+import threading
+from typing import Iterable, List
+
+from powerbot.config.config import settings
+from powerbot.storage.outbox import (
+    OutboxItem,
+    claim_due,
+    enqueue_fanout,
+    enqueue_messages,
+    mark_failed,
+    mark_retry,
+    mark_sent,
+    recover_in_flight,
+)
+from powerbot.storage.notifications import PendingNotification, complete_notification
+from powerbot.services.fanout import FanoutPlan
+from powerbot.telegram.sender import (
+    AsyncTelegramSender,
+    OutgoingMessage,
+    SendResult,
+    telegram_sender,
+)
+
+# пауза перед повтором: 5с, 10с, 20с ... но не больше 10 минут
+RETRY_BASE_DELAY = 5.0
+RETRY_MAX_DELAY = 600.0
+
+
+def retry_delay(attempts: int) -> float:
+    return min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** max(0, attempts)))
+
+
+class OutboxDispatcher:
+    """
+    Воркеры, разгребающие таблицу outbox.
+
+    Каждый воркер забирает пачку готовых к отправке сообщений, отдаёт их
+    AsyncTelegramSender (он параллелит запросы и соблюдает лимиты) и по
+    результату удаляет строку, откладывает повтор или помечает FAILED.
+    Очередь лежит в SQLite, поэтому после рестарта рассылка продолжается
+    с того места, где остановилась.
+    """
+
+    def __init__(
+        self,
+        sender: AsyncTelegramSender,
+        batch_size: int,
+        max_attempts: int,
+        poll_interval: float,
+    ) -> None:
+        self._sender = sender
+        self.batch_size = max(1, batch_size)
+        self.max_attempts = max(1, max_attempts)
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    def wake(self) -> None:
+        """
+        Разбудить воркеры: в очереди появились новые сообщения.
+        """
+        self._wakeup.set()
+
+    def start(self, workers: int = 1) -> None:
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+
+        recovered = recover_in_flight()
+        if recovered:
+            logging.info("Outbox: повернуто в чергу %s незавершених повідомлень", recovered)
+
+        for i in range(max(1, workers)):
+            thread = threading.Thread(
+                target=self._run,
+                name=f"outbox-{i}",
+                daemon=True,
+            )
+            thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                processed = self.drain_once()
+            except Exception:
+                logging.exception("Outbox: помилка під час розсилки")
+                processed = 0
+
+            if not processed:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def drain_once(self) -> int:
+        """
+        Отправить одну пачку. Возвращает количество обработанных сообщений.
+        """
+        items = claim_due(self.batch_size)
+        if not items:
+            return 0
+
+        futures = [
+            self._sender.submit(
+                OutgoingMessage(
+                    chat_id=item.chat_id,
+                    text=item.text,
+                    thread_id=item.thread_id,
+                    with_read_button=item.with_read_button,
+                )
+            )
+            for item in items
+        ]
+
+        sent_ids: List[int] = []
+        for item, fut in zip(items, futures):
+            try:
+                result = fut.result()
+            except Exception as e:
+                result = SendResult(ok=False, retryable=True, error=str(e))
+
+            if result.ok:
+                sent_ids.append(item.id)
+            else:
+                self._handle_failure(item, result)
+
+        mark_sent(sent_ids)
+        return len(items)
+
+    def _handle_failure(self, item: OutboxItem, result: SendResult) -> None:
+        if result.retry_after is not None:
+            # flood control: ждём сколько сказал Telegram, попытку не списываем
+            mark_retry(item.id, result.error, result.retry_after, count_attempt=False)
+            return
+
+        attempts = item.attempts + 1
+        if result.retryable and attempts < self.max_attempts:
+            mark_retry(item.id, result.error, retry_delay(item.attempts))
+            return
+
+        logging.warning(
+            "Outbox: повідомлення %s у чат %s не доставлено після %s спроб: %s",
+            item.id,
+            item.chat_id,
+            attempts,
+            result.error,
+        )
+        mark_failed(item.id, result.error)
+
+
+outbox_dispatcher = OutboxDispatcher(
+    sender=telegram_sender,
+    batch_size=settings.OUTBOX_BATCH_SIZE,
+    max_attempts=settings.OUTBOX_MAX_ATTEMPTS,
+    poll_interval=settings.OUTBOX_POLL_INTERVAL,
+)
+
+
+def queue_telegram_messages(messages: List[OutgoingMessage]) -> int:
+    """
+    Положить рассылку в outbox (одной транзакцией) и сразу вернуться.
+    Доставкой занимаются воркеры outbox_dispatcher.
+    """
+    count = enqueue_messages(messages)
+    if count:
+        outbox_dispatcher.wake()
+    return count
+
+
+def queue_fanout(plan: FanoutPlan) -> int:
+    """
+    То же для рассылки из plan_fanout: тексты сохраняются по одному
+    на язык, строки очереди ссылаются на них.
+    """
+    count = enqueue_fanout(plan.payloads, plan.deliveries)
+    if count:
+        outbox_dispatcher.wake()
+    return count
+
+
+def queue_notification_fanout(
+    notification: PendingNotification,
+    plans: Iterable[FanoutPlan],
+) -> int:
+    """
+    Рассылка о смене статуса: планы ставятся в outbox, а запись
+    power_notifications удаляется в той же транзакции — уведомление не
+    теряется и не дублируется при падении между этими шагами.
+    """
+    count = complete_notification(
+        notification,
+        [(plan.payloads, plan.deliveries) for plan in plans],
+    )
+    if count:
+        outbox_dispatcher.wake()
+    return count
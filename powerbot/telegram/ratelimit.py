@@ -0,0 +1,275 @@
+# powerbot/telegram/ratelimit.py
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+# Telegram: в одну группу — не больше ~20 сообщений в минуту
+GROUP_MSG_PER_MIN = 20.0
+
+# AIMD для глобальной скорости после 429:
+# на каждый глобальный flood — скорость в RATE_DECREASE_FACTOR раз ниже
+# (но не ниже MIN_GLOBAL_RATE), после RATE_RECOVERY_EVERY успешных отправок
+# подряд — плюс RATE_RECOVERY_STEP от максимума
+RATE_DECREASE_FACTOR = 0.5
+RATE_RECOVERY_STEP = 0.1
+RATE_RECOVERY_EVERY = 50
+MIN_GLOBAL_RATE = 1.0
+
+
+class TokenBucket:
+    """
+    Классический token bucket: rate токенов/сек, не больше capacity.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """
+        Сколько секунд ждать до появления целого токена (0 — можно сейчас).
+        """
+        if now < self.updated:
+            # ведро на паузе (pause_until) — токены начнут копиться позже
+            return self.updated - now + max(0.0, 1.0 - self.tokens) / self.rate
+        self._refill(now)
+        if self.tokens >= 1.0:
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def consume(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1.0
+
+    def is_idle(self, now: float) -> bool:
+        """
+        Ведро снова полное — оно ничем не отличается от нового.
+        """
+        if now < self.updated:
+            return False
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+    def pause_until(self, until: float) -> None:
+        """
+        Не выдавать токены до момента until; после паузы — без всплеска.
+        """
+        if until > self.updated:
+            self.tokens = min(self.tokens, 1.0)
+            self.updated = until
+
+    def set_rate(self, rate: float, now: float) -> None:
+        self._refill(now)
+        self.rate = rate
+
+
+class SendScheduler:
+    """
+    Планировщик отправок: глобальный token bucket + ведро на каждый чат.
+
+    - глобально: max_global_per_sec сообщений/сек (с запасом на всплеск);
+    - личка: не чаще одного сообщения в per_chat_interval секунд;
+    - группы/каналы (chat_id < 0): group_per_min сообщений в минуту.
+
+    Ожидающие отправки лежат в очередях по чатам, а диспетчер берёт
+    ЛЮБОЙ чат, который уже готов, — чат, упёршийся в свой лимит,
+    не задерживает остальных. Вёдра простаивающих чатов удаляются.
+
+    Ответы 429 сообщаются через on_flood: чат (или весь отправитель)
+    ставится на паузу на retry_after, а глобальная скорость снижается
+    и потом плавно возвращается к максимуму (on_success).
+    Должен использоваться из одного event loop.
+    """
+
+    def __init__(
+        self,
+        max_global_per_sec: float,
+        global_burst: float,
+        per_chat_interval: float,
+        group_per_min: float = GROUP_MSG_PER_MIN,
+    ) -> None:
+        now = time.monotonic()
+        self.max_global_rate = max_global_per_sec
+        self._global = TokenBucket(max_global_per_sec, max(1.0, global_burst), now)
+        self._success_streak = 0
+        self._private_rate = 1.0 / per_chat_interval if per_chat_interval > 0 else float("inf")
+        self._group_rate = group_per_min / 60.0
+
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._waiting: Dict[int, Deque[asyncio.Future]] = {}
+        # (момент готовности, порядок постановки, chat_id)
+        self._ready_heap: List[Tuple[float, int, int]] = []
+        self._seq = itertools.count()
+
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_sweep = now
+
+    def _bucket(self, chat_id: int, now: float) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            rate = self._group_rate if chat_id < 0 else self._private_rate
+            bucket = TokenBucket(rate, 1.0, now)
+            self._buckets[chat_id] = bucket
+        return bucket
+
+    def _ensure_started(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._dispatch())
+
+    async def acquire(self, chat_id: int) -> None:
+        """
+        Дождаться разрешения на отправку одного сообщения в chat_id.
+        """
+        self._ensure_started()
+        fut = asyncio.get_running_loop().create_future()
+
+        queue = self._waiting.get(chat_id)
+        if queue is None:
+            queue = self._waiting[chat_id] = deque()
+        queue.append(fut)
+        if len(queue) == 1:
+            # чат только что появился в очереди — он готов «сразу»,
+            # точное время проверит диспетчер по его ведру
+            heapq.heappush(self._ready_heap, (0.0, next(self._seq), chat_id))
+            self._wakeup.set()
+
+        await fut
+
+    @property
+    def global_rate(self) -> float:
+        return self._global.rate
+
+    def on_flood(self, chat_id: int, retry_after: float) -> None:
+        """
+        Telegram ответил 429 для chat_id.
+
+        Группы/каналы упираются в свой лимит ~20 сообщений в минуту —
+        паузим только этот чат. Для лички 429 почти всегда означает
+        превышение глобального лимита бота — паузим всю отправку
+        и снижаем глобальную скорость.
+        """
+        now = time.monotonic()
+        until = now + max(0.0, retry_after)
+        self._success_streak = 0
+
+        self._bucket(chat_id, now).pause_until(until)
+        if chat_id > 0:
+            # 429 от запросов, ушедших до паузы, — тот же самый flood:
+            # скорость снижаем один раз
+            already_paused = self._global.updated > now
+            self._global.pause_until(until)
+            if already_paused:
+                return
+            new_rate = max(
+                min(MIN_GLOBAL_RATE, self.max_global_rate),
+                self._global.rate * RATE_DECREASE_FACTOR,
+            )
+            if new_rate < self._global.rate:
+                self._global.set_rate(new_rate, now)
+                logging.warning(
+                    "Telegram flood control: пауза %.1f с, глобальна швидкість %.2f msg/s",
+                    retry_after,
+                    new_rate,
+                )
+
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def on_success(self) -> None:
+        """
+        Успешная отправка: после серии успехов поднимаем глобальную скорость.
+        """
+        if self._global.rate >= self.max_global_rate:
+            return
+        self._success_streak += 1
+        if self._success_streak < RATE_RECOVERY_EVERY:
+            return
+        self._success_streak = 0
+        new_rate = min(
+            self.max_global_rate,
+            self._global.rate + self.max_global_rate * RATE_RECOVERY_STEP,
+        )
+        self._global.set_rate(new_rate, time.monotonic())
+
+    def _sweep(self, now: float) -> None:
+        for chat_id in [
+            cid
+            for cid, bucket in self._buckets.items()
+            if cid not in self._waiting and bucket.is_idle(now)
+        ]:
+            del self._buckets[chat_id]
+        self._last_sweep = now
+
+    async def _sleep_or_wakeup(self, delay: float) -> None:
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _dispatch(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now - self._last_sweep > 60.0:
+                self._sweep(now)
+
+            if not self._ready_heap:
+                await self._sleep_or_wakeup(60.0)
+                continue
+
+            ready_at, _, chat_id = self._ready_heap[0]
+            if ready_at > now:
+                await self._sleep_or_wakeup(ready_at - now)
+                continue
+
+            global_wait = self._global.wait_time(now)
+            if global_wait > 0:
+                await asyncio.sleep(global_wait)
+                continue
+
+            heapq.heappop(self._ready_heap)
+            queue = self._waiting.get(chat_id)
+            if not queue:
+                continue
+
+            bucket = self._bucket(chat_id, now)
+            chat_wait = bucket.wait_time(now)
+            if chat_wait > 0:
+                heapq.heappush(self._ready_heap, (now + chat_wait, next(self._seq), chat_id))
+                continue
+
+            fut = queue.popleft()
+            if fut.cancelled():
+                # отправитель ушёл — токены не тратим
+                if queue:
+                    heapq.heappush(self._ready_heap, (now, next(self._seq), chat_id))
+                else:
+                    del self._waiting[chat_id]
+                continue
+
+            bucket.consume(now)
+            self._global.consume(now)
+            fut.set_result(None)
+
+            if queue:
+                heapq.heappush(
+                    self._ready_heap,
+                    (now + bucket.wait_time(now), next(self._seq), chat_id),
+                )
+            else:
+                del self._waiting[chat_id]
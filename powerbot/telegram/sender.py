@@ -0,0 +1,215 @@
+# powerbot/telegram/sender.py
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+
+import httpx
+
+from powerbot.config.config import settings
+from powerbot.telegram.ratelimit import SendScheduler
+
+try:
+    import h2  # noqa: F401  — нужен httpx для HTTP/2
+    _HTTP2 = True
+except ImportError:  # pragma: no cover - зависит от окружения
+    _HTTP2 = False
+
+
+@dataclass
+class OutgoingMessage:
+    chat_id: int
+    text: str
+    thread_id: Optional[int] = None
+    with_read_button: bool = False
+
+
+@dataclass
+class SendResult:
+    ok: bool
+    # временная ошибка (сеть, 429, 5xx) — имеет смысл повторить позже
+    retryable: bool = False
+    error: Optional[str] = None
+    # 429: через сколько секунд Telegram разрешит повторить
+    retry_after: Optional[float] = None
+
+
+# сколько раз сам отправитель повторяет сообщение после 429,
+# прежде чем вернуть его вызывающему (outbox отложит его сам)
+FLOOD_RETRIES = 3
+
+
+def parse_retry_after(resp: httpx.Response) -> float:
+    """
+    parameters.retry_after из ответа 429 (или заголовок Retry-After).
+    """
+    try:
+        value = resp.json().get("parameters", {}).get("retry_after")
+    except Exception:
+        value = None
+    if value is None:
+        value = resp.headers.get("Retry-After")
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def build_payload(msg: OutgoingMessage) -> dict:
+    payload = {
+        "chat_id": msg.chat_id,
+        "text": msg.text,
+    }
+    if msg.thread_id is not None:
+        payload["message_thread_id"] = msg.thread_id
+
+    # Кнопка "Прочитано" только в приватных чатах
+    if msg.with_read_button and msg.chat_id > 0:
+        payload["reply_markup"] = {
+            "inline_keyboard": [
+                [
+                    {
+                        "text": "✅ Прочитано",
+                        "callback_data": "ack",
+                    }
+                ]
+            ]
+        }
+    return payload
+
+
+class AsyncTelegramSender:
+    """
+    Асинхронная отправка sendMessage через один пул keep-alive соединений
+    (HTTP/2, если установлен h2).
+
+    Работает в собственном event loop в фоновом потоке, поэтому его можно
+    вызывать из любых синхронных потоков (Flask, YASNO-watchdog).
+    Одновременно в полёте до max_in_flight запросов; очередность и лимиты
+    Telegram (глобальный, по чату, по группе) решает SendScheduler.
+    """
+
+    def __init__(self, token: str, max_in_flight: int) -> None:
+        self.api_url = f"https://api.telegram.org/bot{token}/sendMessage"
+        self.max_in_flight = max(1, max_in_flight)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._in_flight: Optional[asyncio.Semaphore] = None
+        self._scheduler: Optional[SendScheduler] = None
+        self._start_lock = threading.Lock()
+
+    # ---------- жизненный цикл ----------
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            ready = threading.Event()
+            thread = threading.Thread(
+                target=self._run_loop,
+                args=(ready,),
+                name="telegram-sender",
+                daemon=True,
+            )
+            thread.start()
+            ready.wait()
+
+    def _run_loop(self, ready: threading.Event) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._client = httpx.AsyncClient(
+            http2=_HTTP2,
+            timeout=10.0,
+            limits=httpx.Limits(
+                max_connections=self.max_in_flight,
+                max_keepalive_connections=self.max_in_flight,
+                keepalive_expiry=60.0,
+            ),
+        )
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        self._scheduler = SendScheduler(
+            max_global_per_sec=settings.MAX_GLOBAL_MSG_PER_SEC,
+            global_burst=settings.MAX_GLOBAL_MSG_PER_SEC * settings.SEND_WINDOW_SEC,
+            per_chat_interval=settings.MIN_PER_CHAT_INTERVAL,
+            group_per_min=settings.TG_GROUP_MSG_PER_MIN,
+        )
+        self._loop = loop
+        ready.set()
+        loop.run_forever()
+
+    # ---------- отправка ----------
+
+    async def send(self, msg: OutgoingMessage) -> SendResult:
+        """
+        Отправить одно сообщение. На 429 чат (или весь отправитель)
+        ставится на паузу в планировщике, и сообщение уходит повторно,
+        не более FLOOD_RETRIES раз.
+        """
+        payload = build_payload(msg)
+        attempt = 0
+        while True:
+            await self._scheduler.acquire(msg.chat_id)
+
+            async with self._in_flight:
+                try:
+                    resp = await self._client.post(self.api_url, json=payload)
+                except Exception as e:
+                    logging.warning("Не вдалося надіслати повідомлення у чат %s: %s", msg.chat_id, e)
+                    return SendResult(ok=False, retryable=True, error=str(e))
+
+            if resp.status_code == 429:
+                retry_after = parse_retry_after(resp)
+                self._scheduler.on_flood(msg.chat_id, retry_after)
+                if attempt < FLOOD_RETRIES:
+                    attempt += 1
+                    logging.info(
+                        "Telegram 429 для чату %s, повтор через %.1f с",
+                        msg.chat_id,
+                        retry_after,
+                    )
+                    continue
+                return SendResult(
+                    ok=False,
+                    retryable=True,
+                    error=f"429 {resp.text[:200]}",
+                    retry_after=retry_after,
+                )
+
+            if resp.status_code != 200:
+                logging.warning(
+                    "Помилка Telegram API для чату %s: %s %s",
+                    msg.chat_id,
+                    resp.status_code,
+                    resp.text,
+                )
+                return SendResult(
+                    ok=False,
+                    retryable=resp.status_code >= 500,
+                    error=f"{resp.status_code} {resp.text[:200]}",
+                )
+
+            self._scheduler.on_success()
+            return SendResult(ok=True)
+
+    def submit(self, msg: OutgoingMessage) -> Future:
+        """
+        Поставить сообщение в отправку из синхронного кода.
+        """
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self.send(msg), self._loop)
+
+    def send_many(self, messages: Iterable[OutgoingMessage]) -> List[SendResult]:
+        """
+        Отправить пачку сообщений параллельно и дождаться результата.
+        """
+        futures = [self.submit(msg) for msg in messages]
+        return [f.result() for f in futures]
+
+
+telegram_sender = AsyncTelegramSender(
+    token=settings.TELEGRAM_BOT_TOKEN,
+    max_in_flight=settings.TG_MAX_IN_FLIGHT,
+)
@@ -1,19 +1,20 @@
+import hashlib
 import logging
+import threading
 import time
-from datetime import datetime, date, timedelta
-from typing import List, Optional
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Callable, Dict, Optional, Tuple
 from flask import Flask, request, jsonify, render_template, Response
 
 from powerbot.config.config import settings
-from powerbot.constants.constants import DAY_NAMES_SHORT
-from powerbot.storage.db import load_all_events
-from powerbot.storage.state import load_state
-from powerbot.domain.stats import (
-    compute_day_stats,
-    compute_day_hourly_online,
-    format_duration_ua,
-)
-from powerbot.services.power_status import apply_status_change
+from powerbot.storage.db import count_events
+from powerbot.storage.timeline import get_timeline, known_sites
+from powerbot.domain.sites import parse_site
+from powerbot.domain.stats import format_duration_ua
+from powerbot.services.history import build_history
+from powerbot.services.metrics import power_metrics
+from powerbot.services.power_status import apply_status_batch, apply_status_change
 
 
 flask_app = Flask(
@@ -36,153 +37,222 @@ def power_hook():
 
     is_online = (status_str == "on")
 
-    ts = data.get("ts")
-    try:
-        now_ts = int(ts) if ts is not None else int(time.time())
-    except Exception:
-        now_ts = int(time.time())
+    # без site — площадка по умолчанию (старые датчики)
+    site = settings.DEFAULT_SITE
+    if data.get("site") is not None:
+        site = parse_site(data.get("site"))
+        if site is None:
+            return jsonify({"ok": False, "error": "invalid site"}), 400
+
+    # повторы одного и того же вебхука датчик помечает одним ключом
+    idempotency_key = request.headers.get("Idempotency-Key") or data.get("idempotency_key")
+    if idempotency_key is not None:
+        idempotency_key = str(idempotency_key).strip()
+        if not 0 < len(idempotency_key) <= 128:
+            return jsonify({"ok": False, "error": "invalid idempotency key"}), 400
+
+    # кривую метку (в т.ч. из будущего) заменяем временем сервера
+    now_ts = int(time.time())
+    if data.get("ts") is not None:
+        now_ts = _parse_ts(data.get("ts"), now_ts) or now_ts
 
-    msg = apply_status_change(is_online, now_ts)
+    # событие записано до ответа; рассылка идёт в фоне
+    result = apply_status_change(is_online, now_ts, site, idempotency_key)
 
-    return jsonify({"ok": True, "applied": bool(msg), "message": msg}), 200
+    return jsonify({"ok": True, "site": site, "result": result, "applied": result == "applied"}), 200
 
 
-@flask_app.route("/healthz")
-def healthz():
+# насколько часы датчика могут спешить относительно сервера
+_MAX_TS_SKEW = 300
+
+
+def _parse_ts(value, now_ts: int) -> Optional[int]:
     """
-    Простий healthcheck:
-    - пробуем прочитать события из БД
+    Метка времени датчика или None, если она не годится: не число, bool,
+    не положительная или из будущего дальше _MAX_TS_SKEW (заодно не
+    выходит за INTEGER SQLite).
     """
+    if isinstance(value, bool):
+        return None
     try:
-        events = load_all_events()
-        return jsonify({"ok": True, "events_count": len(events)}), 200
-    except Exception as e:
-        logging.exception("Healthcheck failed")
-        return jsonify({"ok": False, "error": str(e)}), 500
+        ts = int(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if ts <= 0 or ts > now_ts + _MAX_TS_SKEW:
+        return None
+    return ts
 
 
-def compute_uptime_ratio_window(
-    events: List[tuple[int, bool]],
-    window_seconds: int,
-    now_ts: Optional[int] = None,
-) -> Optional[float]:
+def _parse_reading(item, now_ts: int):
     """
-    Считает долю времени "online" за последний window_seconds.
-
-    Возвращает число от 0 до 1 или None, если данных нет.
-    Окно скользящее: [now - window, now].
+    Одно показание пачки -> ((site, ts, status), None) или (None, ошибка).
     """
-    if not events:
-        return None
+    if not isinstance(item, dict):
+        return None, "invalid reading"
 
-    if now_ts is None:
-        now_ts = int(time.time())
+    status_str = item.get("status")
+    if status_str not in ("on", "off"):
+        return None, "invalid status"
 
-    window_end = now_ts
-    window_start = now_ts - window_seconds
+    site = settings.DEFAULT_SITE
+    if item.get("site") is not None:
+        site = parse_site(item.get("site"))
+        if site is None:
+            return None, "invalid site"
 
-    # если все события в будущем относительно окна — смысла нет
-    first_ts = events[0][0]
-    if first_ts >= window_end:
-        return None
+    ts = now_ts
+    if item.get("ts") is not None:
+        ts = _parse_ts(item.get("ts"), now_ts)
+        if ts is None:
+            return None, "invalid ts"
 
-    # не уходим левее первой записи
-    if window_start < first_ts:
-        window_start = first_ts
+    return (site, ts, status_str == "on"), None
 
-    # статус в момент window_start
-    cur_status = events[0][1]
-    for ts, st in events:
-        if ts <= window_start:
-            cur_status = st
-        else:
-            break
 
-    cur_ts = window_start
-    online = 0
+@flask_app.route("/power-hook/batch", methods=["POST"])
+def power_hook_batch():
+    """
+    Пачка показаний от шлюза датчиков:
+      {"secret": "...", "readings": [{"site": "...", "status": "on|off", "ts": 1700000000}, ...]}
+
+    Невалидные показания пропускаются (их индексы — в "rejected"), остальные
+    записываются одной транзакцией; уведомления уходят в фоне.
+    """
+    data = request.get_json(force=True, silent=True) or {}
 
-    for ts, st in events:
-        if ts <= window_start:
-            continue
-        if ts >= window_end:
-            break
+    if data.get("secret") != settings.WEBHOOK_SECRET:
+        return jsonify({"ok": False, "error": "forbidden"}), 403
 
-        dur = ts - cur_ts
-        if dur > 0 and cur_status:
-            online += dur
+    items = data.get("readings")
+    if not isinstance(items, list):
+        return jsonify({"ok": False, "error": "invalid readings"}), 400
+    if len(items) > settings.WEBHOOK_BATCH_MAX:
+        return jsonify({"ok": False, "error": "too many readings", "max": settings.WEBHOOK_BATCH_MAX}), 413
 
-        cur_status = st
-        cur_ts = ts
+    now_ts = int(time.time())
+    readings = []
+    rejected = []
+    for index, item in enumerate(items):
+        reading, error = _parse_reading(item, now_ts)
+        if reading is None:
+            rejected.append({"index": index, "error": error})
+        else:
+            readings.append(reading)
 
-    # хвост до window_end
-    if cur_ts < window_end and cur_status:
-        online += window_end - cur_ts
+    logging.info("Отримано пакет webhook: %s показань, відхилено %s", len(items), len(rejected))
 
-    total = window_end - window_start
-    if total <= 0:
-        return None
+    result = apply_status_batch(readings)
 
-    return online / total
+    return jsonify({"ok": True, "accepted": len(readings), "rejected": rejected, **result}), 200
+
+
+@flask_app.route("/healthz")
+def healthz():
+    """
+    Простий healthcheck:
+    - пробуем посчитать события в БД
+    """
+    try:
+        return jsonify({"ok": True, "events_count": count_events()}), 200
+    except Exception as e:
+        logging.exception("Healthcheck failed")
+        return jsonify({"ok": False, "error": str(e)}), 500
 
 
 @flask_app.route("/metrics")
 def metrics():
     """
-    Prometheus metrics (text/plain):
-      - power_events_total
-      - power_status{status="online|offline|unknown"}
-      - power_uptime_ratio{window="24h|7d"}
+    Prometheus metrics (text/plain), серия на каждую площадку:
+      - power_events_total{site="..."}
+      - power_status{site="...",status="online|offline|unknown"}
+      - power_uptime_ratio{site="...",window="24h|7d"}
+
+    Текст собирается заранее (services.metrics), скрейп только отдаёт его.
     """
-    events = load_all_events()
-    events_total = len(events)
+    return Response(power_metrics.exposition(), mimetype="text/plain")
 
-    state = load_state()
-    last_status = state.get("last_status")
 
-    if last_status is True:
-        current_label = "online"
-    elif last_status is False:
-        current_label = "offline"
-    else:
-        current_label = "unknown"
+def _parse_days_window() -> int:
+    days_param = request.args.get("days", "1")
+    try:
+        days_window = int(days_param)
+    except ValueError:
+        days_window = 1
+    return max(1, min(days_window, settings.HISTORY_MAX_DAYS))
 
-    now_ts = int(time.time())
-    uptime_24h = compute_uptime_ratio_window(events, 24 * 3600, now_ts)
-    uptime_7d = compute_uptime_ratio_window(events, 7 * 24 * 3600, now_ts)
-
-    lines = []
-    # --- общее количество событий ---
-    lines.append("# HELP power_events_total Total number of power events")
-    lines.append("# TYPE power_events_total counter")
-    lines.append(f"power_events_total {events_total}")
-
-    # --- текущий статус ---
-    lines.append("# HELP power_status Current power status as a one-hot gauge")
-    lines.append("# TYPE power_status gauge")
-    for st in ("online", "offline", "unknown"):
-        val = 1 if st == current_label else 0
-        lines.append(f'power_status{{status="{st}"}} {val}')
-
-    # --- аптайм ---
-    lines.append("# HELP power_uptime_ratio Power uptime ratio over rolling window (0..1)")
-    lines.append("# TYPE power_uptime_ratio gauge")
-    if uptime_24h is not None:
-        lines.append(f'power_uptime_ratio{{window="24h"}} {uptime_24h:.6f}')
-    if uptime_7d is not None:
-        lines.append(f'power_uptime_ratio{{window="7d"}} {uptime_7d:.6f}')
-
-    text = "\n".join(lines) + "\n"
-    return Response(text, mimetype="text/plain")
+
+def _parse_site() -> str:
+    return parse_site(request.args.get("site")) or settings.DEFAULT_SITE
+
+
+# etag -> (тело ответа, mimetype, минута); держим только текущую минуту
+_response_cache: Dict[str, Tuple[bytes, str, int]] = {}
+_response_cache_lock = threading.Lock()
+# потолок записей в пределах минуты (пути × окна × площадки)
+_RESPONSE_CACHE_MAX = 256
+
+
+def cached_response(view: Callable) -> Callable:
+    """
+    Кэш ответа + ETag/Last-Modified и 304 Not Modified.
+
+    Ключ: путь, разобранные days и site (прочие query-параметры view не
+    читают, в ключ они не идут), ревизия ленты событий площадки и текущая
+    минута (на странице есть "сейчас" и открытые отключения, которые идут
+    поминутно). Пока нет новых событий, повторные загрузки в ту же минуту
+    отдаются из кэша, а браузеры с If-None-Match получают 304.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        now_ts = int(time.time())
+        minute = now_ts // 60
+        site = _parse_site()
+        timeline = get_timeline(site)
+        last_event = timeline.last()
+        params = f"days={_parse_days_window()}&site={site}"
+        key = f"{request.path}?{params}|{timeline.revision}|{last_event}|{minute}"
+        etag = hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+        with _response_cache_lock:
+            cached = _response_cache.get(etag)
+
+        if cached is not None:
+            body, mimetype, _ = cached
+            response = Response(body, mimetype=mimetype)
+        else:
+            response = flask_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            with _response_cache_lock:
+                for old_etag in [k for k, v in _response_cache.items() if v[2] != minute]:
+                    del _response_cache[old_etag]
+                # при переполнении выбрасываем самые старые записи
+                while len(_response_cache) >= _RESPONSE_CACHE_MAX:
+                    del _response_cache[next(iter(_response_cache))]
+                _response_cache[etag] = (response.get_data(), response.mimetype, minute)
+
+        response.set_etag(etag)
+        modified_ts = max(minute * 60, timeline.updated_at)
+        response.last_modified = datetime.fromtimestamp(modified_ts, tz=timezone.utc)
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    return wrapper
 
 
 @flask_app.route("/")
+@cached_response
 def index():
-    events = load_all_events()
-    today = date.today()
-    now_str = datetime.now().strftime("%d.%m.%Y %H:%M")
+    now_ts = int(time.time())
+    now_str = datetime.fromtimestamp(now_ts).strftime("%d.%m.%Y %H:%M")
+    days_window = _parse_days_window()
+    site = _parse_site()
+    history = build_history(site, days_window, now_ts)
 
-    current_status = events[-1][1] if events else None
-    stats_today = compute_day_stats(today, events) if events else None
+    last_event = get_timeline(site).last()
+    current_status = last_event[1] if last_event else None
+    stats_today = history["stats_today"]
 
     if stats_today:
         on_str = format_duration_ua(stats_today["on_seconds"])
@@ -193,7 +263,7 @@ def index():
         on_str = off_str = ""
         avail_pct = None
 
-    hourly = compute_day_hourly_online(today, events) if events else None
+    hourly = stats_today["hourly_online"] if stats_today else None
     if hourly:
         hourly_pct = [round(sec * 100 / 3600, 1) for sec in hourly]
     else:
@@ -201,60 +271,6 @@ def index():
 
     labels = [f"{h:02d}:00" for h in range(24)]
 
-    days_param = request.args.get("days", "1")
-    try:
-        days_window = int(days_param)
-    except ValueError:
-        days_window = 1
-    days_window = max(1, min(days_window, 30))
-
-    history_days = []
-    now_ts = int(time.time())
-
-    for i in range(days_window):
-        day = today - timedelta(days=i)
-        stats_day = compute_day_stats(day, events)
-
-        entry = {
-            "date_str": day.strftime("%d.%m.%Y"),
-            "weekday": DAY_NAMES_SHORT[day.weekday()],
-            "has_data": bool(stats_day),
-            "on_str": "",
-            "off_str": "",
-            "outages": [],
-        }
-
-        if stats_day:
-            entry["on_str"] = format_duration_ua(stats_day["on_seconds"])
-            entry["off_str"] = format_duration_ua(stats_day["off_seconds"])
-            outages_list = []
-            for start_ts, end_ts in stats_day["outages"]:
-                if end_ts is None:
-                    if day == today:
-                        end_ts_eff = now_ts
-                        is_open = True
-                    else:
-                        end_ts_eff = stats_day["day_end_ts"]
-                        is_open = False
-                else:
-                    end_ts_eff = end_ts
-                    is_open = False
-
-                start_dt = datetime.fromtimestamp(start_ts)
-                end_dt = datetime.fromtimestamp(end_ts_eff)
-                duration = max(0, end_ts_eff - start_ts)
-                outages_list.append(
-                    {
-                        "start_str": start_dt.strftime("%d.%m %H:%M"),
-                        "end_str": "триває" if is_open else end_dt.strftime("%d.%m %H:%M"),
-                        "duration_str": format_duration_ua(duration),
-                        "is_open": is_open,
-                    }
-                )
-            entry["outages"] = outages_list
-
-        history_days.append(entry)
-
     return render_template(
         "index.html",
         now_str=now_str,
@@ -265,75 +281,24 @@ def index():
         avail_pct=avail_pct,
         hourly_pct=hourly_pct,
         labels=labels,
-        history_days=history_days,
+        history_days=history["history_days"],
         days_window=days_window,
+        history_max_days=settings.HISTORY_MAX_DAYS,
         web_base_url=settings.WEB_BASE_URL,
+        site=site,
+        sites=known_sites(),
     )
 
 
 @flask_app.route("/history-data")
+@cached_response
 def history_data():
-    events = load_all_events()
-    today = date.today()
-
-    days_param = request.args.get("days", "1")
-    try:
-        days_window = int(days_param)
-    except ValueError:
-        days_window = 1
-    days_window = max(1, min(days_window, 30))
-
-    history_days = []
-    now_ts = int(time.time())
-
-    for i in range(days_window):
-        day = today - timedelta(days=i)
-        stats_day = compute_day_stats(day, events)
-
-        entry = {
-            "date_str": day.strftime("%d.%m.%Y"),
-            "weekday": DAY_NAMES_SHORT[day.weekday()],
-            "has_data": bool(stats_day),
-            "on_str": "",
-            "off_str": "",
-            "outages": [],
-        }
-
-        if stats_day:
-            entry["on_str"] = format_duration_ua(stats_day["on_seconds"])
-            entry["off_str"] = format_duration_ua(stats_day["off_seconds"])
-
-            outages_list = []
-            for start_ts, end_ts in stats_day["outages"]:
-                if end_ts is None:
-                    if day == today:
-                        end_ts_eff = now_ts
-                        is_open = True
-                    else:
-                        end_ts_eff = stats_day["day_end_ts"]
-                        is_open = False
-                else:
-                    end_ts_eff = end_ts
-                    is_open = False
-
-                start_dt = datetime.fromtimestamp(start_ts)
-                end_dt = datetime.fromtimestamp(end_ts_eff)
-                duration = max(0, end_ts_eff - start_ts)
-
-                outages_list.append(
-                    {
-                        "start_str": start_dt.strftime("%d.%м %H:%M").replace("%м", "%m"),
-                        "end_str": "триває" if is_open else end_dt.strftime("%d.%m %H:%M"),
-                        "duration_str": format_duration_ua(duration),
-                        "is_open": is_open,
-                    }
-                )
-
-            entry["outages"] = outages_list
-
-        history_days.append(entry)
-
-    return jsonify({"history_days": history_days, "days_window": days_window})
+    days_window = _parse_days_window()
+    site = _parse_site()
+    history = build_history(site, days_window)
+    return jsonify(
+        {"history_days": history["history_days"], "days_window": days_window, "site": site}
+    )
 
 
 def run_flask() -> None:
@@ -1,53 +1,133 @@
 import json
 import logging
 import os
+import threading
 from datetime import date
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 
 from powerbot.config.config import settings
 
 
-def load_yasno_state() -> dict:
+# все опросы (по одному потоку на region/dso) пишут в один файл
+_state_lock = threading.Lock()
+
+
+def target_key(region_id: int, dso_id: int) -> str:
+    return f"{region_id}:{dso_id}"
+
+
+def parse_target(value) -> Optional[Tuple[int, int]]:
     """
-    Читаем локальный кэш графика YASNO.
+    "25:902" -> (25, 902), если пара есть в YASNO_TARGETS; иначе None.
+    """
+    if value is None:
+        return None
+    region, _, dso = str(value).strip().partition(":")
+    try:
+        target = (int(region), int(dso))
+    except ValueError:
+        return None
+    return target if target in settings.YASNO_TARGETS else None
+
 
-    Формат v2:
+def _read_state_file() -> Dict[str, Any]:
+    """
+    Весь yasno_state.json в формате v4:
     {
-      "days": {
-        "2025-11-29": {
-          "slots": [
-            {"start_ts": ..., "end_ts": ..., "status": "ScheduleApplies", "title": "..."},
+      "targets": {
+        "25:902": {
+          "groups": {
+            "1.1": {
+              "days": {
+                "2025-11-29": {
+                  "slots": [
+                    {"start_ts": ..., "end_ts": ..., "status": "ScheduleApplies", "title": "..."},
+                    ...
+                  ],
+                  "updated_at": 1234567890
+                },
+                ...
+              }
+            },
             ...
-          ],
-          "updated_at": 1234567890
+          },
+          "last_check_ts": 1234567890,
+          "content_hash": "sha256 ответа YASNO",
+          "content_day": "2025-11-29"
         },
         ...
-      },
-      "last_check_ts": 1234567890
+      }
     }
+    Ключ цели — "region_id:dso_id", внутри — группы и даты.
+
+    Форматы v2/v3 (одна пара region/dso в корне файла) относятся к
+    YASNO_REGION_ID/YASNO_DSO_ID и переносятся в "targets" при чтении.
     """
     path = settings.YASNO_STATE_FILE
     if not os.path.exists(path):
-        return {"days": {}}
+        return {"targets": {}}
     try:
         with open(path, "r", encoding="utf-8") as f:
             data = json.load(f)
-
-        if not isinstance(data, dict):
-            return {"days": {}}
-        if "days" not in data:
-            return {"days": {}}
-        return data
     except Exception:
         logging.exception("Не вдалося прочитати %s", path)
-        return {"days": {}}
+        return {"targets": {}}
+
+    if not isinstance(data, dict):
+        return {"targets": {}}
+    if "targets" in data:
+        return data
+    if ("days" in data or "groups" in data) and settings.YASNO_REGION_ID and settings.YASNO_DSO_ID:
+        key = target_key(settings.YASNO_REGION_ID, settings.YASNO_DSO_ID)
+        return {"targets": {key: data}}
+    return {"targets": {}}
 
 
-def save_yasno_state(state: dict) -> None:
+def load_yasno_state(region_id: int, dso_id: int) -> dict:
+    """
+    Локальный кэш графика YASNO для одной пары region/dso:
+    {"groups": {...}, "last_check_ts": ..., "content_hash": ..., "content_day": ...}
+
+    last_check_ts — последний опрос, в котором ответ YASNO изменился
+    (одинаковые ответы watchdog пропускает, не трогая файл).
+    Формат v2 хранил одну группу в "days" — см. group_days().
+    """
+    with _state_lock:
+        state = _read_state_file()["targets"].get(target_key(region_id, dso_id))
+    if not isinstance(state, dict):
+        return {"groups": {}}
+    return state
+
+
+def group_days(state: dict, group: str) -> Dict[str, Any]:
+    """
+    Словарь дней для группы внутри state (создаётся при необходимости).
+
+    Старый формат v2 ("days" без групп) относится к YASNO_GROUP —
+    при первом обращении переносим его в "groups".
+    """
+    groups = state.setdefault("groups", {})
+    legacy = state.pop("days", None)
+    if legacy is not None and settings.YASNO_GROUP and settings.YASNO_GROUP not in groups:
+        groups[settings.YASNO_GROUP] = {"days": legacy}
+    return groups.setdefault(group, {}).setdefault("days", {})
+
+
+def save_yasno_state(region_id: int, dso_id: int, state: dict) -> None:
+    """
+    Записать состояние одной пары region/dso, не трогая остальные.
+    Файл пишется через временный и os.replace — читатели не увидят
+    его недописанным.
+    """
     path = settings.YASNO_STATE_FILE
+    tmp_path = f"{path}.tmp"
     try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(state, f, ensure_ascii=False, indent=2)
+        with _state_lock:
+            data = _read_state_file()
+            data["targets"][target_key(region_id, dso_id)] = state
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
     except Exception:
         logging.exception("Не вдалося записати %s", path)
 
@@ -1,6 +1,12 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import logging
+import threading
+import time
 from collections import defaultdict
+from concurrent.futures import Future
 from datetime import datetime, timedelta
 from enum import StrEnum
 from typing import Optional
@@ -8,6 +14,9 @@ from typing import Optional
 import requests
 from pydantic import BaseModel, TypeAdapter
 
+from powerbot.config.config import settings
+from powerbot.yasno.cache.cache import group_days, load_yasno_state
+
 
 
 class Group(StrEnum):
@@ -111,11 +120,70 @@ class YasnoBlackout:
 
     _DAY_TA = TypeAdapter(Day)
 
-    def _get(self, *path, **params):
+    def __init__(self) -> None:
+        # keep-alive между опросами
+        self._session = requests.Session()
+        self._lock = threading.Lock()
+        # url -> (ETag, Last-Modified) последнего ответа 200
+        self._validators: dict[str, tuple[Optional[str], Optional[str]]] = {}
+        # url -> (sha256 тела, разобранный результат)
+        self._parsed: dict[str, tuple[str, dict[Group, list[Slot]]]] = {}
+
+    def _get_raw(self, *path, conditional: bool = True) -> tuple[str, Optional[bytes]]:
+        """
+        GET с If-None-Match / If-Modified-Since (если сервер их отдавал).
+        Возвращает (url, тело) или (url, None) на 304 Not Modified.
+        """
         url = "/".join(map(str, (self.URL, *path)))
-        resp = requests.get(url=url, params=params, timeout=10)
+        headers = {}
+        if conditional:
+            with self._lock:
+                etag, last_modified = self._validators.get(url, (None, None))
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        resp = self._session.get(url=url, headers=headers, timeout=10)
+        if resp.status_code == 304:
+            return url, None
         resp.raise_for_status()
-        return resp.json()
+
+        with self._lock:
+            self._validators[url] = (resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+        return url, resp.content
+
+    def planned_outages_with_hash(
+        self,
+        region_id: int,
+        dso_id: int,
+    ) -> tuple[dict[Group, list[Slot]], str]:
+        """
+        То же, что planned_outages, плюс sha256 тела ответа.
+
+        На 304 или если тело побайтно совпало с прошлым — возвращаем
+        прошлый разобранный результат без json/pydantic и склейки слотов.
+        """
+        path = ("regions", region_id, "dsos", dso_id, "planned-outages")
+        url, body = self._get_raw(*path)
+
+        with self._lock:
+            cached = self._parsed.get(url)
+
+        if body is None:
+            if cached is not None:
+                return cached[1], cached[0]
+            # 304, а разобранного ответа нет (не должно случаться) — без условий
+            url, body = self._get_raw(*path, conditional=False)
+
+        digest = hashlib.sha256(body).hexdigest()
+        if cached is not None and cached[0] == digest:
+            return cached[1], digest
+
+        groups = self._parse_planned_outages(json.loads(body))
+        with self._lock:
+            self._parsed[url] = (digest, groups)
+        return groups, digest
 
     def planned_outages(self, region_id: int, dso_id: int) -> dict[Group, list[Slot]]:
         """
@@ -123,8 +191,9 @@ class YasnoBlackout:
             { Group('1.1'): [Slot, Slot, ...], Group('1.2'): [...], ... }
         с уже объединёнными слотами по дням.
         """
-        result = self._get("regions", region_id, "dsos", dso_id, "planned-outages")
+        return self.planned_outages_with_hash(region_id, dso_id)[0]
 
+    def _parse_planned_outages(self, result: dict) -> dict[Group, list[Slot]]:
         groups: dict[Group, list[Slot]] = defaultdict(list)
 
         for group_id, day_data in result.items():
@@ -161,9 +230,259 @@ class YasnoBlackout:
         return dict(groups)
 
 
+class ScheduleSnapshot:
+    """
+    Один разобранный ответ planned-outages для (region, dso).
+
+    Отвечает на вопросы «что сегодня/завтра» и «когда включат» для любой
+    группы без повторных запросов к API: watchdog, /status и вебхук
+    берут один снимок и спрашивают у него всё, что нужно.
+    """
+
+    def __init__(
+        self,
+        outages: dict[Group, list[Slot]],
+        fetched_ts: int,
+        content_hash: Optional[str] = None,
+    ) -> None:
+        self.outages = outages
+        self.fetched_ts = fetched_ts
+        # sha256 тела ответа YASNO: одинаковый хэш — тот же график
+        self.content_hash = content_hash
+
+    def group_slots(self, group_str: str) -> list[Slot]:
+        try:
+            group_enum = Group(group_str)
+        except Exception:
+            return []
+        return self.outages.get(group_enum) or []
+
+    def slots_for_day(self, group_str: str, now_ts: int, day_offset: int) -> list[Slot]:
+        """
+        Слоты группы на день с заданным сдвигом:
+          day_offset = 0 -> сьогодні
+          day_offset = 1 -> завтра
+          day_offset = 2 -> післязавтра и т.д.
+        """
+        base_date = datetime.fromtimestamp(now_ts).date()
+        target_date = base_date + timedelta(days=day_offset)
+
+        # В графіку кожен слот прив'язаний до конкретної дати,
+        # тож просто фільтруємо по даті початку.
+        day_slots = [s for s in self.group_slots(group_str) if s.dt_start.date() == target_date]
+
+        # На всякий случай отсортируем по времени.
+        day_slots.sort(key=lambda s: s.dt_start)
+        return day_slots
+
+    def today_slots(self, group_str: str, now_ts: int) -> list[Slot]:
+        return self.slots_for_day(group_str, now_ts, 0)
+
+    def tomorrow_slots(self, group_str: str, now_ts: int) -> list[Slot]:
+        return self.slots_for_day(group_str, now_ts, 1)
+
+    def predict_on_time(
+        self,
+        group_str: str,
+        now_ts: int,
+    ) -> Optional[tuple[datetime, DayStatus]]:
+        """
+        (ориентировочное_время_включения_или_зміни, статус_дня)
+        или None, если сейчас не в запланированном/екстренном окне.
+        """
+        now_dt = datetime.fromtimestamp(now_ts)  # локальний час
+
+        for slot in self.group_slots(group_str):
+            start = slot.dt_start.replace(tzinfo=None)
+            end = slot.dt_end.replace(tzinfo=None)
+            if start <= now_dt < end:
+                return end, slot.day_status
+
+        return None
+
+
 yasno_client = YasnoBlackout()
 
 
+def _snapshot_from_state_file(region_id: int, dso_id: int) -> Optional[ScheduleSnapshot]:
+    """
+    Последние графики, сохранённые watchdog'ом в yasno_state.json.
+    Там лежат только пары region/dso из YASNO_TARGETS.
+    """
+    state = load_yasno_state(region_id, dso_id)
+    group_names = list((state.get("groups") or {}).keys())
+    if "days" in state and settings.YASNO_GROUP:
+        group_names.append(settings.YASNO_GROUP)
+
+    outages: dict[Group, list[Slot]] = {}
+    for name in group_names:
+        try:
+            group_enum = Group(name)
+        except ValueError:
+            continue
+
+        slots: list[Slot] = []
+        for _, day in sorted(group_days(state, name).items()):
+            for item in day.get("slots") or []:
+                if item.get("start_ts") is None or item.get("end_ts") is None:
+                    continue
+                try:
+                    day_status = DayStatus(item["status"]) if item.get("status") else None
+                except ValueError:
+                    day_status = None
+                slots.append(
+                    Slot(
+                        start=0,
+                        end=0,
+                        date_start=datetime.fromtimestamp(item["start_ts"]),
+                        date_end=datetime.fromtimestamp(item["end_ts"]),
+                        day_status=day_status,
+                    )
+                )
+        if slots:
+            outages[group_enum] = slots
+
+    if not outages:
+        return None
+    return ScheduleSnapshot(outages, fetched_ts=int(state.get("last_check_ts") or 0))
+
+
+class _CacheEntry:
+    __slots__ = ("snapshot", "fetched_at")
+
+    def __init__(self, snapshot: ScheduleSnapshot, fetched_at: float) -> None:
+        self.snapshot = snapshot
+        self.fetched_at = fetched_at
+
+
+class ScheduleCache:
+    """
+    Общий кэш снимков графика по (region_id, dso_id).
+
+    - моложе ttl — отдаём без запроса;
+    - старше ttl, но моложе stale_ttl — отдаём сразу, а в фоне
+      обновляем (stale-while-revalidate);
+    - старше stale_ttl или нет вовсе — ждём запрос.
+    Одновременные запросы одного ключа склеиваются в один (single-flight).
+    Если YASNO недоступен — отдаём что есть: старый снимок или
+    yasno_state.json.
+    """
+
+    def __init__(self, fetch, ttl: float, stale_ttl: float) -> None:
+        self._fetch = fetch
+        self.ttl = ttl
+        self.stale_ttl = max(ttl, stale_ttl)
+        self._lock = threading.Lock()
+        self._entries: dict[tuple[int, int], _CacheEntry] = {}
+        self._inflight: dict[tuple[int, int], Future] = {}
+
+    def get(self, region_id: int, dso_id: int) -> ScheduleSnapshot:
+        key = (region_id, dso_id)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry.fetched_at
+            if age < self.ttl:
+                return entry.snapshot
+            if age < self.stale_ttl:
+                self._start_fetch(key, background=True)
+                return entry.snapshot
+        return self.refresh(region_id, dso_id)
+
+    def refresh(self, region_id: int, dso_id: int, fallback: bool = True) -> ScheduleSnapshot:
+        """
+        Запросить свежий снимок, дождаться результата.
+        fallback=False — ошибку YASNO не прятать за старым снимком
+        (watchdog'у она нужна для backoff).
+        """
+        key = (region_id, dso_id)
+        try:
+            return self._start_fetch(key).result()
+        except Exception:
+            if not fallback:
+                raise
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None:
+                logging.warning("YASNO недоступний, використовуємо графік з кешу")
+                return entry.snapshot
+            from_disk = _snapshot_from_state_file(region_id, dso_id)
+            if from_disk is not None:
+                logging.warning("YASNO недоступний, використовуємо графік з yasno_state.json")
+                return from_disk
+            raise
+
+    def _start_fetch(self, key: tuple[int, int], background: bool = False) -> Future:
+        with self._lock:
+            fut = self._inflight.get(key)
+            if fut is not None:
+                return fut
+            fut = Future()
+            self._inflight[key] = fut
+
+        if background:
+            threading.Thread(
+                target=self._do_fetch,
+                args=(key, fut),
+                name="yasno-revalidate",
+                daemon=True,
+            ).start()
+        else:
+            self._do_fetch(key, fut)
+        return fut
+
+    def _do_fetch(self, key: tuple[int, int], fut: Future) -> None:
+        try:
+            snapshot = self._fetch(*key)
+        except Exception as e:
+            if fut.set_running_or_notify_cancel():
+                fut.set_exception(e)
+        else:
+            with self._lock:
+                self._entries[key] = _CacheEntry(snapshot, time.monotonic())
+            if fut.set_running_or_notify_cancel():
+                fut.set_result(snapshot)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+# не больше YASNO_POLL_CONCURRENCY одновременных запросов к YASNO —
+# и от watchdog'а, и от команд бота
+_fetch_slots = threading.BoundedSemaphore(max(1, settings.YASNO_POLL_CONCURRENCY))
+
+
+def _fetch_schedule(region_id: int, dso_id: int) -> ScheduleSnapshot:
+    with _fetch_slots:
+        outages, digest = yasno_client.planned_outages_with_hash(
+            region_id=region_id, dso_id=dso_id
+        )
+    return ScheduleSnapshot(outages, fetched_ts=int(time.time()), content_hash=digest)
+
+
+yasno_schedule_cache = ScheduleCache(
+    fetch=_fetch_schedule,
+    ttl=settings.YASNO_CACHE_TTL,
+    stale_ttl=settings.YASNO_CACHE_STALE_TTL,
+)
+
+
+def yasno_schedule(region_id: int, dso_id: int) -> ScheduleSnapshot:
+    """
+    Снимок графика для всех групп — из общего кэша (см. ScheduleCache).
+    Если нет ни ответа YASNO, ни сохранённого графика — исключение.
+    """
+    return yasno_schedule_cache.get(region_id, dso_id)
+
+
+def yasno_refresh_schedule(region_id: int, dso_id: int) -> ScheduleSnapshot:
+    """
+    Принудительно обновить кэш (для watchdog'а).
+    Ошибка запроса пробрасывается, а не подменяется старым снимком.
+    """
+    return yasno_schedule_cache.refresh(region_id, dso_id, fallback=False)
+
+
 def yasno_predict_on_time(
     now_ts: int,
     region_id: int,
@@ -177,32 +496,12 @@ def yasno_predict_on_time(
     Если сейчас не в запланированном/екстренном окне – вернёт None.
     """
     try:
-        outages = yasno_client.planned_outages(region_id=region_id, dso_id=dso_id)
+        snapshot = yasno_schedule(region_id=region_id, dso_id=dso_id)
     except Exception:
         # тут можно залогировать, но не валиться
         return None
 
-    if not outages:
-        return None
-
-    try:
-        group_enum = Group(group_str)
-    except Exception:
-        return None
-
-    slots = outages.get(group_enum) or []
-    if not slots:
-        return None
-
-    now_dt = datetime.fromtimestamp(now_ts)  # локальний час
-
-    for slot in slots:
-        start = slot.dt_start.replace(tzinfo=None)
-        end = slot.dt_end.replace(tzinfo=None)
-        if start <= now_dt < end:
-            return end, slot.day_status
-
-    return None
+    return snapshot.predict_on_time(group_str, now_ts)
 
 
 # ---------- УНИВЕРСАЛЬНЫЙ ХЕЛПЕР НА ЛЮБОЙ ДЕНЬ ----------
@@ -215,31 +514,15 @@ def yasno_slots_for_day(
     day_offset: int,
 ) -> list[Slot]:
     """
-    Возвращает слоты для группы на день с заданным сдвигом:
-      day_offset = 0 -> сьогодні
-      day_offset = 1 -> завтра
-      day_offset = 2 -> післязавтра и т.д.
+    Возвращает слоты для группы на день с заданным сдвигом
+    (см. ScheduleSnapshot.slots_for_day). При ошибке запроса — [].
     """
     try:
-        outages = yasno_client.planned_outages(region_id=region_id, dso_id=dso_id)
-        group_enum = Group(group_str)
+        snapshot = yasno_schedule(region_id=region_id, dso_id=dso_id)
     except Exception:
         return []
 
-    slots = outages.get(group_enum) or []
-    if not slots:
-        return []
-
-    base_date = datetime.fromtimestamp(now_ts).date()
-    target_date = base_date + timedelta(days=day_offset)
-
-    # В графіку кожен слот прив'язаний до конкретної дати,
-    # тож просто фільтруємо по даті початку.
-    day_slots = [s for s in slots if s.dt_start.date() == target_date]
-
-    # На всякий случай отсортируем по времени.
-    day_slots.sort(key=lambda s: s.dt_start)
-    return day_slots
+    return snapshot.slots_for_day(group_str, now_ts, day_offset)
 
 
 def yasno_today_slots(
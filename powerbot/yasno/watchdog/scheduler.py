@@ -0,0 +1,104 @@
+import logging
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+@dataclass(eq=False)
+class PollTarget:
+    """
+    Одна пара region/dso, которую опрашивает watchdog.
+    """
+
+    region_id: int
+    dso_id: int
+    # основная пара (YASNO_REGION_ID/YASNO_DSO_ID): к группам её подписчиков
+    # добавляется YASNO_GROUP (рассылки идут по всем парам)
+    primary: bool = False
+    # time.monotonic() следующего опроса
+    next_run: float = 0.0
+    # ошибок подряд (для backoff)
+    failures: int = 0
+    # (хэш ответа YASNO, дата) последнего обработанного опроса
+    last_seen: Tuple[Optional[str], Optional[str]] = (None, None)
+
+
+class YasnoPollScheduler:
+    """
+    Опрос нескольких пар region/dso из одного потока-планировщика.
+
+    - у каждой цели свой таймер: interval ± jitter, чтобы опросы
+      не сбивались в одну секунду;
+    - после ошибки цель откладывается на interval·2^n (но не дольше
+      backoff_max), остальные цели опрашиваются как обычно;
+    - одновременно выполняется не больше concurrency опросов.
+    """
+
+    def __init__(
+        self,
+        targets: List[PollTarget],
+        poll: Callable[[PollTarget], None],
+        interval: float,
+        jitter: float,
+        concurrency: int,
+        backoff_max: float,
+    ) -> None:
+        self.targets = targets
+        self._poll = poll
+        self.interval = interval
+        self.jitter = max(0.0, min(jitter, 1.0))
+        self.concurrency = max(1, concurrency)
+        self.backoff_max = max(interval, backoff_max)
+
+    def _jittered(self, delay: float) -> float:
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def backoff_delay(self, failures: int) -> float:
+        return min(self.backoff_max, self.interval * (2 ** max(0, failures)))
+
+    def _finish(self, target: PollTarget, fut: Future) -> None:
+        now = time.monotonic()
+        try:
+            fut.result()
+        except Exception:
+            target.failures += 1
+            delay = self._jittered(self.backoff_delay(target.failures))
+            logging.exception(
+                "Помилка опитування YASNO (region_id=%s, dso_id=%s), спроба %s, наступна через %.0f сек",
+                target.region_id,
+                target.dso_id,
+                target.failures,
+                delay,
+            )
+        else:
+            target.failures = 0
+            delay = self._jittered(self.interval)
+        target.next_run = now + delay
+
+    def run(self) -> None:
+        with ThreadPoolExecutor(
+            max_workers=self.concurrency,
+            thread_name_prefix="yasno-poll",
+        ) as pool:
+            running: Dict[Future, PollTarget] = {}
+            while True:
+                now = time.monotonic()
+                busy = set(running.values())
+                for target in self.targets:
+                    if target not in busy and target.next_run <= now:
+                        running[pool.submit(self._poll, target)] = target
+                        busy.add(target)
+
+                # до ближайшего таймера свободной цели (или до конца опроса)
+                idle = [t.next_run for t in self.targets if t not in busy]
+                timeout = max(0.0, min(idle) - now) if idle else None
+
+                if not running:
+                    time.sleep(timeout)
+                    continue
+
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    self._finish(running.pop(fut), fut)
@@ -1,206 +1,214 @@
 import logging
 import time
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from typing import NamedTuple
 
 from powerbot.config.config import settings
-from powerbot.lang.i18n import get_lang_for_chat, t
+from powerbot.lang.i18n import t
 from powerbot.yasno.cache.cache import (
+    group_days,
     load_yasno_state,
     save_yasno_state,
+    target_key,
     update_day_schedule,
 )
-from powerbot.storage.subscribers import load_subscribers
-from powerbot.telegram.client import send_telegram_message_limited
+from powerbot.storage.registry import subscriber_registry
+from powerbot.services.fanout import plan_fanout
+from powerbot.telegram.outbox import queue_fanout
+from powerbot.yasno.watchdog.scheduler import PollTarget, YasnoPollScheduler
 from powerbot.yasno.client import (
-    yasno_today_slots,
-    yasno_tomorrow_slots,
+    yasno_refresh_schedule,
     DayStatus,
+    Slot,
 )
 
 
+class GroupUpdate(NamedTuple):
+    group: str
+    today: date
+    slots_today: list[Slot]
+    changed_today: bool
+    slots_tomorrow: list[Slot]
+    changed_tomorrow: bool
+
+
+def _slot_lines(lang: str, slots: list[Slot]) -> list[str]:
+    lines: list[str] = []
+    for s in slots:
+        start_str = s.dt_start.strftime("%H:%M")
+        end_str = s.dt_end.strftime("%H:%M")
+
+        if s.day_status == DayStatus.EMERGENCY_SHUTDOWNS:
+            prefix = "🚨"
+        elif s.day_status == DayStatus.SCHEDULE_APPLIES:
+            prefix = "⚡"
+        else:
+            prefix = "•"
+
+        lines.append(
+            t(
+                "yasno.watch.slot.line",
+                lang=lang,
+                prefix=prefix,
+                start=start_str,
+                end=end_str,
+                title=s.title,
+            )
+        )
+    return lines
+
+
+def render_group_update(lang: str, update: GroupUpdate) -> str:
+    """
+    Текст сповіщення про зміну графіка однієї групи.
+    Порожній рядок — надсилати нічого.
+    """
+    today_str = update.today.strftime("%d.%m.%Y")
+    tomorrow_str = (update.today + timedelta(days=1)).strftime("%d.%m.%Y")
+    lines: list[str] = []
+
+    # --- блок "сьогодні" ---
+    if update.changed_today:
+        lines.append(t("yasno.watch.today.header", lang=lang, date=today_str))
+        lines.append(t("yasno.watch.group", lang=lang, group=update.group))
+        lines.append("")  # пустая строка
+
+        if update.slots_today:
+            lines.extend(_slot_lines(lang, update.slots_today))
+        else:
+            lines.append(t("yasno.watch.today.empty", lang=lang))
+
+    # --- блок "завтра" ---
+    if update.changed_tomorrow and update.slots_tomorrow:
+        if lines:
+            lines.append("")  # разделяем пустой строкой
+
+        lines.append(t("yasno.watch.tomorrow.header", lang=lang, date=tomorrow_str))
+        lines.append(t("yasno.watch.group", lang=lang, group=update.group))
+        lines.append("")
+        lines.extend(_slot_lines(lang, update.slots_tomorrow))
+
+    return "\n".join(lines)
+
+
+def poll_target(target: PollTarget) -> None:
+    """
+    Один опрос одной пары region/dso:
+    - тянет графік YASNO (один запит — всі групи),
+    - зберігає його по групах і датах у yasno_state.json,
+    - надсилає сповіщення ТІЛЬКИ підписникам цієї пари (/region) і тієї
+      групи, для якої графік на конкретну дату реально змінився.
+
+    Помилка запиту пробрасывается в планировщик (backoff), а не
+    выглядит как «график очистили».
+    """
+    now_ts = int(time.time())
+    today_date = datetime.fromtimestamp(now_ts).date()
+    tomorrow_date = today_date + timedelta(days=1)
+
+    # заодно обновляется общий кэш для команд бота и вебхука
+    schedule = yasno_refresh_schedule(region_id=target.region_id, dso_id=target.dso_id)
+
+    # храним все группы из ответа и группы подписчиков этой пары
+    key = target_key(target.region_id, target.dso_id)
+    groups = {group.value for group in schedule.outages}
+    groups.update(subscriber_registry.groups(target=key))
+    if target.primary and settings.YASNO_GROUP:
+        groups.add(settings.YASNO_GROUP)
+
+    # тот же ответ (304 или побайтно то же тело) в тот же день и тот же
+    # набор групп — ни пересчёта слотов, ни записи yasno_state.json,
+    # ни рассылки
+    seen = (schedule.content_hash, today_date.isoformat())
+    state = load_yasno_state(target.region_id, target.dso_id)
+    tracked = set((state.get("groups") or {}).keys())
+    if schedule.content_hash is not None and seen == target.last_seen and groups <= tracked:
+        return
+
+    updates: list[GroupUpdate] = []
+    for group in sorted(groups):
+        days = group_days(state, group)
+        slots_today = schedule.today_slots(group, now_ts)
+        slots_tomorrow = schedule.tomorrow_slots(group, now_ts)
+
+        changed_today = update_day_schedule(days, today_date, slots_today, now_ts)
+        changed_tomorrow = update_day_schedule(days, tomorrow_date, slots_tomorrow, now_ts)
+        # если график группы вообще не изменился — ничего не шлём
+        if changed_today or changed_tomorrow:
+            updates.append(
+                GroupUpdate(
+                    group=group,
+                    today=today_date,
+                    slots_today=slots_today,
+                    changed_today=changed_today,
+                    slots_tomorrow=slots_tomorrow,
+                    changed_tomorrow=changed_tomorrow,
+                )
+            )
+
+    state["last_check_ts"] = now_ts
+    state["content_hash"], state["content_day"] = seen
+    save_yasno_state(target.region_id, target.dso_id, state)
+    target.last_seen = seen
+
+    for update in updates:
+        # только чаты этой пары и этой группы; текст — один раз на язык
+        subscribers = subscriber_registry.snapshot(update.group, target=key)
+        if not subscribers:
+            continue
+        queue_fanout(
+            plan_fanout(
+                subscribers,
+                lambda lang, _group, update=update: render_group_update(lang, update),
+                with_read_button=True,
+            )
+        )
+
+
 def yasno_watchdog_worker():
     """
-    Фоновий потік:
-    - періодично тягне графік YASNO на сьогодні та на завтра,
-    - зберігає його по датах у yasno_state.json,
-    - надсилає сповіщення всім підписникам ТІЛЬКИ коли графік
-      для конкретної дати реально змінюється.
+    Фоновий потік: опитує всі пари region/dso з YASNO_TARGETS
+    (основна — YASNO_REGION_ID/YASNO_DSO_ID) через YasnoPollScheduler.
 
-    Тепер:
     - якщо оновився сьогодні й завтра — відправляємо ОДНЕ повідомлення,
       в якому є обидва блоки;
+    - кожен підписник може обрати свою пару region/dso (/region, за
+      замовчуванням основна) і групу (/group, за замовчуванням YASNO_GROUP);
     - текст локалізований по мові чату (uk/en);
     - у приватних чатах додається кнопка "Прочитано" з видаленням.
     """
-    if not (settings.YASNO_REGION_ID and settings.YASNO_DSO_ID and settings.YASNO_GROUP):
+    if not settings.YASNO_TARGETS:
         logging.info(
-            "YASNO watchdog вимкнено: не задані YASNO_REGION_ID / YASNO_DSO_ID / YASNO_GROUP"
+            "YASNO watchdog вимкнено: не задані YASNO_REGION_ID / YASNO_DSO_ID / YASNO_TARGETS"
         )
         return
 
+    primary = (settings.YASNO_REGION_ID, settings.YASNO_DSO_ID)
+    targets = []
+    for region_id, dso_id in settings.YASNO_TARGETS:
+        state = load_yasno_state(region_id, dso_id)
+        targets.append(
+            PollTarget(
+                region_id=region_id,
+                dso_id=dso_id,
+                primary=(region_id, dso_id) == primary,
+                last_seen=(state.get("content_hash"), state.get("content_day")),
+            )
+        )
+
     logging.info(
-        "YASNO watchdog запущено (region_id=%s, dso_id=%s, group=%s, interval=%s сек)",
-        settings.YASNO_REGION_ID,
-        settings.YASNO_DSO_ID,
+        "YASNO watchdog запущено (targets=%s, default group=%s, interval=%s сек, concurrency=%s)",
+        ", ".join(f"{t.region_id}:{t.dso_id}" for t in targets),
         settings.YASNO_GROUP,
         settings.YASNO_POLL_INTERVAL,
+        settings.YASNO_POLL_CONCURRENCY,
     )
 
-    while True:
-        try:
-            now_ts = int(time.time())
-            today_date = datetime.fromtimestamp(now_ts).date()
-            tomorrow_date = today_date + timedelta(days=1)
-
-            slots_today = yasno_today_slots(
-                now_ts=now_ts,
-                region_id=settings.YASNO_REGION_ID,
-                dso_id=settings.YASNO_DSO_ID,
-                group_str=settings.YASNO_GROUP,
-            )
-            slots_tomorrow = yasno_tomorrow_slots(
-                now_ts=now_ts,
-                region_id=settings.YASNO_REGION_ID,
-                dso_id=settings.YASNO_DSO_ID,
-                group_str=settings.YASNO_GROUP,
-            )
-
-            state = load_yasno_state()
-            days = state.get("days") or {}
-
-            changed_today = update_day_schedule(days, today_date, slots_today, now_ts)
-            changed_tomorrow = update_day_schedule(
-                days, tomorrow_date, slots_tomorrow, now_ts
-            )
-
-            state["days"] = days
-            state["last_check_ts"] = now_ts
-            save_yasno_state(state)
-
-            subscribers = load_subscribers()
-            if not subscribers:
-                time.sleep(settings.YASNO_POLL_INTERVAL)
-                continue
-
-            # если график вообще не изменился — ничего не шлём
-            if not changed_today and not changed_tomorrow:
-                time.sleep(settings.YASNO_POLL_INTERVAL)
-                continue
-
-            today_str = today_date.strftime("%d.%m.%Y")
-            tomorrow_str = tomorrow_date.strftime("%d.%m.%Y")
-
-            for sub in subscribers:
-                chat_id = sub.get("chat_id")
-                thread_id = sub.get("thread_id")
-                if chat_id is None:
-                    continue
-                chat_id = int(chat_id)
-
-                lang = get_lang_for_chat(chat_id, thread_id)
-
-                lines: list[str] = []
-
-                # --- блок "сьогодні" ---
-                if changed_today:
-                    lines.append(
-                        t(
-                            "yasno.watch.today.header",
-                            lang=lang,
-                            date=today_str,
-                        )
-                    )
-                    lines.append(
-                        t(
-                            "yasno.watch.group",
-                            lang=lang,
-                            group=settings.YASNO_GROUP,
-                        )
-                    )
-                    lines.append("")  # пустая строка
-
-                    if slots_today:
-                        for s in slots_today:
-                            start_str = s.dt_start.strftime("%H:%M")
-                            end_str = s.dt_end.strftime("%H:%M")
-
-                            if s.day_status == DayStatus.EMERGENCY_SHUTDOWNS:
-                                prefix = "🚨"
-                            elif s.day_status == DayStatus.SCHEDULE_APPLIES:
-                                prefix = "⚡"
-                            else:
-                                prefix = "•"
-
-                            lines.append(
-                                t(
-                                    "yasno.watch.slot.line",
-                                    lang=lang,
-                                    prefix=prefix,
-                                    start=start_str,
-                                    end=end_str,
-                                    title=s.title,
-                                )
-                            )
-                    else:
-                        lines.append(t("yasno.watch.today.empty", lang=lang))
-
-                # --- блок "завтра" ---
-                if changed_tomorrow and slots_tomorrow:
-                    if lines:
-                        lines.append("")  # разделяем пустой строкой
-
-                    lines.append(
-                        t(
-                            "yasno.watch.tomorrow.header",
-                            lang=lang,
-                            date=tomorrow_str,
-                        )
-                    )
-                    lines.append(
-                        t(
-                            "yasno.watch.group",
-                            lang=lang,
-                            group=settings.YASNO_GROUP,
-                        )
-                    )
-                    lines.append("")
-
-                    for s in slots_tomorrow:
-                        start_str = s.dt_start.strftime("%H:%M")
-                        end_str = s.dt_end.strftime("%H:%M")
-
-                        if s.day_status == DayStatus.EMERGENCY_SHUTDOWNS:
-                            prefix = "🚨"
-                        elif s.day_status == DayStatus.SCHEDULE_APPLIES:
-                            prefix = "⚡"
-                        else:
-                            prefix = "•"
-
-                        lines.append(
-                            t(
-                                "yasno.watch.slot.line",
-                                lang=lang,
-                                prefix=prefix,
-                                start=start_str,
-                                end=end_str,
-                                title=s.title,
-                            )
-                        )
-
-                if not lines:
-                    # на всякий случай
-                    continue
-
-                full_msg = "\n".join(lines)
-
-                send_telegram_message_limited(
-                    chat_id=chat_id,
-                    text=full_msg,
-                    thread_id=thread_id,
-                    with_read_button=True,
-                )
-
-        except Exception:
-            logging.exception("Помилка в потоці YASNO-watchdog")
-
-        time.sleep(settings.YASNO_POLL_INTERVAL)
+    YasnoPollScheduler(
+        targets=targets,
+        poll=poll_target,
+        interval=settings.YASNO_POLL_INTERVAL,
+        jitter=settings.YASNO_POLL_JITTER,
+        concurrency=settings.YASNO_POLL_CONCURRENCY,
+        backoff_max=settings.YASNO_POLL_BACKOFF_MAX,
+    ).run()
@@ -0,0 +1,31 @@
+"""
+Общие фикстуры: чистая SQLite-база во временной директории на тест.
+"""
+import os
+import tempfile
+
+# до импорта powerbot: настройки читаются из ENV один раз, и файлы
+# состояния не должны попасть в корень проекта
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="powerbot-tests-"))
+os.environ.setdefault("LANG_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "lang"))
+
+import pytest  # noqa: E402
+
+from powerbot.config.config import settings  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """
+    Пустая база (init_db) и пустые ленты событий в памяти.
+    """
+    from powerbot.storage import engine, timeline
+    from powerbot.storage.db import init_db
+
+    monkeypatch.setattr(settings, "DB_FILE", tmp_path / "power_events.db")
+    monkeypatch.setattr(settings, "STATE_FILE", tmp_path / "power_state.json")
+    monkeypatch.setattr(engine, "_pool", None)
+    monkeypatch.setattr(timeline, "_timelines", {})
+    init_db()
+    yield tmp_path
+    engine.close_pool()
@@ -0,0 +1,92 @@
+"""
+get_days_stats: закрытые дни не запоминаются по устаревшей ленте, если
+событие «из прошлого» пришло во время расчёта.
+"""
+from datetime import date, datetime, time as dtime
+
+import pytest
+
+from powerbot.services import daily_stats
+from powerbot.storage.db import log_power_event
+from powerbot.storage.rollup import load_rollups
+from powerbot.storage.timeline import _timeline_for_write, get_timeline, record_power_event
+
+SITE = "home"
+DAY = date(2025, 3, 10)
+
+
+def _ts(day: date, hour: int) -> int:
+    return int(datetime.combine(day, dtime(hour)).timestamp())
+
+
+NOW = _ts(date(2025, 3, 12), 12)
+
+
+@pytest.fixture
+def stats_env(db, monkeypatch):
+    monkeypatch.setattr(daily_stats, "_closed_days", {})
+    monkeypatch.setattr(daily_stats, "HAS_NUMPY", False)
+    record_power_event(True, _ts(DAY, 0), SITE)
+    record_power_event(False, _ts(DAY, 12), SITE)
+
+
+def _during_compute(monkeypatch, action):
+    """
+    action() выполняется между расчётом дней и их сохранением.
+    """
+    compute = daily_stats.compute_days_stats
+
+    def compute_then_act(days, events):
+        result = compute(days, events)
+        action()
+        return result
+
+    monkeypatch.setattr(daily_stats, "compute_days_stats", compute_then_act)
+
+
+def test_day_is_saved_when_timeline_unchanged(stats_env):
+    stats = daily_stats.get_days_stats([DAY], NOW, SITE)[DAY]
+
+    assert stats["on_seconds"] == 12 * 3600
+    assert load_rollups(SITE, [DAY]) == {DAY: stats}
+
+
+def test_backdated_extend_during_compute_is_not_saved(stats_env, monkeypatch):
+    compute = daily_stats.compute_days_stats
+    backdated = [(_ts(DAY, 6), False), (_ts(DAY, 9), True)]
+    _during_compute(monkeypatch, lambda: get_timeline(SITE).extend(backdated))
+
+    stale = daily_stats.get_days_stats([DAY], NOW, SITE)[DAY]
+    assert stale["on_seconds"] == 12 * 3600
+    assert load_rollups(SITE, [DAY]) == {}
+    assert not daily_stats._closed_days.get(SITE)
+
+    monkeypatch.setattr(daily_stats, "compute_days_stats", compute)
+    fresh = daily_stats.get_days_stats([DAY], NOW, SITE)[DAY]
+    assert fresh["on_seconds"] == 9 * 3600
+
+
+def test_save_between_db_insert_and_timeline_append_is_dropped(stats_env, monkeypatch):
+    # событие уже в БД (rollup инвалидирован), но ещё не в ленте
+    backdated = _ts(DAY, 6)
+    _during_compute(monkeypatch, lambda: log_power_event(False, backdated, SITE))
+
+    daily_stats.get_days_stats([DAY], NOW, SITE)
+    assert DAY in load_rollups(SITE, [DAY])
+
+    _timeline_for_write(SITE).append(backdated, False)
+
+    assert load_rollups(SITE, [DAY]) == {}
+    assert not daily_stats._closed_days.get(SITE)
+
+
+def test_event_forgets_only_its_own_site(stats_env):
+    daily_stats.get_days_stats([DAY], NOW, SITE)
+    record_power_event(True, _ts(DAY, 0), "other")
+    daily_stats.get_days_stats([DAY], NOW, "other")
+
+    record_power_event(False, _ts(DAY, 6), "other")
+
+    assert list(daily_stats._closed_days[SITE]) == [DAY]
+    assert daily_stats._closed_days["other"] == {}
+    assert DAY in load_rollups(SITE, [DAY])
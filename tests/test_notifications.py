@@ -0,0 +1,164 @@
+"""
+power_notifications: рассылка о смене статуса переживает падение процесса
+и сбои подготовки рассылки.
+"""
+import pytest
+
+from powerbot.config.config import settings
+from powerbot.services import power_status
+from powerbot.storage import timeline
+from powerbot.storage.engine import connection, transaction
+from powerbot.storage.notifications import load_pending_notifications
+from powerbot.storage.outbox import claim_due
+from powerbot.storage.registry import SubscriberRegistry
+from powerbot.storage.subscribers import apply_subscriber_changes
+
+SITE = "home"
+
+
+@pytest.fixture
+def subscribers(db, monkeypatch):
+    apply_subscriber_changes(
+        [(111, None, "a", None, SITE, None), (222, None, "b", None, SITE, None)],
+        [],
+    )
+    registry = SubscriberRegistry(
+        flush_delay=0.0,
+        default_group=None,
+        default_site=settings.DEFAULT_SITE,
+    )
+    registry.load()
+    monkeypatch.setattr(power_status, "subscriber_registry", registry)
+    return registry
+
+
+@pytest.fixture
+def crash_before_delivery(monkeypatch):
+    """
+    Процесс падает сразу после ответа вебхуку: фоновый проход не выполняется.
+    """
+    monkeypatch.setattr(power_status, "schedule_pending_notifications", lambda: None)
+
+
+def _boom(*args):
+    raise RuntimeError("render failed")
+
+
+def _queued():
+    """
+    [(attempts, отложено ли)] всех строк power_notifications.
+    """
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT attempts, next_attempt_ts > strftime('%s', 'now') "
+            "FROM power_notifications ORDER BY id"
+        ).fetchall()
+    return [(attempts, bool(delayed)) for attempts, delayed in rows]
+
+
+def _make_due():
+    with transaction() as conn:
+        conn.execute("UPDATE power_notifications SET next_attempt_ts = 0")
+
+
+def _outbox():
+    return sorted((item.chat_id, item.text.splitlines()[0]) for item in claim_due(100))
+
+
+def _restart(monkeypatch):
+    monkeypatch.setattr(timeline, "_timelines", {})
+    timeline.load_timeline()
+
+
+def test_pending_notification_is_delivered_after_restart(
+    subscribers, crash_before_delivery, monkeypatch
+):
+    power_status.apply_status_change(False, 1000, SITE)
+    assert power_status.apply_status_change(True, 1600, SITE) == "applied"
+
+    pending = load_pending_notifications()
+    assert [(n.site, n.is_online, n.ts, n.outage_seconds) for n in pending] == [
+        (SITE, True, 1600, 600)
+    ]
+    assert _outbox() == []
+
+    _restart(monkeypatch)
+    assert power_status.deliver_pending_notifications() == 1
+
+    assert load_pending_notifications() == []
+    assert [chat_id for chat_id, _ in _outbox()] == [111, 222]
+
+
+def test_batch_notification_is_delivered_after_restart(
+    subscribers, crash_before_delivery, monkeypatch
+):
+    power_status.apply_status_change(True, 1000, SITE)
+    result = power_status.apply_status_batch([(SITE, 1500, False), (SITE, 1200, True)])
+    assert result["notified_sites"] == [SITE]
+
+    _restart(monkeypatch)
+    assert power_status.deliver_pending_notifications() == 1
+    assert len(_outbox()) == 2
+
+
+def test_failed_notification_is_retried_with_backoff(
+    subscribers, crash_before_delivery, monkeypatch
+):
+    power_status.apply_status_change(True, 1000, SITE)
+    power_status.apply_status_change(False, 2000, SITE)
+
+    plan = power_status.plan_status_change
+    monkeypatch.setattr(power_status, "plan_status_change", _boom)
+    assert power_status.deliver_pending_notifications() == 0
+
+    # строка осталась, но следующая попытка — не раньше паузы
+    assert _queued() == [(1, True)]
+    assert power_status.deliver_pending_notifications() == 0
+    assert _queued() == [(1, True)]
+    assert _outbox() == []
+
+    _make_due()
+    assert power_status.deliver_pending_notifications() == 0
+    assert _queued() == [(2, True)]
+
+    _make_due()
+    monkeypatch.setattr(power_status, "plan_status_change", plan)
+    assert power_status.deliver_pending_notifications() == 1
+    assert load_pending_notifications() == []
+    assert len(_outbox()) == 2
+
+
+def test_stale_notification_is_dropped_after_newer_status(
+    subscribers, crash_before_delivery, monkeypatch
+):
+    power_status.apply_status_change(True, 1000, SITE)
+    power_status.apply_status_change(False, 2000, SITE)
+
+    plan = power_status.plan_status_change
+    monkeypatch.setattr(power_status, "plan_status_change", _boom)
+    power_status.deliver_pending_notifications()
+
+    # «світло з'явилось» разослано — отложенное «світло зникло» уже не нужно
+    monkeypatch.setattr(power_status, "plan_status_change", plan)
+    power_status.apply_status_change(True, 3000, SITE)
+    assert power_status.deliver_pending_notifications() == 1
+
+    assert _queued() == []
+    outbox = _outbox()
+    assert len(outbox) == 2
+    assert all(text.startswith("✅") for _, text in outbox)
+
+
+def test_notification_is_dropped_after_max_attempts(
+    subscribers, crash_before_delivery, monkeypatch
+):
+    monkeypatch.setattr(settings, "OUTBOX_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(power_status, "plan_status_change", _boom)
+    power_status.apply_status_change(True, 1000, SITE)
+    power_status.apply_status_change(False, 2000, SITE)
+
+    power_status.deliver_pending_notifications()
+    assert _queued() == [(1, True)]
+    _make_due()
+    power_status.deliver_pending_notifications()
+    assert _queued() == []
@@ -0,0 +1,20 @@
+"""
+apply_status_change: идемпотентность вебхука по площадкам.
+"""
+from powerbot.services.power_status import apply_status_change
+from powerbot.storage.db import load_all_events
+
+
+def test_same_key_on_two_sites_logs_both_events(db):
+    assert apply_status_change(True, 1000, "a", idempotency_key="1") == "initialized"
+    assert apply_status_change(True, 1000, "b", idempotency_key="1") == "initialized"
+
+    assert load_all_events("a") == [(1000, True)]
+    assert load_all_events("b") == [(1000, True)]
+
+
+def test_retry_on_same_site_is_duplicate(db):
+    assert apply_status_change(True, 1000, "a", idempotency_key="1") == "initialized"
+    assert apply_status_change(False, 1010, "a", idempotency_key="1") == "duplicate"
+
+    assert load_all_events("a") == [(1000, True)]
@@ -0,0 +1,46 @@
+"""
+SubscriberRegistry: пара YASNO чата, которую убрали из YASNO_TARGETS.
+"""
+import pytest
+
+from powerbot.config.config import settings
+from powerbot.storage.registry import SubscriberRegistry
+from powerbot.storage.subscribers import apply_subscriber_changes
+
+
+@pytest.fixture
+def registry(db, monkeypatch):
+    monkeypatch.setattr(settings, "YASNO_TARGETS", [(25, 902), (3, 301)])
+    apply_subscriber_changes(
+        [
+            (1, None, "primary", "1.1", None, None),
+            (2, None, "second", "2.1", None, "3:301"),
+            (3, None, "removed", "3.1", None, "7:700"),
+        ],
+        [],
+    )
+    registry = SubscriberRegistry(
+        flush_delay=0.0,
+        default_group=None,
+        default_site=settings.DEFAULT_SITE,
+        default_target="25:902",
+    )
+    registry.load()
+    return registry
+
+
+def _chats(subs):
+    return sorted(sub["chat_id"] for sub in subs)
+
+
+def test_configured_targets_are_indexed(registry):
+    assert _chats(registry.snapshot(target="3:301")) == [2]
+    assert registry.groups(target="3:301") == ["2.1"]
+    assert registry.target_of(2, None) == "3:301"
+
+
+def test_removed_target_falls_back_to_primary(registry):
+    assert _chats(registry.snapshot(target="25:902")) == [1, 3]
+    assert registry.snapshot(target="7:700") == ()
+    assert registry.groups(target="25:902") == ["1.1", "3.1"]
+    assert registry.target_of(3, None) == "25:902"
@@ -0,0 +1,174 @@
+"""
+Эквивалентность domain.stats (bisect) и EventTimeline со старыми
+реализациями из tests/legacy_stats.py на случайных лентах событий:
+повторяющиеся метки времени, события до/после суток, 25-часовой день.
+"""
+import os
+import random
+import time
+from datetime import date, datetime, time as dtime, timedelta
+
+import pytest
+
+from powerbot.domain import stats
+from powerbot.domain.stats_np import HAS_NUMPY, compute_days_stats_np
+from powerbot.domain.timeline import EventTimeline
+from tests import legacy_stats
+
+RUNS = 400
+
+# 26.10.2025 в Киеве часы переводятся назад — в сутках 25 часов
+DST_DAY = date(2025, 10, 26)
+DAYS = [date(2025, 10, 24), date(2025, 10, 25), DST_DAY, date(2025, 10, 27)]
+
+
+@pytest.fixture(autouse=True)
+def kyiv_tz():
+    old_tz = os.environ.get("TZ")
+    os.environ["TZ"] = "Europe/Kyiv"
+    time.tzset()
+    yield
+    if old_tz is None:
+        os.environ.pop("TZ", None)
+    else:
+        os.environ["TZ"] = old_tz
+    time.tzset()
+
+
+def _day_bounds(day: date):
+    start = datetime.combine(day, dtime.min)
+    return int(start.timestamp()), int((start + timedelta(days=1)).timestamp())
+
+
+def random_events(rng: random.Random, start_ts: int, end_ts: int):
+    """
+    Отсортированная лента: иногда пустая, с дублями ts, событиями на
+    границах суток/часов и подряд идущими одинаковыми статусами (как в
+    реальной истории вебхуков).
+    """
+    count = rng.choice([0, 1, 2, rng.randint(3, 60)])
+    stamps = [rng.randint(start_ts, end_ts) for _ in range(count)]
+    if stamps and rng.random() < 0.3:
+        # события ровно на границах суток и часов
+        boundaries = [
+            b for day in DAYS for b in _day_bounds(day) if start_ts <= b <= end_ts
+        ]
+        stamps += rng.sample(boundaries, min(len(boundaries), rng.randint(1, 3)))
+        stamps += [
+            ts - ts % 3600 for ts in rng.sample(stamps, min(len(stamps), 2))
+            if ts - ts % 3600 >= start_ts
+        ]
+    stamps = sorted(stamps)
+    if stamps and rng.random() < 0.3:
+        # дубли меток времени
+        dup = rng.choice(stamps)
+        stamps = sorted(stamps + [dup] * rng.randint(1, 3))
+    return [(ts, rng.random() < 0.5) for ts in stamps]
+
+
+def _seeds():
+    return range(RUNS)
+
+
+def test_dst_day_has_25_hours():
+    start, end = _day_bounds(DST_DAY)
+    assert end - start == 25 * 3600
+
+
+@pytest.mark.parametrize("seed", _seeds())
+def test_day_stats_match_legacy(seed):
+    rng = random.Random(seed)
+    lo, _ = _day_bounds(DAYS[0])
+    _, hi = _day_bounds(DAYS[-1])
+    events = random_events(rng, lo - 6 * 3600, hi + 6 * 3600)
+
+    for day in DAYS:
+        assert stats.compute_day_stats(day, events) == legacy_stats.compute_day_stats(day, events)
+        if day != DST_DAY:
+            assert stats.compute_day_hourly_online(day, events) == (
+                legacy_stats.compute_day_hourly_online(day, events)
+            )
+
+
+@pytest.mark.parametrize("seed", _seeds())
+def test_dst_day_hourly_covers_whole_day(seed):
+    rng = random.Random(seed)
+    start, end = _day_bounds(DST_DAY)
+    events = random_events(rng, start - 3600, end + 3600)
+
+    day_stats = stats.compute_day_stats(DST_DAY, events)
+    hourly = stats.compute_day_hourly_online(DST_DAY, events)
+    if day_stats is None:
+        assert hourly is None
+    else:
+        assert len(hourly) == 24
+        assert sum(hourly) == day_stats["on_seconds"]
+
+
+@pytest.mark.parametrize("seed", _seeds())
+def test_slice_events_matches_linear_scan(seed):
+    rng = random.Random(seed)
+    events = random_events(rng, 0, 10_000)
+    start_ts = rng.randint(-100, 10_100)
+    end_ts = start_ts + rng.randint(0, 5_000)
+
+    before = None
+    for event in events:
+        if event[0] < start_ts:
+            before = event
+    inside = [e for e in events if start_ts <= e[0] < end_ts]
+
+    got_before, got_inside = stats.slice_events(events, start_ts, end_ts)
+    assert got_before == before
+    assert list(got_inside) == inside
+
+
+@pytest.mark.parametrize("seed", _seeds())
+def test_uptime_window_matches_legacy(seed):
+    rng = random.Random(seed)
+    events = random_events(rng, 0, 100_000)
+    now_ts = rng.randint(0, 120_000)
+    window = rng.choice([60, 3600, 24 * 3600, 7 * 24 * 3600])
+
+    assert stats.compute_uptime_ratio_window(events, window, now_ts) == (
+        legacy_stats.compute_uptime_ratio_window(events, window, now_ts)
+    )
+
+
+@pytest.mark.parametrize("seed", _seeds())
+def test_timeline_last_transitions_match_legacy(seed):
+    rng = random.Random(seed)
+    events = random_events(rng, 0, 10_000)
+    timeline = EventTimeline()
+    timeline.load(events)
+
+    assert timeline.last_transitions() == legacy_stats.get_last_transitions(events)
+
+
+@pytest.mark.skipif(not HAS_NUMPY, reason="numpy не установлен")
+@pytest.mark.parametrize("seed", _seeds())
+def test_days_stats_np_match_python(seed, monkeypatch):
+    """
+    compute_days_stats_np == compute_days_stats на тех же срезах ленты,
+    что берёт daily_stats.get_days_stats: закрытые дни и «сегодня».
+    """
+    rng = random.Random(seed)
+    lo, _ = _day_bounds(DAYS[0])
+    _, hi = _day_bounds(DAYS[-1])
+    timeline = EventTimeline()
+    timeline.load(random_events(rng, lo - 6 * 3600, hi + 6 * 3600))
+
+    today = rng.choice(DAYS)
+    today_start, today_end = _day_bounds(today)
+    now_ts = rng.randint(today_start, today_end - 1)
+    monkeypatch.setattr(stats.time, "time", lambda: now_ts)
+
+    days = sorted(rng.sample(DAYS, rng.randint(1, len(DAYS))))
+    days = [d for d in days if d <= today] or [today]
+    range_start, _ = _day_bounds(days[0])
+    _, range_end = _day_bounds(days[-1])
+
+    ts_buf, st_buf = timeline.arrays_between(range_start, range_end)
+    assert compute_days_stats_np(days, ts_buf, st_buf, now_ts) == stats.compute_days_stats(
+        days, timeline.events_between(range_start, range_end)
+    )
@@ -0,0 +1,83 @@
+"""
+collapse_readings: показания шлюза -> переходы относительно ленты.
+"""
+import random
+
+import pytest
+
+from powerbot.domain.timeline import EventTimeline, collapse_readings
+
+
+def _timeline(events):
+    timeline = EventTimeline()
+    timeline.load(events)
+    return timeline
+
+
+def _status_at(events, ts):
+    # ORDER BY ts, id: при равных метках побеждает последнее событие
+    status = None
+    for event_ts, event_status in events:
+        if event_ts <= ts:
+            status = event_status
+    return status
+
+
+def test_readings_between_stored_events_are_kept():
+    timeline = _timeline([(100, True), (200, False)])
+    readings = [(1, True), (250, True), (400, False)]
+
+    assert collapse_readings(timeline, readings) == [(1, True), (250, True), (400, False)]
+
+
+def test_replayed_readings_are_dropped():
+    timeline = _timeline([(100, True), (200, False), (300, True)])
+    readings = [(100, True), (150, True), (200, False), (250, False), (300, True)]
+
+    assert collapse_readings(timeline, readings) == []
+
+
+def test_repeated_statuses_in_batch_collapse():
+    timeline = _timeline([])
+    readings = [(30, False), (10, True), (20, True), (40, False), (50, True)]
+
+    assert collapse_readings(timeline, readings) == [(10, True), (30, False), (50, True)]
+
+
+def test_batch_transition_wins_over_stored_event_with_same_ts():
+    timeline = _timeline([(100, True)])
+    readings = [(100, False), (100, False), (150, True)]
+
+    assert collapse_readings(timeline, readings) == [(100, False), (150, True)]
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_merged_history_matches_every_reading(seed):
+    """
+    После записи переходов статус в момент каждого показания совпадает
+    с показанием (если после него в той же секунде нет более позднего),
+    а сами переходы меняют статус.
+    """
+    rng = random.Random(seed)
+    stored = sorted((rng.randint(0, 1000), rng.random() < 0.5) for _ in range(rng.randint(0, 20)))
+    readings = [(rng.randint(0, 1000), rng.random() < 0.5) for _ in range(rng.randint(0, 40))]
+    # одна метка — одно показание, иначе «последнее» в секунде не определено
+    readings = list(dict(readings).items())
+
+    timeline = _timeline(stored)
+    transitions = collapse_readings(timeline, readings)
+
+    # переходы пачки встают после событий ленты с той же меткой
+    merged = sorted(
+        [(ts, 0, st) for ts, st in stored] + [(ts, 1, st) for ts, st in transitions]
+    )
+    merged = [(ts, st) for ts, _, st in merged]
+
+    for ts, status in readings:
+        assert _status_at(merged, ts) == status
+
+    for ts, status in transitions:
+        before = [(t, s) for t, s in merged if t < ts]
+        same_ts_stored = [s for t, s in stored if t == ts]
+        previous = same_ts_stored[-1] if same_ts_stored else _status_at(before, ts)
+        assert previous != status